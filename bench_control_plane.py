@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the Flask control plane (main.py), fully offline
+
+Usage:
+    python bench_control_plane.py [--server flask|gunicorn] [--duration S] [--concurrency N]
+                                  [--uploads N] [--streams N] [--stub-startup S] [--stub-cpu F] [--json FILE]
+
+Starts fake_mediamtx.py (control API plus an RTSP publish sink), puts
+fake_ffmpeg.py first on PATH as ffmpeg and ffprobe, and runs main.py in a
+scratch directory against them. Then, at the same time for --duration seconds:
+    - --concurrency clients poll GET /status
+    - --health-clients clients poll GET /mediamtx/health
+    - --upload-clients clients POST /upload, cycling over --streams stream names
+      (a re-upload restarts that stream), then wait for the stub encoder to
+      start publishing (from the start of the upload to the path turning
+      ready on the fake MediaMTX)
+and reports throughput and latency percentiles for each.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+import requests
+from loadtest import summarize, run_workers
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_for(url, timeout=20.0, process=None):
+    """Poll url until it answers, raise if it does not or the process exits"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            raise RuntimeError(f"{process.args[1] if len(process.args) > 1 else process.args[0]} "
+                               f"exited with {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def install_stubs(workdir):
+    """bin/ffmpeg and bin/ffprobe pointing at fake_ffmpeg.py, returns the bin directory"""
+    bin_dir = os.path.join(workdir, 'bin')
+    os.makedirs(bin_dir)
+    for name in ('ffmpeg', 'ffprobe'):
+        os.symlink(os.path.join(REPO, 'fake_ffmpeg.py'), os.path.join(bin_dir, name))
+    return bin_dir
+
+
+def start_server(kind, workdir, env, port):
+    """Run main.py (or gunicorn with main:app) in workdir, returns (process, base_url)"""
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    if kind == 'gunicorn':
+        env = dict(env, BIND=f'127.0.0.1:{port}',
+                   STREAM_MANAGER_ADDRESS=os.path.join(workdir, 'manager.sock'))
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, 'gunicorn.conf.py'),
+                   '--pythonpath', REPO, 'main:app']
+        base_url = f'http://127.0.0.1:{port}'
+    else:
+        # main.py always serves on port 5000
+        command = [sys.executable, os.path.join(REPO, 'main.py')]
+        base_url = 'http://127.0.0.1:5000'
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, base_url
+
+
+def bench_get(base_url, path, concurrency, deadline):
+    """GET a path from N threads until the deadline"""
+    def worker(latencies, status_codes):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                code = session.get(f'{base_url}{path}', timeout=10).status_code
+            except requests.exceptions.RequestException:
+                code = 'error'
+            latencies.append(time.perf_counter() - start)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    return run_workers(worker, concurrency)
+
+
+def bench_uploads(base_url, api_url, concurrency, deadline, uploads, streams, payload_path, ready_latencies):
+    """POST /upload from N threads, then wait for each stream's publisher to show up on the fake MediaMTX"""
+    counter = iter(range(uploads))
+    counter_lock = threading.Lock()
+
+    def wait_ready(name, since):
+        # readyTime is set when the stub's RECORD reaches the sink, a re-upload must see a newer one
+        while time.perf_counter() < deadline + 15:
+            try:
+                item = requests.get(f'{api_url}/v3/paths/get/{name}', timeout=5).json()
+            except (requests.exceptions.RequestException, ValueError):
+                item = {}
+            if item.get('ready') and item.get('readyTime'):
+                ready_at = datetime.fromisoformat(item['readyTime']).timestamp()
+                if ready_at >= since:
+                    return ready_at - since
+            time.sleep(0.02)
+        return None
+
+    def worker(latencies, status_codes):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            name = f'bench_{index % streams}'
+            since = time.time()
+            start = time.perf_counter()
+            try:
+                with open(payload_path, 'rb') as video:
+                    code = session.post(f'{base_url}/upload',
+                                        files={'file': ('bench.mp4', video, 'video/mp4')},
+                                        data={'stream_name': name}, timeout=60).status_code
+            except requests.exceptions.RequestException:
+                code = 'error'
+            latencies.append(time.perf_counter() - start)
+            status_codes[code] = status_codes.get(code, 0) + 1
+            if code == 200:
+                ready = wait_ready(name, since)
+                with counter_lock:
+                    ready_latencies.append(ready)
+
+    return run_workers(worker, concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the control plane")
+    parser.add_argument('--server', choices=('flask', 'gunicorn'), default='flask')
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds of mixed traffic")
+    parser.add_argument('--concurrency', type=int, default=8, help="GET /status clients")
+    parser.add_argument('--health-clients', type=int, default=2, help="GET /mediamtx/health clients")
+    parser.add_argument('--upload-clients', type=int, default=2)
+    parser.add_argument('--uploads', type=int, default=40, help="Upper bound on uploads")
+    parser.add_argument('--upload-size', type=int, default=1024 * 1024, help="Bytes per upload")
+    parser.add_argument('--streams', type=int, default=8, help="Distinct stream names uploads cycle over")
+    parser.add_argument('--api-port', type=int, default=9997)
+    parser.add_argument('--rtsp-port', type=int, default=8554)
+    parser.add_argument('--stub-startup', type=float, default=0.5, help="Seconds before a stub encoder publishes")
+    parser.add_argument('--stub-cpu', type=float, default=0.02, help="Fraction of a core each stub encoder burns")
+    parser.add_argument('--stub-bitrate', type=int, default=1000000, help="Bits/s each stub encoder publishes")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directory (server.log, uploads)")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-control-plane-')
+    env = dict(os.environ,
+               PATH=install_stubs(workdir) + os.pathsep + os.environ.get('PATH', ''),
+               MEDIAMTX_NODES=json.dumps([{'name': 'bench', 'host': '127.0.0.1',
+                                           'rtsp_port': args.rtsp_port, 'api_port': args.api_port}]),
+               FAKE_FFMPEG_STARTUP=str(args.stub_startup),
+               FAKE_FFMPEG_CPU=str(args.stub_cpu),
+               FAKE_FFMPEG_BITRATE=str(args.stub_bitrate))
+    payload_path = os.path.join(workdir, 'payload.mp4')
+    with open(payload_path, 'wb') as handle:
+        handle.write(os.urandom(args.upload_size))
+
+    api_url = f'http://127.0.0.1:{args.api_port}'
+    fake = subprocess.Popen([sys.executable, os.path.join(REPO, 'fake_mediamtx.py'),
+                             str(args.api_port), str(args.rtsp_port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = None
+    try:
+        wait_for(f'{api_url}/v3/config/global/get', process=fake)
+        server, base_url = start_server(args.server, workdir, env, free_port())
+        wait_for(f'{base_url}/mediamtx/health', timeout=30, process=server)
+
+        print("=" * 60)
+        print(f"Control plane ({args.server}) at {base_url}, fake MediaMTX at {api_url}, "
+              f"{args.duration:.0f}s of mixed traffic")
+        print("=" * 60)
+
+        deadline = time.perf_counter() + args.duration
+        runs = {}
+        ready_latencies = []
+        groups = {
+            'status': lambda: bench_get(base_url, '/status', args.concurrency, deadline),
+            'health': lambda: bench_get(base_url, '/mediamtx/health', args.health_clients, deadline),
+            'upload': lambda: bench_uploads(base_url, api_url, args.upload_clients, deadline, args.uploads,
+                                            args.streams, payload_path, ready_latencies),
+        }
+        threads = [threading.Thread(target=lambda key=key, run=run: runs.__setitem__(key, run()))
+                   for key, run in groups.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results = [
+            summarize(f"GET /status ({args.concurrency} clients)", *runs['status']),
+            summarize(f"GET /mediamtx/health ({args.health_clients} clients)", *runs['health']),
+            summarize(f"POST /upload ({args.upload_clients} clients, {args.upload_size // 1024}KB, "
+                      f"{args.streams} streams)", *runs['upload']),
+        ]
+        ready = [latency for latency in ready_latencies if latency is not None]
+        ready_codes = {'ready': len(ready), 'timeout': len(ready_latencies) - len(ready)}
+        results.append(summarize(f"Upload -> publisher ready (stub startup {args.stub_startup}s)",
+                                 ready, ready_codes, runs['upload'][2]))
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        fake.terminate()
+        fake.wait(timeout=5)
+        if args.keep:
+            print(f"Scratch directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                capture_output=True, text=True).stdout.strip() or None
+        with open(args.json, 'w') as handle:
+            json.dump({'server': args.server, 'timestamp': time.time(), 'commit': commit,
+                       'config': vars(args), 'results': results}, handle, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
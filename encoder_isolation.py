@@ -0,0 +1,219 @@
+import os
+import time
+import ctypes
+import logging
+import platform
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+CPU_PERIOD_USEC = 100000   # cgroup v2 cpu.max period
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+# ioprio_set(2) has no Python wrapper; it is called through libc's syscall()
+IOPRIO_SET_SYSCALL = {'x86_64': 251, 'aarch64': 30, 'i686': 289, 'armv7l': 314}.get(platform.machine())
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class EncoderIsolation:
+    """Keeps encoders from starving each other and the servers.
+
+    Each encoder launched through apply() is:
+      - pinned to its share of the cores left after reserved_cores (the first
+        cores the server may run on), least loaded cores first
+      - given its profile's nice value and I/O priority class
+      - with cgroup_root (a delegated cgroup v2 directory), put in its own
+        child cgroup with cpu.max / memory.max
+    Every step is skipped where the platform does not support it. sample()
+    reports CPU and memory use per stream and forgets encoders that exited.
+    """
+
+    def __init__(self, reserved_cores=1, pin_cores=True, cgroup_root=None, cpu_max=None, memory_max=None):
+        self.cpu_max = cpu_max          # Cores per encoder under cgroups, None = as many as it is pinned to
+        self.memory_max = memory_max    # Bytes per encoder under cgroups, None = no limit
+
+        allowed = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        self.encoder_cores = allowed[reserved_cores:] if pin_cores else []
+        if pin_cores and allowed and not self.encoder_cores:
+            logger.warning(f"Only {len(allowed)} core(s) available, all reserved: encoders are not pinned")
+        self.cgroup_root = self._init_cgroup_root(cgroup_root)
+
+        self._lock = threading.Lock()
+        self._encoders = {}  # pid -> {'stream_name', 'process', 'cores', 'cgroup', 'last': (time, cpu seconds)}
+        self._load = {core: 0 for core in self.encoder_cores}
+
+    def apply(self, stream_name, process, profile, threads=1):
+        """Isolate a freshly started encoder, returns what was applied"""
+        self._prune()
+        with self._lock:
+            cores = sorted(self._load, key=lambda core: (self._load[core], core))[:max(1, threads)]
+            for core in cores:
+                self._load[core] += 1
+            entry = self._encoders[process.pid] = {
+                'stream_name': stream_name,
+                'process': process,
+                'cores': cores,
+                'cgroup': None,
+                'last': None,
+            }
+
+        # cgroup first: cgroup.procs moves every thread, the per-thread calls below cover the rest
+        if self.cgroup_root:
+            entry['cgroup'] = self._join_cgroup(stream_name, process.pid, len(cores) or threads)
+        tids = self._threads(process.pid)
+        if cores:
+            self._for_threads(tids, lambda tid: os.sched_setaffinity(tid, cores))
+        nice = profile.get('nice')
+        if nice:
+            self._for_threads(tids, lambda tid: os.setpriority(os.PRIO_PROCESS, tid, nice))
+        ionice = profile.get('ionice')
+        if ionice:
+            self._for_threads(tids, lambda tid: set_ioprio(tid, *ionice))
+
+        return {'cores': cores, 'nice': nice, 'ionice': ionice, 'cgroup': entry['cgroup']}
+
+    def sample(self):
+        """{stream_name: usage} for every live encoder (summed when a stream has several, e.g. migrating)"""
+        self._prune()
+        now = time.monotonic()
+        usage = {}
+        with self._lock:
+            encoders = list(self._encoders.items())
+        for pid, entry in encoders:
+            cpu_seconds, memory = self._read_usage(pid, entry['cgroup'])
+            if cpu_seconds is None:
+                continue
+            last, entry['last'] = entry['last'], (now, cpu_seconds)
+            cpu_percent = None
+            if last and now > last[0]:
+                cpu_percent = round(100.0 * (cpu_seconds - last[1]) / (now - last[0]), 1)
+
+            item = usage.setdefault(entry['stream_name'], {
+                'pids': [], 'cores': [], 'cpu_percent': None, 'cpu_seconds': 0.0,
+                'memory_bytes': 0, 'cgroup': None,
+            })
+            item['pids'].append(pid)
+            item['cores'] = sorted(set(item['cores']) | set(entry['cores']))
+            item['cpu_seconds'] = round(item['cpu_seconds'] + cpu_seconds, 2)
+            item['memory_bytes'] += memory or 0
+            if cpu_percent is not None:
+                item['cpu_percent'] = round((item['cpu_percent'] or 0.0) + cpu_percent, 1)
+            if entry['cgroup']:
+                item['cgroup'] = os.path.basename(entry['cgroup'])
+                item['cpu_throttled_usec'] = item.get('cpu_throttled_usec', 0) + \
+                    read_keyed(os.path.join(entry['cgroup'], 'cpu.stat')).get('throttled_usec', 0)
+        return usage
+
+    # Internals
+
+    def _prune(self):
+        # Free the cores and cgroups of encoders that have exited
+        with self._lock:
+            exited = [pid for pid, entry in self._encoders.items() if entry['process'].poll() is not None]
+            entries = [self._encoders.pop(pid) for pid in exited]
+            for entry in entries:
+                for core in entry['cores']:
+                    self._load[core] -= 1
+        for entry in entries:
+            if entry['cgroup']:
+                try:
+                    os.rmdir(entry['cgroup'])
+                except OSError as e:
+                    logger.warning(f"Could not remove cgroup {entry['cgroup']}: {e}")
+
+    def _init_cgroup_root(self, root):
+        if not root:
+            return None
+        if not os.path.exists(os.path.join(root, 'cgroup.controllers')):
+            logger.warning(f"{root} is not a cgroup v2 directory, encoders run without cpu/memory limits")
+            return None
+        try:
+            available = read_text(os.path.join(root, 'cgroup.controllers')).split()
+            wanted = [name for name in ('cpu', 'memory') if name in available]
+            with open(os.path.join(root, 'cgroup.subtree_control'), 'w') as handle:
+                handle.write(' '.join(f'+{name}' for name in wanted))
+        except OSError as e:
+            logger.warning(f"Cannot delegate cpu/memory under {root}: {e}, encoders run without limits")
+            return None
+        return root
+
+    def _join_cgroup(self, stream_name, pid, cores):
+        path = os.path.join(self.cgroup_root, f'{stream_name}-{pid}')
+        try:
+            os.makedirs(path, exist_ok=True)
+            quota = int((self.cpu_max or cores) * CPU_PERIOD_USEC)
+            write_text(os.path.join(path, 'cpu.max'), f'{quota} {CPU_PERIOD_USEC}')
+            if self.memory_max:
+                write_text(os.path.join(path, 'memory.max'), str(int(self.memory_max)))
+            write_text(os.path.join(path, 'cgroup.procs'), str(pid))
+            return path
+        except OSError as e:
+            logger.warning(f"Could not put '{stream_name}' (pid {pid}) in a cgroup: {e}")
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+            return None
+
+    def _threads(self, pid):
+        try:
+            return [int(tid) for tid in os.listdir(f'/proc/{pid}/task')]
+        except OSError:
+            return [pid]
+
+    def _for_threads(self, tids, call):
+        for tid in tids:
+            try:
+                call(tid)
+            except (OSError, AttributeError):
+                pass  # Thread gone, or not supported here
+
+    def _read_usage(self, pid, cgroup):
+        # (CPU seconds, memory bytes) from the encoder's cgroup, or /proc for the process itself
+        if cgroup:
+            stat = read_keyed(os.path.join(cgroup, 'cpu.stat'))
+            try:
+                memory = int(read_text(os.path.join(cgroup, 'memory.current')))
+            except (OSError, ValueError):
+                memory = None
+            if 'usage_usec' in stat:
+                return stat['usage_usec'] / 1e6, memory
+        try:
+            # Fields after the parenthesized command: utime and stime are the 12th and 13th
+            fields = read_text(f'/proc/{pid}/stat').rsplit(')', 1)[1].split()
+            cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+            memory = int(read_text(f'/proc/{pid}/statm').split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            return None, None
+        return cpu_seconds, memory
+
+
+def set_ioprio(tid, io_class, level=0):
+    """ioprio_set(IOPRIO_WHO_PROCESS, tid, class/level), class as in IOPRIO_CLASSES"""
+    if IOPRIO_SET_SYSCALL is None:
+        raise OSError("ioprio_set is not available on this platform")
+    value = (IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | level
+    if ctypes.CDLL(None, use_errno=True).syscall(IOPRIO_SET_SYSCALL, IOPRIO_WHO_PROCESS, tid, value) != 0:
+        raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+
+def read_text(path):
+    with open(path) as handle:
+        return handle.read().strip()
+
+
+def write_text(path, value):
+    with open(path, 'w') as handle:
+        handle.write(value)
+
+
+def read_keyed(path):
+    """'key value' lines (cpu.stat, memory.stat) as a dict of ints, {} if unreadable"""
+    try:
+        return {key: int(value) for key, value in (line.split() for line in read_text(path).splitlines())}
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Named libx264 encode profiles, source-aware GOP sizing and host calibration
+
+Usage (one-shot calibration):
+    python encoder_profiles.py calibrate sample.mp4 [--streams N] [--seconds S]
+
+Calibration encodes the sample with N concurrent FFmpeg processes per preset,
+from the slowest (best compression) down, and writes the slowest preset that
+still keeps up with real time to encoder_calibration.json. main.py then never
+uses a slower preset than that.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+
+
+logger = logging.getLogger(__name__)
+
+# x264 presets from fastest to slowest
+PRESET_LADDER = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium']
+
+# gop_seconds caps the distance between keyframes; keyframe_seconds (shorter) forces them
+# on wall-clock time and is the longest a new viewer waits for its first decodable frame.
+# nice / ionice (class, level) order encoders when cores or disks are contended,
+# latency streams win over the heavier presets (see encoder_isolation.py).
+ENCODE_PROFILES = {
+    # Fast join and minimal encoder delay, larger bitstream
+    'latency': {'preset': 'ultrafast', 'tune': 'zerolatency', 'gop_seconds': 1.0, 'keyframe_seconds': 0.5,
+                'crf': 23, 'bframes': 0, 'nice': 0, 'ionice': ('best-effort', 0)},
+    # Good quality per bit, still no B-frame delay
+    'balanced': {'preset': 'veryfast', 'tune': 'zerolatency', 'gop_seconds': 2.0, 'keyframe_seconds': 1.0,
+                 'crf': 23, 'bframes': 0, 'nice': 5, 'ionice': ('best-effort', 4)},
+    # Smallest bitstream, long GOP and B-frames, join takes longer
+    'bandwidth': {'preset': 'medium', 'tune': None, 'gop_seconds': 4.0, 'keyframe_seconds': 2.0,
+                  'crf': 27, 'bframes': 3, 'nice': 10, 'ionice': ('best-effort', 7)},
+}
+DEFAULT_PROFILE = 'latency'
+DEFAULT_FPS = 30.0
+
+CALIBRATION_FILE = 'encoder_calibration.json'
+
+_probe_cache = {}
+
+
+def probe_source(video_path):
+    """Return {'fps', 'width', 'height', 'has_audio'} of a file via ffprobe (cached per file version)"""
+    try:
+        stat = os.stat(video_path)
+        key = (video_path, stat.st_mtime, stat.st_size)
+    except OSError:
+        key = None
+    if key in _probe_cache:
+        return _probe_cache[key]
+
+    info = {'fps': DEFAULT_FPS, 'width': None, 'height': None, 'has_audio': False}
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error',
+             '-show_entries', 'stream=codec_type,avg_frame_rate,r_frame_rate,width,height', '-of', 'json', video_path],
+            capture_output=True, text=True, timeout=10,
+        )
+        streams = json.loads(result.stdout or '{}').get('streams') or []
+        info['has_audio'] = any(item.get('codec_type') == 'audio' for item in streams)
+        stream = next((item for item in streams if item.get('codec_type') == 'video'), {})
+        info['width'] = stream.get('width')
+        info['height'] = stream.get('height')
+        for field in ('avg_frame_rate', 'r_frame_rate'):
+            fps = _parse_rate(stream.get(field))
+            if fps:
+                info['fps'] = fps
+                break
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.warning(f"ffprobe failed for {video_path}, assuming {DEFAULT_FPS} fps: {e}")
+
+    if key:
+        _probe_cache[key] = info
+    return info
+
+
+def _parse_rate(rate):
+    # ffprobe rates look like '30000/1001'
+    if not rate or rate in ('0/0', '0'):
+        return None
+    num, _, den = rate.partition('/')
+    fps = float(num) / float(den or 1)
+    return round(fps, 3) if 0 < fps <= 240 else None
+
+
+def encoder_threads(max_streams, reserved_cores=1):
+    """Threads per encoder so max_streams encoders share the cores not reserved for the servers"""
+    cores = max(1, (os.cpu_count() or 1) - reserved_cores)
+    return max(1, cores // max(1, max_streams))
+
+
+def gop_size(profile, fps):
+    """GOP length in frames for a profile, so keyframe spacing is the same in seconds at any fps"""
+    return max(1, int(round(profile['gop_seconds'] * fps)))
+
+
+def keyframe_interval(profile, fps):
+    """Forced keyframe spacing in frames, never longer than the GOP"""
+    return max(1, min(gop_size(profile, fps), int(round(profile['keyframe_seconds'] * fps))))
+
+
+def effective_preset(profile, preset_cap=None):
+    """The profile's preset, or the calibrated cap if that is faster"""
+    preset = profile['preset']
+    if preset_cap in PRESET_LADDER and PRESET_LADDER.index(preset_cap) < PRESET_LADDER.index(preset):
+        return preset_cap
+    return preset
+
+
+def video_args(profile_name, source_info, threads, preset_cap=None):
+    """FFmpeg video encoder arguments for a profile and source"""
+    profile = ENCODE_PROFILES.get(profile_name) or ENCODE_PROFILES[DEFAULT_PROFILE]
+    gop = gop_size(profile, source_info['fps'])
+    keyframe_seconds = min(profile['keyframe_seconds'], profile['gop_seconds'])
+
+    args = [
+        '-c:v', 'libx264',
+        '-preset', effective_preset(profile, preset_cap),
+        '-crf', str(profile['crf']),
+        '-g', str(gop),                   # GOP derived from source fps
+        '-keyint_min', str(keyframe_interval(profile, source_info['fps'])),
+        '-sc_threshold', '0',             # No extra scene-cut keyframes, keeps GOPs regular
+        # Keyframes on wall-clock time every keyframe_seconds, shorter than the GOP, so joins are
+        # fast and stay bounded when the probed fps is off (VFR sources)
+        '-force_key_frames', f"expr:gte(t,n_forced*{keyframe_seconds})",
+        '-bf', str(profile['bframes']),
+        '-threads', str(threads),         # Cap per process so N encoders do not oversubscribe cores
+    ]
+    if profile['tune']:
+        args += ['-tune', profile['tune']]
+    return args
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    """Return the calibrated preset cap, or None when the host has not been calibrated"""
+    try:
+        with open(path) as handle:
+            return json.load(handle).get('preset')
+    except (OSError, ValueError):
+        return None
+
+
+def _encode_fps(sample_path, preset, threads, seconds, concurrency, source_fps):
+    # Run `concurrency` encoders at once, return the slowest one's frames per second
+    cmd = ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'error', '-y',
+           '-stream_loop', '-1', '-i', sample_path, '-t', str(seconds), '-an',
+           '-c:v', 'libx264', '-preset', preset, '-threads', str(threads), '-f', 'null', '-']
+    start = time.perf_counter()
+    processes = [subprocess.Popen(cmd) for _ in range(concurrency)]
+    elapsed = []
+    for process in processes:
+        process.wait()
+        elapsed.append(time.perf_counter() - start)
+    if any(process.returncode for process in processes):
+        raise RuntimeError(f"ffmpeg failed while benchmarking preset '{preset}'")
+    return seconds * source_fps / max(elapsed)
+
+
+def calibrate(sample_path, stream_count, seconds=5.0, headroom=0.2, path=CALIBRATION_FILE):
+    """Pick the slowest preset that keeps stream_count encoders at real time, and save it"""
+    source = probe_source(sample_path)
+    cores = os.cpu_count() or 1
+    threads = encoder_threads(stream_count)
+    concurrency = min(stream_count, cores)
+    # Fewer processes than streams means each one has to go proportionally faster
+    required_fps = source['fps'] * (stream_count / concurrency) * (1 + headroom)
+
+    results = {}
+    chosen = PRESET_LADDER[0]
+    for preset in reversed(PRESET_LADDER):
+        fps = _encode_fps(sample_path, preset, threads, seconds, concurrency, source['fps'])
+        results[preset] = round(fps, 1)
+        print(f"  {preset:<10} {fps:8.1f} fps per encoder (need {required_fps:.1f})")
+        if fps >= required_fps:
+            chosen = preset
+            break
+
+    calibration = {
+        'preset': chosen,
+        'stream_count': stream_count,
+        'threads_per_encoder': threads,
+        'source_fps': source['fps'],
+        'source_size': [source['width'], source['height']],
+        'cpu_count': cores,
+        'measured_fps': results,
+        'calibrated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(path, 'w') as handle:
+        json.dump(calibration, handle, indent=2)
+    return calibration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoder profile tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    cal = sub.add_parser('calibrate', help="Benchmark presets on this host")
+    cal.add_argument('sample', help="Representative video file")
+    cal.add_argument('--streams', type=int, default=8, help="Concurrent streams the host must sustain")
+    cal.add_argument('--seconds', type=float, default=5.0, help="Seconds of video encoded per preset")
+    cal.add_argument('--output', default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Calibrating x264 presets for {args.streams} streams on {os.cpu_count()} cores")
+    print("=" * 60)
+    calibration = calibrate(args.sample, args.streams, args.seconds, path=args.output)
+    print(f"Selected preset: {calibration['preset']} ({calibration['threads_per_encoder']} threads per encoder)")
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
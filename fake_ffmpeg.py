@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Stand-in for the ffmpeg and ffprobe executables, for benchmarks without real encodes
+
+Symlink it as `ffmpeg` and `ffprobe` into a directory put first on PATH
+(bench_control_plane.py does this). As ffprobe it describes every file as a
+30 fps 1280x720 video with audio. As ffmpeg it:
+    - waits FAKE_FFMPEG_STARTUP seconds (default 0.5), like probing and opening the encoder
+    - publishes to an rtsp:// output with ANNOUNCE/SETUP/RECORD, then sends
+      FAKE_FFMPEG_BITRATE bits/s (default 2000000) of interleaved data
+    - keeps FAKE_FFMPEG_CPU of one core busy (default 0.05), like encoding
+    - writes an FFmpeg-style progress line (ending in \\r) to stderr every second
+    - writes a small file and exits for any other output (playlist normalization)
+It exits on SIGTERM, when the sink disconnects, or when its parent goes away.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+
+TICK = 0.1
+
+
+def ffprobe():
+    print(json.dumps({'streams': [
+        {'codec_type': 'video', 'width': 1280, 'height': 720, 'avg_frame_rate': '30/1', 'r_frame_rate': '30/1'},
+        {'codec_type': 'audio'},
+    ]}))
+    return 0
+
+
+def rtsp_request(connection, cseq, method, url, headers=None, body=b''):
+    lines = [f"{method} {url} RTSP/1.0", f"CSeq: {cseq}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    if body:
+        lines.append(f"Content-Length: {len(body)}")
+    connection.sendall(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    reply = b''
+    while b'\r\n\r\n' not in reply:
+        data = connection.recv(4096)
+        if not data:
+            raise ConnectionError(f"{method}: connection closed")
+        reply += data
+    status = reply.split(b'\r\n', 1)[0].decode('utf-8', 'replace')
+    if ' 200 ' not in status:
+        raise ConnectionError(f"{method}: {status}")
+    return reply
+
+
+def publish(url):
+    host_port = url.split('://', 1)[1].split('/', 1)[0]
+    host, _, port = host_port.partition(':')
+    connection = socket.create_connection((host, int(port or 554)), timeout=5)
+    sdp = b"v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=fake\r\nt=0 0\r\nm=video 0 RTP/AVP 96\r\na=rtpmap:96 H264/90000\r\n"
+    rtsp_request(connection, 1, 'ANNOUNCE', url, {'Content-Type': 'application/sdp'}, sdp)
+    rtsp_request(connection, 2, 'SETUP', url + '/trackID=0',
+                 {'Transport': 'RTP/AVP/TCP;unicast;interleaved=0-1;mode=record'})
+    rtsp_request(connection, 3, 'RECORD', url)
+    return connection
+
+
+def burn(seconds):
+    # Busy loop standing in for encoder work
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def ffmpeg(args):
+    startup = float(os.environ.get('FAKE_FFMPEG_STARTUP', 0.5))
+    bitrate = int(os.environ.get('FAKE_FFMPEG_BITRATE', 2000000))
+    cpu = float(os.environ.get('FAKE_FFMPEG_CPU', 0.05))
+    output = args[-1] if args else ''
+    parent = os.getppid()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(255))
+
+    time.sleep(startup)
+    if not output.startswith('rtsp://'):
+        if output and not output.startswith('-'):
+            with open(output, 'wb') as handle:
+                handle.write(b'\0' * 1024)
+        return 0
+
+    try:
+        connection = publish(output)
+    except (OSError, ValueError) as e:
+        print(f"{output}: {e}", file=sys.stderr)
+        return 1
+
+    # One interleaved packet per tick on channel 0, split into 1400-byte RTP-sized chunks
+    chunk = bytes(1400)
+    per_tick = max(1, bitrate // 8 // len(chunk) * TICK)
+    packet = b'$\x00' + len(chunk).to_bytes(2, 'big') + chunk
+    started_at = time.monotonic()
+    ticks = 0
+    while os.getppid() == parent:
+        started = time.monotonic()
+        burn(cpu * TICK)
+        try:
+            connection.sendall(packet * int(per_tick))
+        except OSError:
+            return 1
+        ticks += 1
+        if ticks % int(1 / TICK) == 0:
+            elapsed = time.monotonic() - started_at
+            sys.stderr.write(f"frame={int(elapsed * 30):5d} fps= 30 q=23.0 size={int(elapsed * bitrate / 8192)}kB "
+                             f"time={time.strftime('%H:%M:%S', time.gmtime(elapsed))}.00 speed=1x    \r")
+            sys.stderr.flush()
+        time.sleep(max(0.0, TICK - (time.monotonic() - started)))
+    return 0
+
+
+def main():
+    name = os.path.basename(sys.argv[0])
+    if name.startswith('ffprobe'):
+        return ffprobe()
+    return ffmpeg(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Fake MediaMTX control API for running main.py without Docker
+
+Usage:
+    python fake_mediamtx.py [api_port] [rtsp_port]
+
+Implements the subset of the v3 API used by MediaMTXClient:
+    GET    /v3/config/global/get
+    GET    /v3/paths/list
+    GET    /v3/paths/get/<name>
+    POST   /v3/config/paths/add/<name>
+    POST   /v3/config/paths/replace/<name>
+    PATCH  /v3/config/paths/patch/<name>
+    DELETE /v3/config/paths/delete/<name>
+
+Runtime path state (publisher ready, readers, byte counters) can be set with
+    POST /fake/paths/<name>   {"ready": true, "readers": 3, "bytesSent": 1024}
+or from Python through FakeMediaMTX.set_path_state().
+
+With rtsp_port, FakeRtspSink also accepts publishers (ANNOUNCE/SETUP/RECORD)
+on that port: a path turns ready on RECORD, counts the bytes pushed to it and
+turns not ready when the publisher disconnects.
+"""
+
+import sys
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeMediaMTX:
+    """In-memory MediaMTX API stand-in served from a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=9997):
+        self.host = host
+        self.port = port
+        self.lock = threading.Lock()
+        self.path_configs = {}   # name -> settings posted through the config API
+        self.path_states = {}    # name -> runtime state reported by /v3/paths/list
+        self.request_count = 0
+        self.server = None
+
+    # Python-side controls
+
+    def set_path_state(self, name, ready=None, readers=None, bytes_received=None, bytes_sent=None):
+        """Simulate a publisher/readers on a path"""
+        with self.lock:
+            state = self.path_states.setdefault(name, self._new_state())
+            if ready is not None:
+                state['ready'] = ready
+                # Sub-second, like MediaMTX's RFC 3339 timestamps
+                now = time.time()
+                state['readyTime'] = (time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now))
+                                      + f'.{int(now % 1 * 1e6):06d}Z') if ready else None
+            if readers is not None:
+                state['readers'] = [{'type': 'rtspSession', 'id': f'fake-{i}'} for i in range(readers)]
+            if bytes_received is not None:
+                state['bytesReceived'] = bytes_received
+            if bytes_sent is not None:
+                state['bytesSent'] = bytes_sent
+
+    def start(self):
+        """Serve in a daemon thread, returns self"""
+        fake = self
+
+        class Handler(FakeMediaMTXHandler):
+            pass
+        Handler.fake = fake
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    # API implementation
+
+    def _new_state(self):
+        return {'ready': False, 'readyTime': None, 'readers': [], 'bytesReceived': 0, 'bytesSent': 0}
+
+    def handle(self, method, path, query, body):
+        with self.lock:
+            self.request_count += 1
+
+            if method == 'GET' and path == '/v3/config/global/get':
+                return 200, {'api': True, 'rtsp': True, 'logLevel': 'info'}
+
+            if method == 'GET' and path == '/v3/paths/list':
+                return 200, self._paths_list(query)
+
+            if method == 'GET' and path.startswith('/v3/paths/get/'):
+                name = path[len('/v3/paths/get/'):]
+                if name not in self.path_configs and name not in self.path_states:
+                    return 404, {'error': 'path not found'}
+                return 200, self._path_item(name)
+
+            parts = path.strip('/').split('/', 4)
+            if len(parts) == 5 and parts[:3] == ['v3', 'config', 'paths']:
+                action, name = parts[3], parts[4]
+                return self._config_path(method, action, name, body)
+
+            if method == 'POST' and path.startswith('/fake/paths/'):
+                name = path[len('/fake/paths/'):]
+                state = self.path_states.setdefault(name, self._new_state())
+                for key in ('ready', 'bytesReceived', 'bytesSent'):
+                    if key in body:
+                        state[key] = body[key]
+                if 'readers' in body:
+                    state['readers'] = [{'type': 'rtspSession', 'id': f'fake-{i}'} for i in range(body['readers'])]
+                return 200, {}
+
+        return 404, {'error': 'not found'}
+
+    def _paths_list(self, query):
+        names = sorted(set(self.path_configs) | set(self.path_states))
+        items_per_page = int(query.get('itemsPerPage', ['100'])[0])
+        page = int(query.get('page', ['0'])[0])
+        page_count = max(1, -(-len(names) // items_per_page))
+
+        items = [self._path_item(name) for name in names[page * items_per_page:(page + 1) * items_per_page]]
+        return {'pageCount': page_count, 'itemCount': len(names), 'items': items}
+
+    def _path_item(self, name):
+        state = self.path_states.get(name) or self._new_state()
+        return {
+            'name': name,
+            'confName': name,
+            'source': {'type': 'rtspSession', 'id': 'fake-publisher'} if state['ready'] else None,
+            'ready': state['ready'],
+            'readyTime': state['readyTime'],
+            'tracks': ['H264'] if state['ready'] else [],
+            'bytesReceived': state['bytesReceived'],
+            'bytesSent': state['bytesSent'],
+            'readers': state['readers'],
+        }
+
+    def _config_path(self, method, action, name, body):
+        if action == 'add' and method == 'POST':
+            if name in self.path_configs:
+                return 400, {'error': 'path already exists'}
+            self.path_configs[name] = dict(body)
+            return 200, {}
+        if action == 'replace' and method == 'POST':
+            self.path_configs[name] = dict(body)
+            return 200, {}
+        if action == 'patch' and method == 'PATCH':
+            if name not in self.path_configs:
+                return 404, {'error': 'path not found'}
+            self.path_configs[name].update(body)
+            return 200, {}
+        if action == 'delete' and method == 'DELETE':
+            if name not in self.path_configs:
+                return 404, {'error': 'path not found'}
+            del self.path_configs[name]
+            self.path_states.pop(name, None)
+            return 200, {}
+        return 404, {'error': 'not found'}
+
+
+class FakeMediaMTXHandler(BaseHTTPRequestHandler):
+    fake = None
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+
+        code, payload = self.fake.handle(method, url.path, parse_qs(url.query), body)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRtspSink:
+    """Accepts RTSP publishers for a FakeMediaMTX and discards their media"""
+
+    def __init__(self, fake, host='127.0.0.1', port=8554):
+        self.fake = fake
+        self.host = host
+        self.port = port
+        self.server = None
+        self.publishers = 0
+
+    def start(self):
+        sink = self
+
+        class Handler(FakeRtspSinkHandler):
+            pass
+        Handler.sink = sink
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class FakeRtspSinkHandler(socketserver.BaseRequestHandler):
+    sink = None
+
+    def handle(self):
+        buffer = b''
+        path = None
+        received = 0
+        recording = False
+        try:
+            while True:
+                data = self.request.recv(65536)
+                if not data:
+                    break
+                if recording:
+                    # Interleaved media (and the odd TEARDOWN), only counted
+                    received += len(data)
+                    self.sink.fake.set_path_state(path, bytes_received=received)
+                    continue
+
+                buffer += data
+                while b'\r\n\r\n' in buffer:
+                    head, rest = buffer.split(b'\r\n\r\n', 1)
+                    lines = head.decode('utf-8', 'replace').split('\r\n')
+                    headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+                    headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+                    length = int(headers.get('content-length', 0))
+                    if len(rest) < length:
+                        break
+                    buffer = rest[length:]
+
+                    method, url = lines[0].split()[:2]
+                    path = url.split('://', 1)[-1].split('/', 1)[-1].split('/')[0] or path
+                    reply = f"RTSP/1.0 200 OK\r\nCSeq: {headers.get('cseq', '0')}\r\n"
+                    if method == 'SETUP':
+                        reply += f"Session: {id(self)};timeout=60\r\nTransport: {headers.get('transport', '')}\r\n"
+                    elif method != 'OPTIONS':
+                        reply += f"Session: {id(self)}\r\n"
+                    self.request.sendall((reply + "\r\n").encode())
+
+                    if method == 'RECORD':
+                        recording = True
+                        received = len(buffer)
+                        self.sink.publishers += 1
+                        self.sink.fake.set_path_state(path, ready=True, bytes_received=received)
+                        break
+        except (OSError, ValueError):
+            pass
+        finally:
+            if recording:
+                self.sink.publishers -= 1
+                self.sink.fake.set_path_state(path, ready=False)
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9997
+    fake = FakeMediaMTX('0.0.0.0', port).start()
+    print(f"Fake MediaMTX API listening on http://0.0.0.0:{port}")
+    sink = None
+    if len(sys.argv) > 2:
+        sink = FakeRtspSink(fake, '0.0.0.0', int(sys.argv[2])).start()
+        print(f"Fake RTSP publish sink listening on rtsp://0.0.0.0:{sink.port}")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        if sink:
+            sink.stop()
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import time
+import signal
+import logging
+import selectors
+import threading
+import subprocess
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+LOG_LINES = 200          # Recent stderr lines kept per stream
+MAX_LINE_LENGTH = 1024   # Longer lines (or unterminated output) are cut at this many bytes
+READ_SIZE = 65536
+STOP_TIMEOUT = 5         # Seconds between SIGTERM and SIGKILL for the process group
+
+POSIX = os.name == 'posix'
+WAITID = POSIX and hasattr(os, 'waitid')  # Not on macOS
+
+
+class FFmpegProcess(subprocess.Popen):
+    """Popen for an encoder started in its own session / process group.
+
+    terminate() and kill() signal the whole group, so helpers FFmpeg starts
+    go down with it. terminate() also arms a SIGKILL for the group after
+    stop_timeout. The group id is only safe to signal while the encoder is
+    unreaped (a zombie still holds it), so poll() and wait() look at the
+    exit with WNOWAIT first: if a stop is pending they cancel the timer and
+    kill what is left of the group, and only then let Popen reap the encoder.
+    """
+
+    stop_timeout = STOP_TIMEOUT
+
+    def __init__(self, *args, **kwargs):
+        self._stop_lock = threading.Lock()
+        self._kill_timer = None
+        super().__init__(*args, **kwargs)
+
+    def send_signal(self, sig):
+        self.poll()
+        if self.returncode is not None:
+            return  # Reaped: its own pid may already belong to someone else
+        if not POSIX:
+            return super().send_signal(sig)
+        self._signal_group(sig)
+
+    def terminate(self):
+        self.poll()
+        if self.returncode is not None:
+            return
+        super().terminate()
+        if POSIX and self.stop_timeout:
+            with self._stop_lock:
+                if not self._kill_timer:
+                    self._kill_timer = threading.Timer(self.stop_timeout, self._escalate)
+                    self._kill_timer.daemon = True
+                    self._kill_timer.start()
+
+    def poll(self):
+        if self.returncode is None and WAITID and not self._exited(block=False):
+            return None
+        self._before_reap()
+        return super().poll()
+
+    def wait(self, timeout=None):
+        if self.returncode is None and WAITID:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._exited(block=deadline is None):
+                if deadline is None:
+                    continue  # Interrupted blocking wait, wait again
+                if time.monotonic() >= deadline:
+                    raise subprocess.TimeoutExpired(self.args, timeout)
+                time.sleep(0.05)
+        self._before_reap()
+        return super().wait(timeout)
+
+    def _exited(self, block):
+        # True once the encoder has exited, without reaping it
+        flags = os.WEXITED | os.WNOWAIT | (0 if block else os.WNOHANG)
+        try:
+            return os.waitid(os.P_PID, self.pid, flags) is not None
+        except ChildProcessError:
+            return True  # Already reaped (by Popen itself)
+        except InterruptedError:
+            return False
+
+    def _before_reap(self):
+        # The encoder has exited but is not reaped yet: its group id cannot have been reused
+        with self._stop_lock:
+            if self._kill_timer and self.returncode is None:
+                self._kill_timer.cancel()
+                self._kill_timer = None
+                self._signal_group(signal.SIGKILL)  # Leftovers that ignored SIGTERM
+
+    def _escalate(self):
+        with self._stop_lock:
+            # Still armed means poll()/wait() have not reaped the encoder yet
+            if self._kill_timer:
+                self._kill_timer = None
+                self._signal_group(signal.SIGKILL)
+
+    def _signal_group(self, sig):
+        try:
+            os.killpg(self.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class LogRing:
+    """Last N lines of one stream's FFmpeg output, with the pid that wrote each"""
+
+    def __init__(self, max_lines=LOG_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.partial = {}  # pid -> bytes of a line not terminated yet
+
+    def feed(self, pid, data):
+        # FFmpeg ends progress lines with \r, treat it as a line break too
+        data = self.partial.pop(pid, b'') + data
+        lines = data.replace(b'\r', b'\n').split(b'\n')
+        rest = lines.pop()
+        now = time.time()
+        for line in lines:
+            if line.strip():
+                self.append(now, pid, line)
+        if len(rest) > MAX_LINE_LENGTH:
+            self.append(now, pid, rest)
+        elif rest:
+            self.partial[pid] = rest
+
+    def close(self, pid):
+        rest = self.partial.pop(pid, b'')
+        if rest.strip():
+            self.append(time.time(), pid, rest)
+
+    def append(self, timestamp, pid, line):
+        self.lines.append((timestamp, pid, line[:MAX_LINE_LENGTH].decode('utf-8', 'replace').rstrip()))
+
+
+class FFmpegLauncher:
+    """Starts encoders and collects their stderr into per-stream ring buffers.
+
+    Each process runs in a new session with close_fds, stdin from /dev/null
+    and stdout discarded. One selector thread reads the stderr pipes of every
+    process, so the number of threads does not grow with the number of
+    streams, and nothing writes to a console. (Windows cannot select() on
+    pipes, there each process gets a reader thread instead.)
+    """
+
+    def __init__(self, log_lines=LOG_LINES, stop_timeout=STOP_TIMEOUT):
+        self.log_lines = log_lines
+        self.stop_timeout = stop_timeout
+
+        self._lock = threading.Lock()
+        self._logs = {}  # stream name -> LogRing
+        self._pending = []
+        self._thread = None
+        if POSIX:
+            self._selector = selectors.DefaultSelector()
+            # Self-pipe: new registrations wake the reader from select()
+            self._wakeup_read, self._wakeup_write = os.pipe()
+            os.set_blocking(self._wakeup_read, False)
+            self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+    def spawn(self, stream_name, cmd):
+        """Start cmd, its stderr goes to stream_name's log. Returns the FFmpegProcess."""
+        kwargs = {'start_new_session': True} if POSIX else \
+            {'creationflags': getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)}
+        process = FFmpegProcess(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, close_fds=True, **kwargs)
+        process.stop_timeout = self.stop_timeout
+
+        with self._lock:
+            ring = self._logs.get(stream_name)
+            if not ring:
+                ring = self._logs[stream_name] = LogRing(self.log_lines)
+            ring.append(time.time(), process.pid, f"--- started: {subprocess.list2cmdline(cmd)}".encode())
+            if not POSIX:
+                threading.Thread(target=self._read_pipe, args=(process, ring), daemon=True).start()
+                return process
+            self._pending.append((process, ring))
+            if not self._thread:
+                self._thread = threading.Thread(target=self._read_loop, name='ffmpeg-logs', daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_write, b'\0')
+        return process
+
+    def logs(self, stream_name, limit=None):
+        """Recent output lines of a stream as dicts, oldest first; None if it never logged"""
+        with self._lock:
+            ring = self._logs.get(stream_name)
+            if ring is None:
+                return None
+            lines = list(ring.lines)
+        if limit:
+            lines = lines[-limit:]
+        return [{'time': timestamp, 'pid': pid, 'line': line} for timestamp, pid, line in lines]
+
+    def forget(self, stream_name):
+        """Drop a removed stream's log"""
+        with self._lock:
+            self._logs.pop(stream_name, None)
+
+    def _read_loop(self):
+        # Must not die: an undrained stderr pipe would block the encoders once it fills
+        while True:
+            try:
+                for key, _ in self._selector.select():
+                    if key.data is None:
+                        self._register_pending()
+                    else:
+                        self._read(key)
+            except Exception as e:
+                logger.error(f"FFmpeg log reader error: {e}")
+                time.sleep(0.1)
+
+    def _read(self, key):
+        process, ring = key.data
+        try:
+            data = os.read(key.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        with self._lock:
+            if data:
+                ring.feed(process.pid, data)
+            else:
+                ring.close(process.pid)
+        if not data:
+            # EOF: the process (and anything holding its stderr) is gone
+            self._selector.unregister(key.fd)
+            process.stderr.close()
+
+    def _read_pipe(self, process, ring):
+        # Blocking reader for platforms without select() on pipes
+        for data in iter(lambda: process.stderr.read1(READ_SIZE), b''):
+            with self._lock:
+                ring.feed(process.pid, data)
+        with self._lock:
+            ring.close(process.pid)
+        process.stderr.close()
+
+    def _register_pending(self):
+        try:
+            while os.read(self._wakeup_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for process, ring in pending:
+            os.set_blocking(process.stderr.fileno(), False)
+            self._selector.register(process.stderr.fileno(), selectors.EVENT_READ, (process, ring))
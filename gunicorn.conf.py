@@ -0,0 +1,43 @@
+# Production serving for main.py
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# gthread workers handle blocking requests (uploads, /events subscribers) on
+# threads. Stream state lives in one dedicated manager process started here,
+# every worker connects to it through STREAM_MANAGER_ADDRESS.
+
+import os
+import sys
+import subprocess
+import time
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_WORKERS', 2))
+threads = int(os.environ.get('WEB_THREADS', 16))  # Each /events subscriber holds one thread
+timeout = 120  # Large uploads
+graceful_timeout = 10
+keepalive = 5
+
+# Where workers find the stream manager (unix socket path or host:port)
+os.environ.setdefault('STREAM_MANAGER_ADDRESS', '/tmp/multi-stream-rtsp-manager.sock')
+
+_manager_process = None
+
+
+def on_starting(server):
+    """Start the single stream manager process before any worker boots"""
+    global _manager_process
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    _manager_process = subprocess.Popen([sys.executable, main_py, '--stream-manager'])
+    server.log.info(f"Stream manager started (pid {_manager_process.pid})")
+
+    # Give it a moment to bind; workers also retry on connect
+    time.sleep(0.5)
+
+
+def on_exit(server):
+    """Stop the stream manager (and with it every FFmpeg process)"""
+    if _manager_process and _manager_process.poll() is None:
+        _manager_process.terminate()
+        _manager_process.wait(timeout=10)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Load test for the Flask control plane (main.py)
+
+Usage:
+    python loadtest.py [base_url] [--concurrency N] [--duration S] [--uploads N]
+    python loadtest.py --join localhost:8554 [--join-video movie.Mjpeg] [--joins N]
+
+Measures requests per second and latency percentiles for GET /status and for
+concurrent POST /upload. Run it against `python main.py` and against
+`gunicorn -c gunicorn.conf.py main:app` to compare the two serving modes.
+
+With --join it measures join time against the custom RTSP server (test/main2.py):
+the time from sending PLAY to receiving the first decodable (keyframe) RTP packet.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import requests
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, status_codes, elapsed):
+    """Build a result dict and print a one-block summary"""
+    result = {
+        'name': name,
+        'requests': len(latencies),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0,
+        'status_codes': {str(code): count for code, count in sorted(status_codes.items(), key=lambda item: str(item[0]))},
+    }
+
+    print(f"{name}")
+    print(f"  Requests:   {result['requests']} in {result['elapsed_seconds']}s")
+    print(f"  Throughput: {result['requests_per_second']} req/s")
+    print(f"  Latency:    p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  max {result['max_ms']}ms")
+    print(f"  Status:     {result['status_codes']}")
+    return result
+
+
+def run_workers(worker, concurrency):
+    """Run `worker(latencies, status_codes)` on N threads and collect results"""
+    latencies = []
+    status_codes = {}
+    lock = threading.Lock()
+
+    def target():
+        local_latencies, local_codes = [], {}
+        worker(local_latencies, local_codes)
+        with lock:
+            latencies.extend(local_latencies)
+            for code, count in local_codes.items():
+                status_codes[code] = status_codes.get(code, 0) + count
+
+    threads = [threading.Thread(target=target) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, status_codes, time.perf_counter() - start
+
+
+def bench_status(base_url, concurrency, duration, use_etag=False):
+    """Hammer GET /status from N threads for a fixed duration"""
+    deadline = time.perf_counter() + duration
+
+    def worker(latencies, status_codes):
+        session = requests.Session()
+        etag = None
+        while time.perf_counter() < deadline:
+            headers = {'If-None-Match': etag} if use_etag and etag else {}
+            start = time.perf_counter()
+            try:
+                response = session.get(f'{base_url}/status', headers=headers, timeout=10)
+                code = response.status_code
+                etag = response.headers.get('ETag', etag)
+            except requests.exceptions.RequestException:
+                code = 'error'
+            latencies.append(time.perf_counter() - start)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    latencies, status_codes, elapsed = run_workers(worker, concurrency)
+    name = f"GET /status ({concurrency} clients{', If-None-Match' if use_etag else ''})"
+    return summarize(name, latencies, status_codes, elapsed)
+
+
+def bench_upload(base_url, concurrency, uploads, payload_size):
+    """Send concurrent POST /upload requests, each with its own stream name"""
+    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as handle:
+        handle.write(os.urandom(payload_size))
+        payload_path = handle.name
+
+    counter = iter(range(uploads))
+    counter_lock = threading.Lock()
+
+    def worker(latencies, status_codes):
+        session = requests.Session()
+        while True:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            start = time.perf_counter()
+            try:
+                with open(payload_path, 'rb') as video:
+                    response = session.post(
+                        f'{base_url}/upload',
+                        files={'file': ('loadtest.mp4', video, 'video/mp4')},
+                        data={'stream_name': f'loadtest_{index}'},
+                        timeout=60,
+                    )
+                code = response.status_code
+            except requests.exceptions.RequestException:
+                code = 'error'
+            latencies.append(time.perf_counter() - start)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    try:
+        latencies, status_codes, elapsed = run_workers(worker, concurrency)
+    finally:
+        os.remove(payload_path)
+    return summarize(f"POST /upload ({concurrency} clients, {payload_size // 1024}KB)", latencies, status_codes, elapsed)
+
+
+def join_once(host, port, video, timeout):
+    """SETUP + PLAY against the custom server, returns seconds until the first keyframe or None"""
+    rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rtp_socket.bind(('', 0))
+    rtp_socket.settimeout(timeout)
+    rtsp_socket = socket.create_connection((host, port), timeout=timeout)
+    try:
+        rtp_port = rtp_socket.getsockname()[1]
+        url = f"rtsp://{host}:{port}/{video}"
+        rtsp_socket.send(f"SETUP {url} RTSP/1.0\r\nCSeq: 1\r\n"
+                         f"Transport: RTP/AVP;unicast;client_port={rtp_port}-{rtp_port + 1}\r\n\r\n".encode('utf-8'))
+        reply = rtsp_socket.recv(1024)
+        if b'200 OK' not in reply:
+            return None
+        session = reply.split(b'Session: ', 1)[1].split(b'\r\n', 1)[0].decode()
+
+        start = time.perf_counter()
+        rtsp_socket.send(f"PLAY {url} RTSP/1.0\r\nCSeq: 2\r\nSession: {session}\r\n\r\n".encode('utf-8'))
+        deadline = start + timeout
+        while time.perf_counter() < deadline:
+            try:
+                packet = rtp_socket.recv(65536)
+            except socket.timeout:
+                return None
+            # 12 byte RTP header, MJPEG keyframes start with the JPEG SOI marker
+            if packet[12:14] == b'\xff\xd8':
+                return time.perf_counter() - start
+        return None
+    finally:
+        try:
+            rtsp_socket.send(f"TEARDOWN rtsp://{host}:{port}/{video} RTSP/1.0\r\nCSeq: 3\r\n\r\n".encode('utf-8'))
+        except OSError:
+            pass
+        rtsp_socket.close()
+        rtp_socket.close()
+
+
+def bench_join(target, video, concurrency, joins, timeout=10.0):
+    """Join the same stream repeatedly from N threads, latency is PLAY -> first keyframe"""
+    host, _, port = target.rpartition(':')
+    counter = iter(range(joins))
+    counter_lock = threading.Lock()
+
+    def worker(latencies, status_codes):
+        while True:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            try:
+                join_seconds = join_once(host or 'localhost', int(port), video, timeout)
+                code = 'ok' if join_seconds is not None else 'timeout'
+            except OSError:
+                join_seconds, code = None, 'error'
+            if join_seconds is not None:
+                latencies.append(join_seconds)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    latencies, status_codes, elapsed = run_workers(worker, concurrency)
+    return summarize(f"Join {video} on {target} ({concurrency} clients)", latencies, status_codes, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Multi-Stream RTSP Server API")
+    parser.add_argument('base_url', nargs='?', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per /status run")
+    parser.add_argument('--uploads', type=int, default=32, help="Total uploads (0 to skip)")
+    parser.add_argument('--upload-size', type=int, default=256 * 1024, help="Bytes per upload")
+    parser.add_argument('--join', metavar='HOST:PORT', help="Measure join time on the custom RTSP server instead")
+    parser.add_argument('--join-video', default='movie.Mjpeg', help="Video requested in SETUP")
+    parser.add_argument('--joins', type=int, default=50, help="Total joins")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.join:
+        print("=" * 60)
+        print(f"Join time against rtsp://{args.join}/{args.join_video}")
+        print("=" * 60)
+        results = [bench_join(args.join, args.join_video, args.concurrency, args.joins)]
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump({'target': args.join, 'timestamp': time.time(), 'results': results}, handle, indent=2)
+            print(f"Results written to {args.json}")
+        return
+
+    print("=" * 60)
+    print(f"Load test against {args.base_url}")
+    print("=" * 60)
+
+    results = [
+        bench_status(args.base_url, args.concurrency, args.duration),
+        bench_status(args.base_url, args.concurrency, args.duration, use_etag=True),
+    ]
+    if args.uploads:
+        results.append(bench_upload(args.base_url, args.concurrency, args.uploads, args.upload_size))
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump({'base_url': args.base_url, 'timestamp': time.time(), 'results': results}, handle, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,22 @@
 import os
 import uuid
-import subprocess
 import logging
 import time
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
-import threading
-import requests
+import sys
+import signal
+from multiprocessing.managers import RemoteError
+from mediamtx_client import MediaMTXError
+from node_pool import NodePool, NoNodeAvailable
+from rebalancer import Rebalancer, MigrationError
+import encoder_profiles
+from playlists import PlaylistStore, PlaylistError, CHAIN_SUFFIX
+from mjpeg_export import MjpegExporter
+from ffmpeg_launcher import FFmpegLauncher
+from encoder_isolation import EncoderIsolation
+from stream_manager import StreamManager, RemoteStreamManager, serve_stream_manager
 
 
 # Configure logging
@@ -30,33 +39,108 @@ RTSP_HOST = 'localhost'  # Docker container accessible on localhost
 RTSP_PORT = 8554
 MEDIAMTX_API_PORT = 9997
 
+# Several MediaMTX nodes, as a JSON list of {"name", "host", "rtsp_port", "api_port", "weight",
+# "max_streams", "public_host"}. Unset means a single node at RTSP_HOST:RTSP_PORT.
+MEDIAMTX_NODES = os.environ.get('MEDIAMTX_NODES')
+
+# Moving streams between nodes (POST /streams/<name>/migrate, POST /rebalance)
+REBALANCE_AUTO = False         # Rebalance in the background by node readers/CPU
+REBALANCE_INTERVAL = 60        # Seconds between automatic rounds
+REBALANCE_THRESHOLD = 1.5      # Hottest node must exceed this multiple of the mean heat
+REBALANCE_COOLDOWN = 300       # Seconds before the same stream may move again
+MIGRATION_KEYFRAME_TIMEOUT = 15  # Seconds to wait for the new publisher's first media
+MEDIAMTX_HEALTH_INTERVAL = 5  # Seconds between background MediaMTX probes
+METRICS_TICK_INTERVAL = 5     # Seconds between 'tick' events on /events
+SSE_KEEPALIVE_INTERVAL = 15   # Seconds of silence before an SSE comment is sent
+
+# Paths are created/deleted per stream through the MediaMTX API instead of a catch-all regex
+MEDIAMTX_MANAGE_PATHS = True
+MEDIAMTX_PATH_SETTINGS = {
+    'source': 'publisher',
+    'overridePublisher': True,  # A re-upload replaces the running publisher
+}
+
+# On-demand streams: MediaMTX calls ON_DEMAND_HOOK_URL/<stream_name> when the first reader
+# arrives, FFmpeg is stopped after ON_DEMAND_IDLE_TIMEOUT seconds without readers
+ON_DEMAND_DEFAULT = False
+ON_DEMAND_IDLE_TIMEOUT = 60
+ON_DEMAND_HOOK_URL = os.environ.get('ON_DEMAND_HOOK_URL', 'http://host.docker.internal:5000/hooks/demand')
+ON_DEMAND_PATH_SETTINGS = {
+    'runOnDemand': f'wget -q -O /dev/null --post-data= {ON_DEMAND_HOOK_URL}/$MTX_PATH',
+    'runOnDemandRestart': False,
+    'runOnDemandStartTimeout': '15s',  # Reader waits this long for FFmpeg to publish
+    'runOnDemandCloseAfter': f'{ON_DEMAND_IDLE_TIMEOUT}s',
+}
+
+# Shared stream manager process used when serving with several workers (see gunicorn.conf.py).
+# Unset means the stream state lives inside this process (python main.py).
+STREAM_MANAGER_ADDRESS = os.environ.get('STREAM_MANAGER_ADDRESS')
+STREAM_MANAGER_AUTHKEY = os.environ.get('STREAM_MANAGER_AUTHKEY', 'multi-stream-rtsp-server').encode()
+
+# Encoding - named profiles in encoder_profiles.py, GOP follows the source fps
+DEFAULT_ENCODE_PROFILE = encoder_profiles.DEFAULT_PROFILE
+MAX_CONCURRENT_ENCODERS = 8   # Expected encoders per host, caps threads per FFmpeg process
+ENCODER_RESERVED_CORES = 1    # Cores left for Flask / MediaMTX
+ENCODER_THREADS = encoder_profiles.encoder_threads(MAX_CONCURRENT_ENCODERS, ENCODER_RESERVED_CORES)
+# Slowest preset this host can sustain, from `python encoder_profiles.py calibrate`
+ENCODER_PRESET_CAP = encoder_profiles.load_calibration()
+FFMPEG_LOG_LINES = 200        # Recent stderr lines kept per stream, GET /streams/<name>/logs
+FFMPEG_STOP_TIMEOUT = 5       # Seconds after SIGTERM before the encoder's process group is killed
+ENCODER_PIN_CORES = True      # Spread encoders over the cores after ENCODER_RESERVED_CORES
+ENCODER_CGROUP_ROOT = os.environ.get('ENCODER_CGROUP_ROOT')  # Delegated cgroup v2 directory, unset disables limits
+ENCODER_CPU_MAX = None        # Cores each encoder may use under cgroups (None = its ENCODER_THREADS)
+ENCODER_MEMORY_MAX = 1024 * 1024 * 1024  # Bytes per encoder under cgroups
+
+# Playlists - channels built from several uploads, normalized once then streamed with -c copy
+PLAYLIST_FOLDER = 'playlists'
+SEGMENT_FOLDER = 'segments'
+PLAYLIST_PROFILE = 'balanced'       # Encode profile used for normalized segments
+PLAYLIST_SIZE = (1280, 720)         # Every segment is scaled/padded to this
+PLAYLIST_FPS = 30
+PLAYLIST_NORMALIZE_WORKERS = 2      # Concurrent normalization encodes
+
+# MJPEG export - uploads also converted to .Mjpeg for the custom RTSP server (test/main2.py)
+MJPEG_EXPORT_FOLDER = os.environ.get('MJPEG_EXPORT_FOLDER')  # Directory main2.py serves, unset disables
+MJPEG_EXPORT_SIZE = (640, 360)      # Fit within, each frame must stay under 99999 bytes
+MJPEG_EXPORT_FPS = None             # None keeps the source frame rate
+MJPEG_EXPORT_QUALITY = 5            # FFmpeg -q:v, raised automatically when frames are too large
+MJPEG_EXPORT_WORKERS = 2            # Concurrent conversions
+
 # Create upload directory
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# Global dictionary to track running/active streams
-active_streams = {}
+playlist_store = PlaylistStore(PLAYLIST_FOLDER, SEGMENT_FOLDER, PLAYLIST_PROFILE, PLAYLIST_SIZE[0], PLAYLIST_SIZE[1],
+                               PLAYLIST_FPS, PLAYLIST_NORMALIZE_WORKERS)
+
+mjpeg_exporter = MJPEG_EXPORT_FOLDER and MjpegExporter(MJPEG_EXPORT_FOLDER, MJPEG_EXPORT_SIZE[0], MJPEG_EXPORT_SIZE[1],
+                                                       MJPEG_EXPORT_FPS, MJPEG_EXPORT_QUALITY, MJPEG_EXPORT_WORKERS)
+
+# Starts encoders in their own process group, one thread collects every encoder's stderr
+ffmpeg_launcher = FFmpegLauncher(FFMPEG_LOG_LINES, FFMPEG_STOP_TIMEOUT)
+# Core pinning, nice/ionice per profile and optional cgroup limits for each encoder
+encoder_isolation = EncoderIsolation(ENCODER_RESERVED_CORES, ENCODER_PIN_CORES, ENCODER_CGROUP_ROOT,
+                                     ENCODER_CPU_MAX, ENCODER_MEMORY_MAX)
+
+# MediaMTX nodes streams are placed on, each with a pooled control API client
+node_pool = NodePool.from_config(MEDIAMTX_NODES, RTSP_HOST, RTSP_PORT, MEDIAMTX_API_PORT)
 
 def check_mediamtx_running(): ##
     """Check if MediaMTX Docker container is running and accessible"""
-    try:
-        # Try to access MediaMTX API
-        response = requests.get(f'http://{RTSP_HOST}:{MEDIAMTX_API_PORT}/v3/config/global/get', timeout=3)
-        if response.status_code == 200:
-            logger.info("MediaMTX Docker container is running and accessible")
-            return True
-    except requests.exceptions.RequestException:
-        pass
+    # Try to access MediaMTX API on any node
+    if node_pool.any_alive():
+        logger.debug("MediaMTX Docker container is running and accessible")
+        return True
     
     # Fallback: try to connect to RTSP port
     import socket
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(2)
-        result = sock.connect_ex((RTSP_HOST, RTSP_PORT))
+        result = sock.connect_ex((node_pool.primary.host, node_pool.primary.rtsp_port))
         sock.close()
         if result == 0:
-            logger.info("MediaMTX RTSP port is accessible")
+            logger.debug("MediaMTX RTSP port is accessible")
             return True
     except Exception:
         pass
@@ -64,6 +148,18 @@ def check_mediamtx_running(): ##
     logger.warning("MediaMTX not accessible. Make sure Docker container is running.")
     return False
 
+def probe_mediamtx():
+    """Background probe: node health, per-path publish state, readers and byte counters, encoder usage"""
+    path_stats = node_pool.check_health()
+    if MEDIAMTX_MANAGE_PATHS:
+        node_pool.delete_stale()
+    stream_manager.set_nodes(node_pool.views())
+    stream_manager.set_usage(encoder_isolation.sample())
+    if any(node.healthy for node in node_pool.nodes.values()):
+        stream_manager.set_path_stats(path_stats)
+        return True
+    return check_mediamtx_running()
+
 def start_mediamtx():
     """Check MediaMTX status instead of starting local executable"""
     if check_mediamtx_running():
@@ -90,22 +186,43 @@ def allowed_file(filename):
     # Check if file extension is allowed
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def start_rtsp_stream(stream_name, video_path):
-    # Start RTSP stream using FFmpeg
-    rtsp_url = f"rtsp://{RTSP_HOST}:{RTSP_PORT}/{stream_name}"
+def start_rtsp_stream(stream_name, video_path, node=None, profile=None):
+    # Start RTSP stream using FFmpeg, publishing to the node the stream is placed on
+    if node is None:
+        try:
+            node = node_pool.place(stream_name)
+        except NoNodeAvailable as e:
+            logger.error(str(e))
+            return None, None
+    rtsp_url = node.publish_url(stream_name)
+
+    if video_path.endswith(CHAIN_SUFFIX):
+        # Playlist: chain of ffconcat lists over pre-normalized segments, loops by itself
+        input_args = [
+            '-f', 'concat',             # Concat demuxer, re-reads each list as it reaches it
+            '-i', video_path,
+        ]
+        codec_args = ['-c', 'copy']     # Segments share codec parameters, no re-encode
+    else:
+        input_args = [
+            '-stream_loop', '-1',       # Loop video indefinitely
+            '-i', video_path,           # Input video file
+        ]
+        codec_args = [
+            *encoder_profiles.video_args(   # H.264 preset/GOP/threads from the encode profile
+                profile or DEFAULT_ENCODE_PROFILE, encoder_profiles.probe_source(video_path),
+                ENCODER_THREADS, ENCODER_PRESET_CAP),
+            '-c:a', 'aac',              # Audio codec
+            '-b:a', '128k',             # Audio bitrate
+        ]
    
     # FFmpeg command for RTSP streaming with infinite loop
     ffmpeg_cmd = [
         'ffmpeg',
+        '-hide_banner',                 # Keep the captured log to what this stream does
         '-re',                          # Read input at native frame rate
-        '-stream_loop', '-1',           # Loop video indefinitely
-        '-i', video_path,               # Input video file
-        '-c:v', 'libx264',              # Video codec H.264
-        '-preset', 'ultrafast',         # Fast encoding preset
-        '-tune', 'zerolatency',         # Low latency tuning
-        '-g', '30',                     # GOP size (keyframe interval)
-        '-c:a', 'aac',                  # Audio codec
-        '-b:a', '128k',                 # Audio bitrate
+        *input_args,
+        *codec_args,
         '-f', 'rtsp',                   # Output format RTSP
         '-rtsp_transport', 'tcp',       ## Use TCP for reliability with Docker ##
         rtsp_url                        # RTSP output URL
@@ -113,13 +230,16 @@ def start_rtsp_stream(stream_name, video_path):
     
     try:
         # Start FFmpeg process
-        process = subprocess.Popen(
-            ffmpeg_cmd,
-            #stdout=subprocess.PIPE,
-            #stderr=subprocess.PIPE,
-            #universal_newlines=True,
-            creationflags=subprocess.CREATE_NEW_CONSOLE
-        )
+        # New process group, stderr captured into the stream's log ring
+        process = ffmpeg_launcher.spawn(stream_name, ffmpeg_cmd)
+        try:
+            isolation = encoder_isolation.apply(stream_name, process,
+                                                encoder_profiles.ENCODE_PROFILES.get(profile or DEFAULT_ENCODE_PROFILE, {}),
+                                                ENCODER_THREADS)
+            logger.debug(f"Encoder for '{stream_name}' isolated: {isolation}")
+        except Exception as e:
+            # The encoder is already running, keep it unisolated rather than orphan it
+            logger.warning(f"Could not isolate encoder for '{stream_name}': {e}")
                 
         logger.info(f"RTSP stream started for '{stream_name}' at {rtsp_url}")
         return process, rtsp_url
@@ -129,53 +249,88 @@ def start_rtsp_stream(stream_name, video_path):
         return None, None
 
 
+def rtsp_path_settings(on_demand):
+    # MediaMTX path configuration for a stream
+    settings = dict(MEDIAMTX_PATH_SETTINGS)
+    if on_demand:
+        settings.update(ON_DEMAND_PATH_SETTINGS)
+    return settings
+
+
+def prepare_rtsp_path(stream_name, on_demand):
+    # Place the stream on a node and create its MediaMTX path before anything publishes to (or reads from) it
+    try:
+        node = node_pool.place(stream_name)
+    except NoNodeAvailable as e:
+        logger.error(str(e))
+        return None
+
+    if MEDIAMTX_MANAGE_PATHS:
+        try:
+            node.client.replace_path(stream_name, rtsp_path_settings(on_demand))
+        except MediaMTXError as e:
+            logger.error(f"Failed to create MediaMTX path for '{stream_name}' on node '{node.name}': {e}")
+            node_pool.release(stream_name)
+            return None
+
+    stream_manager.set_nodes(node_pool.views())
+    return node.rtsp_url(stream_name), node.name
+
+
+def release_rtsp_path(stream_name):
+    # Delete the stream's MediaMTX path once its publisher is gone, and free its node slot
+    node = node_pool.release(stream_name)
+    stream_manager.set_nodes(node_pool.views())
+    ffmpeg_launcher.forget(stream_name)
+    if not MEDIAMTX_MANAGE_PATHS:
+        return
+
+    # Also drop redirect paths left behind by migrations
+    nodes = node_pool.take_redirects(stream_name) + ([node] if node else [])
+    for node in nodes:
+        try:
+            node.client.delete_path(stream_name)
+        except MediaMTXError as e:
+            logger.warning(f"Failed to delete MediaMTX path for '{stream_name}' on node '{node.name}': {e}")
+
+
 def stop_existing_stream(stream_name):
     # Stop existing stream if it exists
-    if stream_name in active_streams:
-        existing_process = active_streams[stream_name].get('process')
-        if existing_process and existing_process.poll() is None:
-            existing_process.terminate()
-            logger.info(f"Stopped existing stream: {stream_name}")
+    stream_manager.stop_stream(stream_name)
 
 
-def start_stream_background(stream_name, video_path, filename):
-    def target():
-        process, rtsp_url = start_rtsp_stream(stream_name, video_path)
-        
-        if process and rtsp_url:
-            active_streams[stream_name] = {
-                'process': process,
-                'rtsp_url': rtsp_url,
-                'filename': filename,
-                'file_path': video_path,
-                'created_at': time.time(),
-                'stream_name': stream_name
+def create_stream_manager():
+    # Connect to the shared manager process when one is configured, otherwise own the state locally
+    if STREAM_MANAGER_ADDRESS and '--stream-manager' not in sys.argv:
+        return RemoteStreamManager(STREAM_MANAGER_ADDRESS, STREAM_MANAGER_AUTHKEY)
+    manager = StreamManager(RTSP_HOST, RTSP_PORT, launcher=start_rtsp_stream, prepare=prepare_rtsp_path,
+                            release=release_rtsp_path, idle_timeout=ON_DEMAND_IDLE_TIMEOUT,
+                            logs=ffmpeg_launcher.logs)
+    manager.rebalancer = Rebalancer(node_pool, manager, start_rtsp_stream, rtsp_path_settings,
+                                    manage_paths=MEDIAMTX_MANAGE_PATHS,
+                                    keyframe_timeout=MIGRATION_KEYFRAME_TIMEOUT)
+    return manager
 
-            }
-        else:
-            logger.error(f"Failed to start stream in the background for {stream_name}")
 
-    thread = threading.Thread(target=target, daemon=True)
-    thread.start()
-    return thread
+# Owns running/active streams; handlers read its published snapshots
+stream_manager = create_stream_manager()
 
 
 @app.route('/', methods=['GET'])
 def landing_page():
     # Landing page - returns JSON with instructions and active streams
-    mediamtx_status = "running" if check_mediamtx_running() else "not accessible" ##
+    snapshot = stream_manager.snapshot()
+    mediamtx_status = "running" if snapshot.mediamtx_accessible else "not accessible" ##
 
     # Get current status of all streams
     active_stream_list = []
-    for stream_name, stream_info in active_streams.items():
-        process = stream_info.get('process')
-        is_running = process and process.poll() is None
-        
+    for stream_name, stream_info in snapshot.streams.items():
         active_stream_list.append({
             'stream_name': stream_name,
             'filename': stream_info.get('filename', 'Unknown'),
             'rtsp_url': stream_info.get('rtsp_url', ''),
-            'is_running': is_running,
+            'is_running': stream_info['is_running'],
+            'status': stream_info['status'],
             'started_at': time.strftime('%Y-%m-%d %H:%M:%S', 
                                      time.localtime(stream_info.get('created_at', 0)))
         })
@@ -184,8 +339,14 @@ def landing_page():
         'message': 'Multi-Stream RTSP Server',
         'mediamtx_status': mediamtx_status,
         'instructions': {
-            'upload': 'POST /upload with multipart form: file (video) + stream_name (string)',
+            'upload': 'POST /upload with multipart form: file (video) + stream_name (string) + optional on_demand (true/false) + optional profile',
+            'encode_profiles': list(encoder_profiles.ENCODE_PROFILES),
             'status': 'GET /status for all active streams',
+            'logs': 'GET /streams/<stream_name>/logs?lines=N for recent FFmpeg output',
+            'usage': 'GET /usage for per-stream encoder CPU and memory use',
+            'events': 'GET /events for a Server-Sent Events feed of stream state changes',
+            'playlists': 'POST /playlists with JSON {"name", "items": [uploaded filenames]}, PUT /playlists/<name> to reorder live',
+            'mjpeg': 'GET /mjpeg for uploads converted for the custom RTSP server (when MJPEG_EXPORT_FOLDER is set)',
             'supported_formats': list(ALLOWED_EXTENSIONS),
             'rtsp_access': f'rtsp://{RTSP_HOST}:{RTSP_PORT}/[stream_name]',##
             'docker_note': 'MediaMTX runs in Docker container'
@@ -214,6 +375,8 @@ def upload_video():
     
     file = request.files['file']
     stream_name = request.form['stream_name'].strip()
+    on_demand = request.form.get('on_demand', str(ON_DEMAND_DEFAULT)).strip().lower() in ('1', 'true', 'yes', 'on')
+    profile = request.form.get('profile', DEFAULT_ENCODE_PROFILE).strip()
     
     # Validate inputs
     if file.filename == '':
@@ -225,6 +388,9 @@ def upload_video():
     if not allowed_file(file.filename):
         return jsonify({'error': f'File type not allowed. Supported: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
     
+    if profile not in encoder_profiles.ENCODE_PROFILES:
+        return jsonify({'error': f'Unknown profile. Supported: {", ".join(encoder_profiles.ENCODE_PROFILES)}'}), 400
+    
     # Validate stream_name (alphanumeric, underscore, hyphen only)
     import re
     if not re.match(r'^[a-zA-Z0-9_-]+$', stream_name):
@@ -243,24 +409,27 @@ def upload_video():
         
         logger.info(f"File saved: {file_path}")
         
-        # Start RTSP stream
-        start_stream_background(stream_name, file_path, filename)
-
-        # Give it time to initialize 
-        time.sleep(1)
-
-        stream_info = active_streams.get(stream_name)
+        # Start RTSP stream - Popen returns immediately, later exits show up on /events
+        # (on-demand streams only register here and start when the first reader connects)
+        stream_info = stream_manager.start_stream(stream_name, file_path, filename, on_demand, profile)
         if not stream_info:
          return jsonify({'error': 'Failed to start RTSP stream'}), 500
 
         rtsp_url = stream_info['rtsp_url']
         
         logger.info(f"Stream '{stream_name}' started successfully")
+
+        # The .Mjpeg conversion runs in the background, GET /mjpeg reports it
+        mjpeg_export = mjpeg_exporter and mjpeg_exporter.submit(stream_name, file_path)
         
         return jsonify({
             'success': True,
             'stream_name': stream_name,
             'rtsp_url': rtsp_url,
+            'on_demand': stream_info['on_demand'],
+            'profile': stream_info['profile'],
+            'status': stream_info['status'],
+            'mjpeg_export': mjpeg_export or None,
             'message': f'Stream started successfully for {stream_name}'
         })
         
@@ -268,51 +437,247 @@ def upload_video():
         logger.error(f"Upload error: {e}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+def resolve_playlist_items(filenames):
+    # Map item filenames to files already in the upload folder
+    if not isinstance(filenames, list) or not filenames:
+        raise PlaylistError('items must be a non-empty list of uploaded filenames')
+    items = []
+    for filename in filenames:
+        file_path = os.path.join(UPLOAD_FOLDER, secure_filename(str(filename)))
+        if not os.path.isfile(file_path):
+            raise PlaylistError(f"Uploaded file not found: {filename}")
+        items.append({'filename': os.path.basename(file_path), 'file_path': file_path})
+    return items
+
+
+def start_playlist_stream(name, on_demand=False):
+    # Called once the first chain is written; the publisher then survives every edit
+    if not playlist_store.exists(name):
+        return
+    if not stream_manager.start_stream(name, playlist_store.chain_head(name), f'playlist:{name}', on_demand,
+                                       PLAYLIST_PROFILE):
+        logger.error(f"Failed to start publisher for playlist '{name}'")
+
+
+def playlist_view(playlist):
+    # Playlist plus the stream it feeds
+    stream_info = stream_manager.get(playlist['name'])
+    return dict(playlist, stream=stream_info and {
+        'rtsp_url': stream_info['rtsp_url'],
+        'status': stream_info['status'],
+    })
+
+
+@app.route('/playlists', methods=['GET'])
+def list_playlists():
+    return jsonify({'playlists': [playlist_view(playlist) for playlist in playlist_store.list()]})
+
+
+@app.route('/playlists', methods=['POST'])
+def create_playlist():
+    # Build a channel from uploaded files; it starts publishing once every item is normalized
+    payload = request.get_json(silent=True) or {}
+    name = str(payload.get('name', '')).strip()
+    on_demand = bool(payload.get('on_demand', ON_DEMAND_DEFAULT))
+
+    import re
+    if not re.match(r'^[a-zA-Z0-9_-]+$', name):
+        return jsonify({'error': 'Playlist name can only contain letters, numbers, underscores, and hyphens'}), 400
+    if stream_manager.get(name) and not playlist_store.exists(name):
+        return jsonify({'error': f'A stream named {name} already exists'}), 409
+
+    try:
+        items = resolve_playlist_items(payload.get('items'))
+        playlist = playlist_store.create(name, items, lambda name: start_playlist_stream(name, on_demand))
+    except PlaylistError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(dict(playlist_view(playlist), success=True)), 202
+
+
+@app.route('/playlists/<name>', methods=['GET'])
+def get_playlist(name):
+    playlist = playlist_store.get(name)
+    if not playlist:
+        return jsonify({'error': f'No playlist named {name}'}), 404
+    return jsonify(playlist_view(playlist))
+
+
+@app.route('/playlists/<name>', methods=['PUT'])
+def update_playlist(name):
+    # Replace the item order live; new items are normalized first, the publisher is not restarted
+    if not playlist_store.exists(name):
+        return jsonify({'error': f'No playlist named {name}'}), 404
+    payload = request.get_json(silent=True) or {}
+    try:
+        playlist = playlist_store.update(name, resolve_playlist_items(payload.get('items')))
+    except PlaylistError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(dict(playlist_view(playlist), success=True)), 202
+
+
+@app.route('/playlists/<name>/items', methods=['POST'])
+def append_playlist_item(name):
+    # Upload a file straight into a playlist, appended at the end (or at form field "position")
+    playlist = playlist_store.get(name)
+    if not playlist:
+        return jsonify({'error': f'No playlist named {name}'}), 404
+    file = request.files.get('file')
+    if not file or not allowed_file(file.filename):
+        return jsonify({'error': f'Provide a file. Supported: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+
+    filename = f"{name}_{secure_filename(file.filename)}"
+    file.save(os.path.join(UPLOAD_FOLDER, filename))
+
+    filenames = [item['filename'] for item in playlist['items']]
+    position = request.form.get('position', type=int)
+    filenames.insert(len(filenames) if position is None else position, filename)
+    playlist = playlist_store.update(name, resolve_playlist_items(filenames))
+    return jsonify(dict(playlist_view(playlist), success=True)), 202
+
+
+@app.route('/playlists/<name>', methods=['DELETE'])
+def delete_playlist(name):
+    if not playlist_store.exists(name):
+        return jsonify({'error': f'No playlist named {name}'}), 404
+    stream_manager.stop_stream(name)
+    playlist_store.delete(name)
+    return jsonify({'success': True, 'name': name})
+
+@app.route('/hooks/demand/<stream_name>', methods=['POST'])
+def on_demand_hook(stream_name):
+    # Called by MediaMTX runOnDemand when a reader requests an idle on-demand stream
+    stream_info = stream_manager.activate(stream_name)
+    if not stream_info:
+        return jsonify({'error': f'No on-demand stream named {stream_name}'}), 404
+
+    return jsonify({
+        'success': True,
+        'stream_name': stream_name,
+        'status': stream_info['status'],
+        'pid': stream_info['pid'],
+    })
+
+@app.route('/usage', methods=['GET'])
+def encoder_usage():
+    # Latest encoder CPU/memory sample per stream, kept out of /status so its ETag stays stable
+    return jsonify({'streams': stream_manager.usage()})
+
+@app.route('/streams/<stream_name>/logs', methods=['GET'])
+def stream_logs(stream_name):
+    # Recent FFmpeg output of a stream (optional ?lines=N)
+    try:
+        limit = int(request.args.get('lines', FFMPEG_LOG_LINES))
+    except ValueError:
+        return jsonify({'error': 'lines must be an integer'}), 400
+
+    lines = stream_manager.logs(stream_name, max(1, limit))
+    if lines is None:
+        return jsonify({'error': f'No logs for stream {stream_name}'}), 404
+
+    return jsonify({
+        'stream_name': stream_name,
+        'lines': lines
+    })
+
+@app.route('/streams/<stream_name>/migrate', methods=['POST'])
+def migrate_stream(stream_name):
+    # Move a running stream to another MediaMTX node (optional "node" in JSON or form)
+    payload = request.get_json(silent=True) or request.form
+    try:
+        result = stream_manager.migrate(stream_name, payload.get('node'))
+    except MigrationError as e:
+        return jsonify({'error': str(e)}), 409
+    except RuntimeError as e:
+        # Migration is not configured (single node)
+        return jsonify({'error': str(e)}), 503
+    except (RemoteError, ConnectionError, EOFError) as e:
+        # Web worker lost its connection to the stream manager process
+        logger.error(f"Stream manager unavailable: {e}")
+        return jsonify({'error': 'Stream manager unavailable'}), 503
+
+    return jsonify(dict(result, success=True))
+
+@app.route('/rebalance', methods=['POST'])
+def rebalance_nodes():
+    # Run one rebalance round now, moving at most one stream
+    try:
+        result = stream_manager.rebalance(REBALANCE_THRESHOLD, REBALANCE_COOLDOWN)
+    except MigrationError as e:
+        return jsonify({'error': str(e)}), 409
+    except RuntimeError as e:
+        # Migration is not configured (single node)
+        return jsonify({'error': str(e)}), 503
+    except (RemoteError, ConnectionError, EOFError) as e:
+        # Web worker lost its connection to the stream manager process
+        logger.error(f"Stream manager unavailable: {e}")
+        return jsonify({'error': 'Stream manager unavailable'}), 503
+
+    return jsonify({
+        'success': True,
+        'migrated': result,
+        'message': 'Stream migrated' if result else 'Nodes are balanced, nothing to move'
+    })
+
+@app.route('/mjpeg', methods=['GET'])
+def mjpeg_exports():
+    # Latest .Mjpeg conversion of each uploaded stream
+    if not mjpeg_exporter:
+        return jsonify({'error': 'MJPEG export is disabled, set MJPEG_EXPORT_FOLDER to enable it'}), 404
+
+    return jsonify({
+        'folder': os.path.abspath(MJPEG_EXPORT_FOLDER),
+        'exports': mjpeg_exporter.jobs()
+    })
+
 @app.route('/status', methods=['GET'])
 def get_status():
-    # Check active streams and return JSON with all active streams and process status
-    mediamtx_accessible = check_mediamtx_running()
-
-
-    status_data = {
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
-        'mediamtx_accessible': mediamtx_accessible,
-        'mediamtx_host': RTSP_HOST,
-        'mediamtx_port': RTSP_PORT,
-        'total_streams': len(active_streams),
-        'rtsp_server': f'rtsp://{RTSP_HOST}:{RTSP_PORT}',
-        'streams': {}
-    }
-    
-    for stream_name, stream_info in active_streams.items():
-        process = stream_info.get('process')
-        
-        # Check if process is still running
-        if process:
-            is_running = process.poll() is None
-            if is_running:
-                process_status = 'running'
-                pid = process.pid
+    # Serve the cached, pre-serialized snapshot - no process polling or MediaMTX probing per request
+    snapshot = stream_manager.snapshot()
+
+    if snapshot.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    return response
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    # Server-Sent Events: a full 'snapshot' first, then incremental stream state diffs
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_id = None
+
+    def snapshot_event():
+        snapshot = stream_manager.snapshot()
+        return snapshot.event_id, f"id: {snapshot.event_id}\nevent: snapshot\ndata: {snapshot.body.decode('utf-8')}\n\n"
+
+    def generate():
+        event_id = last_id
+        if event_id is None:
+            event_id, message = snapshot_event()
+            yield message
+
+        while True:
+            events = stream_manager.wait_events(event_id, SSE_KEEPALIVE_INTERVAL)
+            if events is None:
+                # Fell behind the backlog (or the server restarted) - resynchronise
+                event_id, message = snapshot_event()
+                yield message
+            elif not events:
+                yield ": keepalive\n\n"
             else:
-                process_status = 'stopped'
-                pid = None
-        else:
-            is_running = False
-            process_status = 'no_process'
-            pid = None
-        
-        status_data['streams'][stream_name] = {
-            'rtsp_url': stream_info.get('rtsp_url', ''),
-            'filename': stream_info.get('filename', ''),
-            'file_path': stream_info.get('file_path', ''),
-            'status': process_status,
-            'is_running': is_running,
-            'pid': pid,
-            'created_at': stream_info.get('created_at', 0),
-            'uptime_seconds': time.time() - stream_info.get('created_at', 0) if is_running else 0
-        }
-    
-    return jsonify(status_data)
+                for event_id, event, data in events:
+                    yield f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
 
 ##if __name__ == '__main__':
 ##    start_mediamtx()
@@ -332,17 +697,44 @@ def mediamtx_health():
         'mediamtx_accessible': is_running,
         'timestamp': time.time(),
         'rtsp_endpoint': f'rtsp://{RTSP_HOST}:{RTSP_PORT}',
-        'api_endpoint': f'http://{RTSP_HOST}:{MEDIAMTX_API_PORT}'
+        'api_endpoint': f'http://{RTSP_HOST}:{MEDIAMTX_API_PORT}',
+        'nodes': stream_manager.snapshot().nodes
     })
 
-if __name__ == '__main__':
+def run_stream_manager():
+    # Dedicated stream manager process: owns FFmpeg children and serves state to web workers
+    if not STREAM_MANAGER_ADDRESS:
+        logger.error("STREAM_MANAGER_ADDRESS must be set to run the stream manager")
+        sys.exit(1)
+
+    logger.info(f"Starting stream manager on {STREAM_MANAGER_ADDRESS}")
+
+    def shutdown(signum, frame):
+        stream_manager.stop_all()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    start_mediamtx()
+    stream_manager.start_health_monitor(probe_mediamtx, MEDIAMTX_HEALTH_INTERVAL)
+    stream_manager.start_metrics_ticker(METRICS_TICK_INTERVAL)
+    if REBALANCE_AUTO:
+        stream_manager.rebalancer.start_auto(REBALANCE_INTERVAL, REBALANCE_THRESHOLD, REBALANCE_COOLDOWN)
+    serve_stream_manager(stream_manager, STREAM_MANAGER_ADDRESS, STREAM_MANAGER_AUTHKEY)
+
+
+if __name__ == '__main__' and '--stream-manager' in sys.argv:
+    run_stream_manager()
+
+elif __name__ == '__main__':
     logger.info("Starting Multi-Stream RTSP Server with Docker MediaMTX...")
     logger.info("=" * 60)
     logger.info("IMPORTANT: Make sure MediaMTX Docker container is running!")
     logger.info("Start with: docker-compose up -d")
     logger.info("=" * 60)
     
-    # Check MediaMTX status on startup
+    # Check MediaMTX status on startup, then keep probing in the background
     if start_mediamtx():
         logger.info(f"RTSP Server: rtsp://{RTSP_HOST}:{RTSP_PORT}/[stream_name]")
         logger.info(f"Web Interface: http://0.0.0.0:5000")
@@ -350,5 +742,9 @@ if __name__ == '__main__':
         logger.info("=" * 50)
     else:
         logger.error("MediaMTX not accessible! Streams may fail.")
+    stream_manager.start_health_monitor(probe_mediamtx, MEDIAMTX_HEALTH_INTERVAL)
+    stream_manager.start_metrics_ticker(METRICS_TICK_INTERVAL)
+    if REBALANCE_AUTO:
+        stream_manager.rebalancer.start_auto(REBALANCE_INTERVAL, REBALANCE_THRESHOLD, REBALANCE_COOLDOWN)
     
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+class MediaMTXError(Exception):
+    """Raised when the MediaMTX control API is unreachable or rejects a call"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MediaMTXClient:
+    """Pooled client for the MediaMTX v3 control API"""
+
+    def __init__(self, host, api_port, timeout=3, pool_size=10):
+        self.base_url = f'http://{host}:{api_port}'
+        self.timeout = timeout
+
+        # One keep-alive pool shared by every caller thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+
+    def _request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise MediaMTXError(f"{method} {path} failed: {e}")
+
+        if response.status_code >= 400:
+            raise MediaMTXError(f"{method} {path} returned {response.status_code}: {response.text.strip()}",
+                                status_code=response.status_code)
+        return response
+
+    def is_alive(self):
+        """True if the API answers"""
+        try:
+            self._request('GET', '/v3/config/global/get')
+            return True
+        except MediaMTXError:
+            return False
+
+    def list_paths(self, items_per_page=1000):
+        """Return {path_name: stats} for every path MediaMTX currently knows about"""
+        paths = {}
+        page = 0
+        while True:
+            data = self._request('GET', '/v3/paths/list',
+                                 params={'page': page, 'itemsPerPage': items_per_page}).json()
+
+            for item in data.get('items') or []:
+                paths[item['name']] = self._path_stats(item)
+
+            page += 1
+            if page >= data.get('pageCount', 1):
+                return paths
+
+    def get_path(self, name):
+        """Return stats for one path, or None if MediaMTX does not know it"""
+        try:
+            return self._path_stats(self._request('GET', f'/v3/paths/get/{name}').json())
+        except MediaMTXError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def _path_stats(self, item):
+        source = item.get('source') or {}
+        return {
+            'ready': bool(item.get('ready')),
+            'ready_time': item.get('readyTime'),
+            'source_type': source.get('type'),
+            'tracks': item.get('tracks') or [],
+            'readers': len(item.get('readers') or []),
+            'bytes_received': item.get('bytesReceived', 0),
+            'bytes_sent': item.get('bytesSent', 0),
+        }
+
+    def replace_path(self, name, settings=None):
+        """Create or overwrite a configured path"""
+        self._request('POST', f'/v3/config/paths/replace/{name}', json=settings or {})
+
+    def delete_path(self, name):
+        """Remove a configured path, returns False if it did not exist"""
+        try:
+            self._request('DELETE', f'/v3/config/paths/delete/{name}')
+        except MediaMTXError as e:
+            if e.status_code == 404:
+                return False
+            raise
+        logger.info(f"MediaMTX path deleted: {name}")
+        return True
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Convert uploads into the .Mjpeg format served by the custom RTSP server (test/main2.py)
+
+Usage (one-off conversion):
+    python mjpeg_export.py input.mp4 output_dir [--name NAME] [--size 640x360] [--fps 25] [--quality 5]
+
+The format is a plain sequence of JPEG frames, each preceded by its length as
+5 ASCII digits. Next to the file the export writes the two things the
+server's VideoCatalog would otherwise compute or guess:
+    .index/<name>.idx   frame offsets, in the catalog's index layout
+    .index/<name>.json  fps, size, frame count and source of the conversion
+The finished file is renamed into output_dir last, so a running server picks
+it up (inotify or polling) with its index and frame rate already in place.
+"""
+
+import os
+import sys
+import json
+import time
+import array
+import struct
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import encoder_profiles
+
+
+logger = logging.getLogger(__name__)
+
+MJPEG_EXTENSION = '.Mjpeg'
+INDEX_DIR = '.index'                    # Same layout as test/VideoCatalog.py
+INDEX_HEADER = struct.Struct('<4sQd')   # magic, file size, file mtime
+INDEX_MAGIC = b'MJIX'
+MAX_FRAME_SIZE = 99999                  # Largest length the 5-digit header can carry
+QUALITY_STEP = 4                        # -q:v added per retry when a frame does not fit
+MAX_QUALITY = 31                        # Coarsest -q:v FFmpeg's MJPEG encoder accepts
+READ_SIZE = 1024 * 1024
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+
+class MjpegExportError(Exception):
+    """Raised when a file cannot be converted"""
+
+
+class FrameTooLarge(MjpegExportError):
+    """A frame does not fit the 5-digit length header at this quality"""
+
+
+def split_jpegs(stream):
+    """Yield the JPEG frames of an FFmpeg image2pipe stream.
+
+    Entropy-coded data stuffs every 0xFF with 0x00, so EOI only appears at
+    the end of a frame.
+    """
+    buffer = b''
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        buffer += data
+        start = 0
+        while True:
+            end = buffer.find(EOI, start)
+            if end < 0:
+                break
+            frame = buffer[start:end + 2]
+            start = end + 2
+            if frame.startswith(SOI):
+                yield frame
+        buffer = buffer[start:]
+
+
+def jpeg_size(frame):
+    """(width, height) from a JPEG's start-of-frame segment, or (None, None)"""
+    offset = 2
+    while offset + 9 <= len(frame) and frame[offset] == 0xFF:
+        marker = frame[offset + 1]
+        if marker in (0xC0, 0xC1, 0xC2):
+            height, width = struct.unpack_from('>HH', frame, offset + 5)
+            return width, height
+        offset += 2 + struct.unpack_from('>H', frame, offset + 2)[0]
+    return None, None
+
+
+def output_paths(output_dir, name):
+    return (os.path.join(output_dir, name),
+            os.path.join(output_dir, INDEX_DIR, name + '.idx'),
+            os.path.join(output_dir, INDEX_DIR, name + '.json'))
+
+
+def convert(file_path, output_dir, name, width=None, height=None, fps=None, quality=5):
+    """Convert one file, runs in a pool worker. Returns the metadata written to the sidecar.
+
+    Retries with a coarser quality while some frame is too large for the format.
+    """
+    source = encoder_profiles.probe_source(file_path)
+    fps = fps or round(source['fps'], 3)
+    while True:
+        try:
+            return _convert(file_path, output_dir, name, width, height, fps, quality, source)
+        except FrameTooLarge as e:
+            if quality >= MAX_QUALITY:
+                raise MjpegExportError(f"{e}, even at -q:v {MAX_QUALITY}; export at a smaller size")
+            quality = min(MAX_QUALITY, quality + QUALITY_STEP)
+            logger.info(f"{name}: {e}, retrying at -q:v {quality}")
+
+
+def _convert(file_path, output_dir, name, width, height, fps, quality, source):
+    video_path, index_path, meta_path = output_paths(output_dir, name)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    # Hidden while being written, the catalog ignores dot files
+    part_path = os.path.join(output_dir, f'.{name}.{os.getpid()}.part')
+
+    filters = [f'fps={fps}']
+    if width and height:
+        filters.append(f'scale={width}:{height}:force_original_aspect_ratio=decrease')
+    elif width or height:
+        filters.append(f'scale={width or -2}:{height or -2}')
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', file_path,
+           '-an', '-vf', ','.join(filters), '-pix_fmt', 'yuvj420p',
+           '-c:v', 'mjpeg', '-q:v', str(quality), '-f', 'image2pipe', '-']
+
+    started = time.time()
+    offsets = array.array('Q')
+    offset = 0
+    size = (None, None)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        with open(part_path, 'wb') as handle:
+            for frame in split_jpegs(process.stdout):
+                if len(frame) > MAX_FRAME_SIZE:
+                    raise FrameTooLarge(f"frame {len(offsets)} is {len(frame)} bytes")
+                if not offsets:
+                    size = jpeg_size(frame)
+                handle.write(b'%05d' % len(frame))
+                handle.write(frame)
+                offsets.append(offset)
+                offset += 5 + len(frame)
+            handle.flush()
+            os.fsync(handle.fileno())
+        stderr = process.communicate()[1]
+        if process.returncode != 0:
+            raise MjpegExportError(f"FFmpeg failed: {stderr.decode('utf-8', 'replace').strip()[-500:]}")
+        if not offsets:
+            raise MjpegExportError("FFmpeg produced no frames")
+
+        # Index and metadata first, keyed to the file's size and mtime (a rename keeps both)
+        stat = os.stat(part_path)
+        with open(index_path + '.tmp', 'wb') as handle:
+            handle.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime))
+            offsets.tofile(handle)
+        os.replace(index_path + '.tmp', index_path)
+        metadata = {
+            'name': name,
+            'fps': fps,
+            'frames': len(offsets),
+            'width': size[0],
+            'height': size[1],
+            'quality': quality,
+            'source': os.path.basename(file_path),
+            'converted_at': time.time(),
+        }
+        with open(meta_path + '.tmp', 'w') as handle:
+            json.dump(metadata, handle, indent=2)
+        os.replace(meta_path + '.tmp', meta_path)
+        os.replace(part_path, video_path)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    logger.info(f"Exported {file_path} to {video_path}: {len(offsets)} frames at {fps} fps "
+                f"in {time.time() - started:.1f}s")
+    return metadata
+
+
+class MjpegExporter:
+    """Converts uploads into output_dir in a process pool and tracks each job.
+
+    Splitting frames runs in Python, so conversions get their own processes
+    instead of competing with request threads for the GIL. Conversions of one
+    stream run one after another, and an upload that is superseded before its
+    turn is skipped, so the newest upload is always the one left on disk.
+    """
+
+    def __init__(self, output_dir, width=None, height=None, fps=None, quality=5, max_workers=2):
+        self.output_dir = output_dir
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        self._jobs = {}      # stream name -> job dict, replaced on every update
+        self._running = {}   # stream name -> Future of its conversion in flight
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def submit(self, stream_name, file_path):
+        """Queue a conversion, returns the job"""
+        job = {
+            'stream_name': stream_name,
+            'name': stream_name + MJPEG_EXTENSION,
+            'status': 'queued',
+            'source': os.path.basename(file_path),
+            'queued_at': time.time(),
+            'finished_at': None,
+            'frames': None,
+            'fps': None,
+            'error': None,
+        }
+        with self._lock:
+            self._jobs[stream_name] = job
+            previous = self._running.get(stream_name)
+        if previous:
+            previous.add_done_callback(lambda _: self._start(stream_name, job, file_path))
+        else:
+            self._start(stream_name, job, file_path)
+        return dict(job)
+
+    def _start(self, stream_name, job, file_path):
+        with self._lock:
+            if self._jobs.get(stream_name) is not job:
+                return  # A newer upload of the stream took its place
+            future = self._executor.submit(convert, file_path, self.output_dir, job['name'],
+                                           self.width, self.height, self.fps, self.quality)
+            self._running[stream_name] = future
+            self._jobs[stream_name] = job = dict(job, status='converting')
+        future.add_done_callback(lambda done: self._finish(stream_name, job, done))
+
+    def _finish(self, stream_name, job, future):
+        try:
+            metadata = future.result()
+            update = {'status': 'ready', 'frames': metadata['frames'], 'fps': metadata['fps']}
+        except Exception as e:
+            logger.error(f"MJPEG export of '{stream_name}' failed: {e}")
+            update = {'status': 'error', 'error': str(e)}
+        with self._lock:
+            if self._running.get(stream_name) is future:
+                del self._running[stream_name]
+            # Only the latest upload of a stream is reported
+            if self._jobs.get(stream_name) is job:
+                self._jobs[stream_name] = dict(job, finished_at=time.time(), **update)
+
+    def get(self, stream_name):
+        with self._lock:
+            job = self._jobs.get(stream_name)
+            return dict(job) if job else None
+
+    def jobs(self):
+        with self._lock:
+            return [dict(job) for _, job in sorted(self._jobs.items())]
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
+def parse_size(value):
+    width, _, height = value.lower().partition('x')
+    return int(width) if width else None, int(height) if height else None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert a video into the custom RTSP server's .Mjpeg format")
+    parser.add_argument('input')
+    parser.add_argument('output_dir', help="Directory served by test/main2.py")
+    parser.add_argument('--name', help="Output name without extension (default: input name)")
+    parser.add_argument('--size', type=parse_size, default=(None, None), help="WxH to fit within, or W / xH")
+    parser.add_argument('--fps', type=float, help="Frame rate (default: the source's)")
+    parser.add_argument('--quality', type=int, default=5, help="FFmpeg -q:v, 2 (best) to 31")
+    args = parser.parse_args()
+
+    name = (args.name or os.path.splitext(os.path.basename(args.input))[0]) + MJPEG_EXTENSION
+    try:
+        metadata = convert(args.input, args.output_dir, name, args.size[0], args.size[1], args.fps, args.quality)
+    except MjpegExportError as e:
+        print(f"Export failed: {e}")
+        return 1
+    print(json.dumps(metadata, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import json
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from mediamtx_client import MediaMTXClient, MediaMTXError
+
+
+logger = logging.getLogger(__name__)
+
+
+class NoNodeAvailable(Exception):
+    """Raised when no healthy node has capacity for a new stream"""
+
+
+class MediaMTXNode:
+    """One MediaMTX instance (RTSP server + control API) that streams can be placed on.
+
+    FFmpeg encoders run on the main.py host and publish to the node's RTSP port.
+    """
+
+    def __init__(self, name, host, rtsp_port=8554, api_port=9997, weight=1.0, max_streams=None, public_host=None,
+                 cpu_url=None):
+        self.name = name
+        self.host = host
+        self.rtsp_port = rtsp_port
+        self.api_port = api_port
+        self.weight = float(weight)
+        self.max_streams = max_streams
+        self.public_host = public_host or host  # Host advertised in rtsp_url
+        self.cpu_url = cpu_url  # Optional endpoint returning {"cpu_percent": N} for the node host
+
+        self.client = MediaMTXClient(host, api_port)
+        self.healthy = True  # Optimistic until the first probe
+        self.last_check = None
+        self.streams = set()
+        self.path_stats = {}
+        self.redirects = set()  # Paths left behind as redirects after a migration
+        self.stale = set()      # Paths of streams placed elsewhere while this node was down
+        self.cpu_percent = None
+
+    def readers(self):
+        return sum(stats.get('readers', 0) for stats in self.path_stats.values())
+
+    def rtsp_url(self, stream_name):
+        """URL readers use for a stream on this node"""
+        return f"rtsp://{self.public_host}:{self.rtsp_port}/{stream_name}"
+
+    def publish_url(self, stream_name):
+        """URL FFmpeg publishes to"""
+        return f"rtsp://{self.host}:{self.rtsp_port}/{stream_name}"
+
+    def load(self, extra=0):
+        """Weighted load, the placement cost of this node"""
+        return (len(self.streams) + extra) / self.weight
+
+    def has_capacity(self):
+        return self.max_streams is None or len(self.streams) < self.max_streams
+
+    def view(self):
+        """JSON-safe summary for /status"""
+        return {
+            'name': self.name,
+            'rtsp_server': f"rtsp://{self.public_host}:{self.rtsp_port}",
+            'api_endpoint': f"http://{self.host}:{self.api_port}",
+            'healthy': self.healthy,
+            'weight': self.weight,
+            'max_streams': self.max_streams,
+            'streams': len(self.streams),
+            'readers': self.readers(),
+            'cpu_percent': self.cpu_percent,
+        }
+
+
+class NodePool:
+    """Places streams on the least-loaded healthy MediaMTX node"""
+
+    def __init__(self, nodes):
+        if not nodes:
+            raise ValueError("NodePool needs at least one node")
+        self.nodes = {node.name: node for node in nodes}
+        self._lock = threading.Lock()
+        self._assignments = {}  # stream_name -> node name
+        self._executor = ThreadPoolExecutor(max_workers=min(8, len(nodes)), thread_name_prefix='node-probe')
+
+    @classmethod
+    def from_config(cls, config, default_host, default_rtsp_port, default_api_port):
+        """Build a pool from a JSON list of node dicts, or a single default node when empty"""
+        if not config:
+            return cls([MediaMTXNode('default', default_host, default_rtsp_port, default_api_port)])
+
+        nodes = []
+        for index, item in enumerate(json.loads(config) if isinstance(config, str) else config):
+            nodes.append(MediaMTXNode(
+                name=item.get('name', f'node{index}'),
+                host=item.get('host', default_host),
+                rtsp_port=int(item.get('rtsp_port', default_rtsp_port)),
+                api_port=int(item.get('api_port', default_api_port)),
+                weight=item.get('weight', 1.0),
+                max_streams=item.get('max_streams'),
+                public_host=item.get('public_host'),
+                cpu_url=item.get('cpu_url'),
+            ))
+        return cls(nodes)
+
+    @property
+    def primary(self):
+        """First configured node, used for single-node style fields"""
+        return next(iter(self.nodes.values()))
+
+    # Placement
+
+    def place(self, stream_name):
+        """Return the node for a stream, choosing one if it has none yet"""
+        with self._lock:
+            current = self.nodes.get(self._assignments.get(stream_name))
+            if current and current.healthy:
+                return current
+            if current:
+                # Its path stays on the unreachable node, delete_stale() removes it once it is back
+                current.streams.discard(stream_name)
+                current.stale.add(stream_name)
+
+            candidates = [node for node in self.nodes.values() if node.healthy and node.has_capacity()]
+            if not candidates:
+                raise NoNodeAvailable(f"No healthy MediaMTX node has capacity for '{stream_name}'")
+
+            # Bin-packing on weighted load, rendezvous hash breaks ties so placement is stable
+            node = min(candidates, key=lambda node: (node.load(extra=1), self._rendezvous(stream_name, node)))
+            node.streams.add(stream_name)
+            node.stale.discard(stream_name)
+            self._assignments[stream_name] = node.name
+
+        logger.info(f"Stream '{stream_name}' placed on node '{node.name}'")
+        return node
+
+    def node_for(self, stream_name):
+        """Node a stream is currently placed on, or None"""
+        return self.nodes.get(self._assignments.get(stream_name))
+
+    def move(self, stream_name, target):
+        """Reassign a stream to another node, returns the node it was on"""
+        with self._lock:
+            previous = self.nodes.get(self._assignments.get(stream_name))
+            if previous:
+                previous.streams.discard(stream_name)
+                # Readers follow the redirect; assume so until the next probe says otherwise
+                stats = previous.path_stats.pop(stream_name, None)
+                if stats:
+                    target.path_stats[stream_name] = stats
+            target.streams.add(stream_name)
+            target.redirects.discard(stream_name)
+            target.stale.discard(stream_name)
+            self._assignments[stream_name] = target.name
+        return previous
+
+    def release(self, stream_name):
+        """Forget a stream's placement, returns the node it was on"""
+        with self._lock:
+            node = self.nodes.get(self._assignments.pop(stream_name, None))
+            if node:
+                node.streams.discard(stream_name)
+        return node
+
+    def take_redirects(self, stream_name):
+        """Forget and return the nodes still holding a redirect path for a stream"""
+        with self._lock:
+            nodes = [node for node in self.nodes.values() if stream_name in node.redirects]
+            for node in nodes:
+                node.redirects.discard(stream_name)
+        return nodes
+
+    def delete_stale(self):
+        """Delete the paths left on nodes that were down when their streams were placed elsewhere,
+        for nodes that are healthy again. Returns [(node name, stream_name)] deleted."""
+        with self._lock:
+            stale = [(node, stream_name) for node in self.nodes.values() if node.healthy
+                     for stream_name in node.stale]
+        deleted = []
+        for node, stream_name in stale:
+            with self._lock:
+                if stream_name not in node.stale:
+                    continue  # Placed back on this node meanwhile
+            try:
+                node.client.delete_path(stream_name)
+            except MediaMTXError as e:
+                logger.warning(f"Failed to delete stale path '{stream_name}' on node '{node.name}': {e}")
+                continue
+            with self._lock:
+                node.stale.discard(stream_name)
+            deleted.append((node.name, stream_name))
+            logger.info(f"Deleted stale path '{stream_name}' on node '{node.name}'")
+        return deleted
+
+    def _rendezvous(self, stream_name, node):
+        # Highest-random-weight hashing, negated so min() picks the winner
+        digest = hashlib.md5(f"{stream_name}@{node.name}".encode('utf-8')).digest()
+        return -int.from_bytes(digest[:8], 'big')
+
+    # Health
+
+    def check_health(self):
+        """Probe every node in parallel, returns {stream_name: path stats} for placed streams"""
+        results = list(self._executor.map(self._probe, self.nodes.values()))
+
+        path_stats = {}
+        with self._lock:
+            for node, (healthy, paths) in zip(self.nodes.values(), results):
+                if healthy != node.healthy:
+                    logger.warning(f"MediaMTX node '{node.name}' is now {'healthy' if healthy else 'unreachable'}")
+                node.healthy = healthy
+                node.last_check = time.time()
+                node.path_stats = {name: stats for name, stats in paths.items() if name in node.streams}
+                path_stats.update(node.path_stats)
+        return path_stats
+
+    def _probe(self, node):
+        try:
+            paths = node.client.list_paths()
+        except MediaMTXError as e:
+            logger.debug(f"Node '{node.name}' probe failed: {e}")
+            return False, {}
+
+        if node.cpu_url:
+            try:
+                node.cpu_percent = float(node.client.session.get(node.cpu_url, timeout=node.client.timeout).json()['cpu_percent'])
+            except Exception as e:
+                logger.debug(f"Node '{node.name}' CPU probe failed: {e}")
+                node.cpu_percent = None
+        return True, paths
+
+    def any_alive(self):
+        """Live check used before accepting uploads"""
+        return any(node.client.is_alive() for node in self.nodes.values())
+
+    def views(self):
+        with self._lock:
+            return [node.view() for node in self.nodes.values()]
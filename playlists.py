@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import encoder_profiles
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: single process, the thread lock is enough
+
+
+logger = logging.getLogger(__name__)
+
+CHAIN_SUFFIX = '.ffconcat'
+
+
+class PlaylistError(Exception):
+    """Raised for unknown playlists, missing items or failed normalization"""
+
+
+class PlaylistStore:
+    """Channels that play an ordered list of uploads through one copy-mode FFmpeg.
+
+    Every item is normalized once into an MPEG-TS segment with identical codec
+    parameters, so the publisher can concatenate segments with `-c copy`.
+
+    The publisher reads a chain of ffconcat lists, one per position:
+        list_0: segment 0, then list_1
+        list_1: segment 1, then list_2
+        ...
+        list_N-1: segment N-1, then list_0
+    The concat demuxer opens each list only when it reaches it, so rewriting
+    the chain edits the playlist live: changes apply from the next item on.
+    Positions beyond a shortened playlist are left as jumps back to list_0.
+
+    State lives on disk (playlist.json + the chain) so every web worker sees it.
+    Edits bump a generation counter kept in playlist.json, compared and set
+    under a file lock, so the newest edit wins whichever worker handles it.
+    A segment is normalized under its own file lock, so workers that need
+    the same one wait for it instead of encoding it twice.
+    """
+
+    def __init__(self, playlist_dir, segment_dir, profile, width=1280, height=720, fps=30, max_workers=2):
+        self.playlist_dir = playlist_dir
+        self.segment_dir = segment_dir
+        self.profile = profile
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+        self._lock = threading.Lock()
+        self._pending = {}      # segment path -> Future, normalizations in flight in this worker
+        self._state_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='normalize')
+        os.makedirs(playlist_dir, exist_ok=True)
+        os.makedirs(segment_dir, exist_ok=True)
+
+    # Paths
+
+    def _dir(self, name):
+        return os.path.join(self.playlist_dir, name)
+
+    def _state_path(self, name):
+        return os.path.join(self._dir(name), 'playlist.json')
+
+    def _list_name(self, position):
+        return f'list_{position}{CHAIN_SUFFIX}'
+
+    def chain_head(self, name):
+        """Input the publisher reads, passed to the launcher as the stream's video_path"""
+        return os.path.abspath(os.path.join(self._dir(name), self._list_name(0)))
+
+    # State
+
+    def exists(self, name):
+        return os.path.isfile(self._state_path(name))
+
+    def get(self, name):
+        """Playlist dict, or None"""
+        try:
+            with open(self._state_path(name)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        playlists = []
+        for name in sorted(os.listdir(self.playlist_dir)):
+            playlist = self.get(name)
+            if playlist:
+                playlists.append(playlist)
+        return playlists
+
+    @contextmanager
+    def _locked(self):
+        # Serializes playlist.json read-modify-write across threads and worker processes
+        with self._state_lock, file_lock(os.path.join(self.playlist_dir, '.lock')):
+            yield
+
+    def _save(self, playlist):
+        path = self._state_path(playlist['name'])
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as handle:
+            json.dump(playlist, handle, indent=2)
+        os.replace(tmp, path)
+
+    # Editing
+
+    def create(self, name, items, on_ready):
+        """Create a playlist from [{'filename', 'file_path'}], normalizing in the background.
+
+        on_ready(name) is called once the first chain is written, to start the publisher.
+        """
+        with self._locked():
+            if self.exists(name):
+                raise PlaylistError(f"Playlist '{name}' already exists")
+            os.makedirs(self._dir(name), exist_ok=True)
+            playlist = {
+                'name': name,
+                'items': [dict(item, segment=None) for item in items],
+                'status': 'preparing',
+                'error': None,
+                'generation': 1,
+                'created_at': time.time(),
+                'updated_at': time.time(),
+            }
+            self._save(playlist)
+        self._apply(name, items, on_ready, playlist['generation'])
+        return playlist
+
+    def update(self, name, items):
+        """Replace the item list of a playing playlist; the publisher keeps running"""
+        with self._locked():
+            playlist = self.get(name)
+            if not playlist:
+                raise PlaylistError(f"Playlist '{name}' not found")
+            playlist['generation'] = playlist.get('generation', 0) + 1
+            playlist['status'] = 'updating'
+            playlist['updated_at'] = time.time()
+            self._save(playlist)
+        self._apply(name, items, None, playlist['generation'])
+        return playlist
+
+    def delete(self, name):
+        """Remove a playlist's state and chain (normalized segments stay cached)"""
+        directory = self._dir(name)
+        with self._locked():
+            # Pending edits find the directory gone and drop their chain
+            if not os.path.isdir(directory):
+                return False
+            for entry in os.listdir(directory):
+                os.remove(os.path.join(directory, entry))
+            os.rmdir(directory)
+        return True
+
+    def _apply(self, name, items, on_ready, generation):
+        # Normalize new items, then write the chain in one go unless a newer edit came in
+        futures = [self._segment(item['file_path']) for item in items]
+
+        def finish():
+            try:
+                segments = [future.result() for future in futures]
+            except Exception as e:
+                logger.error(f"Playlist '{name}' normalization failed: {e}")
+                self._set_status(name, generation, 'error', error=str(e))
+                return
+
+            with self._locked():
+                playlist = self.get(name)
+                if not playlist or playlist.get('generation') != generation:
+                    return
+                self._write_chain(name, segments)
+                playlist['items'] = [dict(item, segment=os.path.basename(segment))
+                                     for item, segment in zip(items, segments)]
+                playlist['status'] = 'ready'
+                playlist['error'] = None
+                playlist['updated_at'] = time.time()
+                self._save(playlist)
+
+            logger.info(f"Playlist '{name}' ready with {len(segments)} items")
+            if on_ready:
+                on_ready(name)
+
+        threading.Thread(target=finish, daemon=True).start()
+
+    def _set_status(self, name, generation, status, error=None):
+        with self._locked():
+            playlist = self.get(name)
+            if not playlist or playlist.get('generation') != generation:
+                return
+            playlist['status'] = status
+            playlist['error'] = error
+            self._save(playlist)
+
+    def _write_chain(self, name, segments):
+        directory = self._dir(name)
+        count = len(segments)
+        for position, segment in enumerate(segments):
+            self._write_list(directory, position, [
+                self._link_segment(directory, segment),
+                self._list_name((position + 1) % count),
+            ])
+
+        # Positions left over from a longer version jump back to the start
+        position = count
+        while os.path.exists(os.path.join(directory, self._list_name(position))):
+            self._write_list(directory, position, [self._list_name(0)])
+            position += 1
+
+    def _link_segment(self, directory, segment):
+        # The concat demuxer only accepts plain file names in nested lists (safe mode),
+        # so each segment is hard-linked next to the chain. Links are only removed with
+        # the playlist, a list the demuxer has already read may still point at them.
+        link = os.path.join(directory, os.path.basename(segment))
+        if not os.path.exists(link):
+            try:
+                os.link(segment, link)
+            except OSError:
+                os.symlink(os.path.abspath(segment), link)
+        return os.path.basename(segment)
+
+    def _write_list(self, directory, position, entries):
+        # Written to a temp file and renamed, the demuxer never sees a half-written list
+        path = os.path.join(directory, self._list_name(position))
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as handle:
+            handle.write('ffconcat version 1.0\n')
+            for entry in entries:
+                handle.write(f"file '{entry}'\n")
+        os.replace(tmp, path)
+
+    # Normalization
+
+    def _segment(self, file_path):
+        # Future for the normalized segment of a file, shared with any normalization already running
+        stat = os.stat(file_path)
+        key = f'{os.path.abspath(file_path)}:{stat.st_mtime}:{stat.st_size}:{self.profile}:{self.width}x{self.height}@{self.fps}'
+        segment = os.path.abspath(os.path.join(self.segment_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.ts'))
+
+        with self._lock:
+            future = self._pending.get(segment)
+            if future:
+                return future
+            if os.path.isfile(segment):
+                future = self._executor.submit(lambda: segment)
+            else:
+                future = self._executor.submit(self._normalize, file_path, segment)
+            self._pending[segment] = future
+        future.add_done_callback(lambda _: self._forget(segment))
+        return future
+
+    def _forget(self, segment):
+        with self._lock:
+            self._pending.pop(segment, None)
+
+    def _normalize(self, file_path, segment):
+        # Same resolution, frame rate, pixel format, encoder settings and audio layout for
+        # every segment, so the concat demuxer can switch items without re-encoding
+        source = encoder_profiles.probe_source(file_path)
+        video_filter = (f'scale={self.width}:{self.height}:force_original_aspect_ratio=decrease,'
+                        f'pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={self.fps},format=yuv420p')
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', file_path]
+        if source.get('has_audio'):
+            audio_map = '0:a:0'
+        else:
+            # Silent track, every segment needs the same streams
+            cmd += ['-f', 'lavfi', '-i', 'anullsrc=channel_layout=stereo:sample_rate=48000']
+            audio_map = '1:a:0'
+        cmd += [
+            '-map', '0:v:0', '-map', audio_map, '-shortest',
+            '-vf', video_filter,
+            *encoder_profiles.video_args(self.profile, {'fps': self.fps}, threads=0),
+            '-profile:v', 'high',
+            '-c:a', 'aac', '-b:a', '128k', '-ar', '48000', '-ac', '2',
+            '-f', 'mpegts', f'{segment}.part',
+        ]
+
+        # Another worker may be normalizing the same file: wait for it and reuse its segment
+        with file_lock(f'{segment}.lock'):
+            if os.path.isfile(segment):
+                return segment
+            started = time.time()
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise PlaylistError(f"Normalizing {os.path.basename(file_path)} failed: {result.stderr.strip()[-500:]}")
+            os.replace(f'{segment}.part', segment)
+            # Safe to drop while held: anyone still waiting on it will find the segment
+            os.remove(f'{segment}.lock')
+        logger.info(f"Normalized {file_path} in {time.time() - started:.1f}s")
+        return segment
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive flock on path (created if missing) for the duration of the block"""
+    with open(path, 'a') as handle:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        yield
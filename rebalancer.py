@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from mediamtx_client import MediaMTXError
+
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationError(Exception):
+    """Raised when a stream cannot be moved to another node"""
+
+
+class Rebalancer:
+    """Moves looping streams between MediaMTX nodes without a gap for viewers.
+
+    A migration runs make-before-break:
+      1. create the path on the target node and start a second FFmpeg publishing to it
+      2. wait until the target reports the path ready with media flowing (first keyframe)
+      3. flip the advertised rtsp_url and turn the old path into a redirect to the target
+      4. only then stop the old FFmpeg
+    """
+
+    def __init__(self, node_pool, stream_manager, launch, path_settings, manage_paths=True,
+                 keyframe_timeout=15, poll_interval=0.25, cpu_factor=1.0):
+        self.node_pool = node_pool
+        self.stream_manager = stream_manager
+        self.launch = launch                # launch(stream_name, video_path, node, profile=...) -> (process, publish_url)
+        self.path_settings = path_settings  # path_settings(on_demand) -> MediaMTX path config dict
+        self.manage_paths = manage_paths
+        self.keyframe_timeout = keyframe_timeout
+        self.poll_interval = poll_interval
+        self.cpu_factor = cpu_factor        # Heat added by a fully busy node CPU, in readers-per-weight units
+
+        self._lock = threading.Lock()  # One migration at a time
+        self._last_moved = {}          # stream_name -> time of its last migration
+        self._auto_thread = None
+
+    # Manual migration
+
+    def migrate(self, stream_name, target_name=None):
+        """Move a running stream to target_name (or the coolest other node), returns a summary dict"""
+        with self._lock:
+            return self._migrate(stream_name, target_name)
+
+    def _migrate(self, stream_name, target_name):
+        info = self.stream_manager.get(stream_name)
+        if not info or info['status'] != 'running':
+            raise MigrationError(f"Stream '{stream_name}' is not running")
+
+        source = self.node_pool.node_for(stream_name)
+        target = self.node_pool.nodes.get(target_name) if target_name else self._coolest(exclude=source)
+        if not target:
+            raise MigrationError(f"No target node available for '{stream_name}'")
+        if target is source:
+            raise MigrationError(f"Stream '{stream_name}' is already on node '{target.name}'")
+        if not target.healthy or not target.has_capacity():
+            raise MigrationError(f"Node '{target.name}' is unhealthy or full")
+
+        started = time.time()
+        logger.info(f"Migrating '{stream_name}' from '{source.name if source else '?'}' to '{target.name}'")
+
+        # 1. Second publisher on the target
+        if self.manage_paths:
+            try:
+                target.client.replace_path(stream_name, self.path_settings(info['on_demand']))
+            except MediaMTXError as e:
+                raise MigrationError(f"Could not create path on '{target.name}': {e}")
+
+        process, _ = self.launch(stream_name, info['file_path'], target, profile=info['profile'])
+        if not process:
+            self._drop_path(target, stream_name)
+            raise MigrationError(f"Could not start publisher on '{target.name}'")
+
+        # 2. Wait until the target is actually serving media
+        if not self._wait_for_media(target, stream_name, process):
+            process.terminate()
+            self._drop_path(target, stream_name)
+            raise MigrationError(f"Publisher on '{target.name}' produced no media within {self.keyframe_timeout}s")
+
+        # 3. Flip the advertised URL, then redirect readers still pointed at the old node
+        self.node_pool.move(stream_name, target)
+        try:
+            old_process = self.stream_manager.replace_process(stream_name, process, target.rtsp_url(stream_name), target.name)
+        except KeyError:
+            # Stream was stopped while we were migrating
+            process.terminate()
+            self.node_pool.release(stream_name)
+            self._drop_path(target, stream_name)
+            raise MigrationError(f"Stream '{stream_name}' was stopped during migration")
+
+        if source and self.manage_paths:
+            try:
+                source.client.replace_path(stream_name, {
+                    'source': 'redirect',
+                    'sourceRedirect': target.rtsp_url(stream_name),
+                })
+                source.redirects.add(stream_name)
+            except MediaMTXError as e:
+                logger.warning(f"Could not leave a redirect on '{source.name}': {e}")
+
+        # 4. Break the old publisher last
+        if old_process and old_process.poll() is None:
+            old_process.terminate()
+
+        self.stream_manager.set_nodes(self.node_pool.views())
+        self._last_moved[stream_name] = time.time()
+
+        result = {
+            'stream_name': stream_name,
+            'from_node': source.name if source else None,
+            'to_node': target.name,
+            'rtsp_url': target.rtsp_url(stream_name),
+            'switch_seconds': round(time.time() - started, 3),
+        }
+        logger.info(f"Migrated '{stream_name}' to '{target.name}' in {result['switch_seconds']}s")
+        return result
+
+    def _wait_for_media(self, node, stream_name, process):
+        # MediaMTX marks a path ready once the publisher has announced its tracks; bytes
+        # received means frames are flowing, and the first libx264 frame is an IDR
+        deadline = time.time() + self.keyframe_timeout
+        while time.time() < deadline:
+            if process.poll() is not None:
+                return False
+            try:
+                stats = node.client.get_path(stream_name)
+            except MediaMTXError:
+                stats = None
+            if stats and stats['ready'] and stats['bytes_received'] > 0:
+                return True
+            time.sleep(self.poll_interval)
+        return False
+
+    def _drop_path(self, node, stream_name):
+        if not self.manage_paths:
+            return
+        try:
+            node.client.delete_path(stream_name)
+        except MediaMTXError as e:
+            logger.warning(f"Could not delete path '{stream_name}' on '{node.name}': {e}")
+
+    # Automatic mode
+
+    def node_heat(self, node):
+        """Weighted load used by the automatic mode: readers per weight, plus CPU when the node reports it"""
+        heat = node.readers() / node.weight
+        if node.cpu_percent is not None:
+            heat += node.cpu_percent / 100.0 * self.cpu_factor
+        return heat
+
+    def _coolest(self, exclude=None):
+        candidates = [node for node in self.node_pool.nodes.values()
+                      if node is not exclude and node.healthy and node.has_capacity()]
+        return min(candidates, key=self.node_heat, default=None)
+
+    def plan(self, threshold=1.5, cooldown=300):
+        """Pick one (stream_name, target_name) move that evens out node heat, or None"""
+        healthy = [node for node in self.node_pool.nodes.values() if node.healthy]
+        if len(healthy) < 2:
+            return None
+
+        hot = max(healthy, key=self.node_heat)
+        cold = self._coolest(exclude=hot)
+        if not cold:
+            return None
+
+        hot_heat, cold_heat = self.node_heat(hot), self.node_heat(cold)
+        mean_heat = sum(self.node_heat(node) for node in healthy) / len(healthy)
+        if hot_heat <= threshold * max(mean_heat, 1e-9) or hot_heat - cold_heat <= 0:
+            return None
+
+        # Move the stream whose readers best split the difference between the two nodes
+        now = time.time()
+        best, best_gap = None, hot_heat - cold_heat
+        for stream_name, stats in hot.path_stats.items():
+            info = self.stream_manager.get(stream_name)
+            if not info or info['status'] != 'running':
+                continue
+            if now - self._last_moved.get(stream_name, 0) < cooldown:
+                continue
+            readers = stats.get('readers', 0)
+            gap = abs((hot_heat - readers / hot.weight) - (cold_heat + readers / cold.weight))
+            if readers and gap < best_gap:
+                best, best_gap = stream_name, gap
+
+        return (best, cold.name) if best else None
+
+    def rebalance_once(self, threshold=1.5, cooldown=300):
+        """Run one planning round and perform its migration, returns the result or None"""
+        move = self.plan(threshold, cooldown)
+        if not move:
+            return None
+        return self.migrate(*move)
+
+    def start_auto(self, interval, threshold=1.5, cooldown=300):
+        """Rebalance in the background every interval seconds"""
+        if self._auto_thread:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.rebalance_once(threshold, cooldown)
+                except MigrationError as e:
+                    logger.warning(f"Automatic rebalance skipped: {e}")
+                except Exception as e:
+                    logger.error(f"Automatic rebalance failed: {e}")
+
+        self._auto_thread = threading.Thread(target=loop, daemon=True)
+        self._auto_thread.start()
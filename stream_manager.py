@@ -0,0 +1,609 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+from collections import namedtuple, deque
+from multiprocessing.managers import BaseManager
+from types import MappingProxyType
+
+
+logger = logging.getLogger(__name__)
+
+# Immutable view of the stream table published on every state change.
+# `body` is the pre-serialized /status document and `etag` its content hash.
+# `event_id` is the last event already reflected in this snapshot.
+StatusSnapshot = namedtuple('StatusSnapshot', ['version', 'event_id', 'streams', 'mediamtx_accessible', 'nodes', 'body', 'etag'])
+
+EVENT_BACKLOG = 256  # Events kept for reconnecting /events subscribers
+
+
+class StreamManager:
+    """Owns the active stream table behind a lock and publishes immutable snapshots"""
+
+    def __init__(self, rtsp_host, rtsp_port, launcher=None, prepare=None, release=None, idle_timeout=60,
+                 logs=None):
+        self.rtsp_host = rtsp_host
+        self.rtsp_port = rtsp_port
+        self.launcher = launcher  # launcher(stream_name, video_path, profile=...) -> (process, rtsp_url)
+        self.prepare = prepare    # prepare(stream_name, on_demand) -> (rtsp_url, node) or None, before first launch
+        self.release = release    # release(stream_name), called after a stream is removed
+        self.log_reader = logs    # logs(stream_name, limit) -> recent encoder output lines or None
+        self.idle_timeout = idle_timeout  # Seconds without readers before an on-demand encoder stops
+        self.rebalancer = None    # Rebalancer moving streams between nodes, set by main.py
+
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._mediamtx_accessible = False
+        self._path_stats = {}
+        self._usage = {}
+        self._nodes = []
+        self._version = 0
+        self._snapshot = None
+        self._health_thread = None
+        self._ticker_thread = None
+
+        # Incremental change log consumed by /events subscribers
+        self._events = deque(maxlen=EVENT_BACKLOG)
+        self._event_id = 0
+        self._event_cond = threading.Condition(self._lock)
+
+        with self._lock:
+            self._publish()
+
+    # Readers - lock free, they only ever see a fully built snapshot
+
+    def snapshot(self):
+        """Return the latest published snapshot"""
+        return self._snapshot
+
+    def get(self, stream_name):
+        """Return the published record for a stream, or None"""
+        return self._snapshot.streams.get(stream_name)
+
+    def snapshot_state(self):
+        """Return the latest snapshot with plain dicts, safe to pickle across processes"""
+        snapshot = self._snapshot
+        return snapshot._replace(streams={name: dict(info) for name, info in snapshot.streams.items()})
+
+    def wait_events(self, last_id, timeout):
+        """Return events newer than last_id, waiting up to timeout for one to arrive.
+
+        Returns None when last_id is no longer covered by the backlog, in which
+        case the caller should resynchronise from a full snapshot.
+        """
+        with self._lock:
+            if last_id > self._event_id:
+                return None
+            if last_id == self._event_id:
+                self._event_cond.wait(timeout)
+            if self._events and self._events[0][0] > last_id + 1:
+                return None
+            return [event for event in self._events if event[0] > last_id]
+
+    def logs(self, stream_name, limit=None):
+        """Recent encoder output of a stream, None if there is none"""
+        if not self.log_reader:
+            return None
+        return self.log_reader(stream_name, limit)
+
+    # Writers
+
+    def start_stream(self, stream_name, video_path, filename, on_demand=False, profile=None):
+        """Register a stream and launch FFmpeg for it, returns its record or None.
+
+        On-demand streams are registered idle; the encoder is launched by
+        activate() when the first reader shows up.
+        """
+        rtsp_url, node = None, None
+        if self.prepare:
+            prepared = self.prepare(stream_name, on_demand)
+            if not prepared:
+                return None
+            rtsp_url, node = prepared
+
+        if on_demand:
+            self.add_stream(stream_name, None, rtsp_url, filename, video_path, on_demand=True, node=node, profile=profile)
+        else:
+            process, publish_url = self.launcher(stream_name, video_path, profile=profile)
+            if not process or not publish_url:
+                logger.error(f"Failed to start stream for {stream_name}")
+                return None
+            self.add_stream(stream_name, process, rtsp_url or publish_url, filename, video_path, node=node, profile=profile)
+
+        info = self.get(stream_name)
+        return dict(info) if info else None
+
+    def add_stream(self, stream_name, process, rtsp_url, filename, file_path, on_demand=False, node=None, profile=None):
+        """Register a stream (process is None for an idle on-demand stream), replacing any previous one"""
+        now = time.time()
+        with self._lock:
+            previous = self._streams.get(stream_name)
+            entry = self._streams[stream_name] = {
+                'process': process,
+                'rtsp_url': rtsp_url,
+                'filename': filename,
+                'file_path': file_path,
+                'created_at': now,
+                'stream_name': stream_name,
+                'status': 'running' if process else 'idle',
+                'pid': process.pid if process else None,
+                'on_demand': on_demand,
+                'active_since': now if process else None,
+                'last_reader_at': now,
+                'node': node,
+                'profile': profile,
+            }
+            self._emit('restarted' if previous else 'started', self._stream_view(stream_name, entry))
+            self._publish()
+
+        if previous:
+            self._terminate(previous['process'])
+
+        if process:
+            threading.Thread(target=self._watch_process, args=(stream_name, process), daemon=True).start()
+
+    def activate(self, stream_name):
+        """Launch the encoder of an idle on-demand stream, returns its record or None"""
+        with self._lock:
+            entry = self._streams.get(stream_name)
+            if not entry or not entry['on_demand']:
+                return None
+            if entry['status'] in ('running', 'starting'):
+                return self._stream_view(stream_name, entry)
+            entry['status'] = 'starting'
+
+        process, _ = self.launcher(stream_name, entry['file_path'], profile=entry['profile'])
+
+        with self._lock:
+            if self._streams.get(stream_name) is not entry:
+                # Replaced or stopped while we were launching
+                self._terminate(process)
+                return None
+
+            if not process:
+                entry['status'] = 'idle'
+                self._publish()
+                logger.error(f"Failed to activate on-demand stream {stream_name}")
+                return None
+
+            now = time.time()
+            entry.update(process=process, pid=process.pid, status='running', active_since=now, last_reader_at=now)
+            info = self._stream_view(stream_name, entry)
+            self._emit('activated', info)
+            self._publish()
+
+        threading.Thread(target=self._watch_process, args=(stream_name, process), daemon=True).start()
+        logger.info(f"On-demand stream activated: {stream_name}")
+        return info
+
+    def deactivate(self, stream_name):
+        """Stop the encoder of an on-demand stream but keep the stream registered"""
+        with self._lock:
+            entry = self._streams.get(stream_name)
+            if not entry or not entry['on_demand'] or entry['status'] != 'running':
+                return False
+            process = entry['process']
+            entry.update(process=None, pid=None, status='idle', active_since=None)
+            self._emit('idle', self._stream_view(stream_name, entry))
+            self._publish()
+
+        self._terminate(process)
+        logger.info(f"On-demand stream idle, encoder stopped: {stream_name}")
+        return True
+
+    def migrate(self, stream_name, target_node=None):
+        """Move a running stream to another node (see rebalancer.py)"""
+        if not self.rebalancer:
+            raise RuntimeError("Stream migration is not configured")
+        return self.rebalancer.migrate(stream_name, target_node)
+
+    def rebalance(self, threshold, cooldown):
+        """Run one automatic rebalance round, returns the migration performed or None"""
+        if not self.rebalancer:
+            raise RuntimeError("Stream migration is not configured")
+        return self.rebalancer.rebalance_once(threshold, cooldown)
+
+    def replace_process(self, stream_name, process, rtsp_url, node):
+        """Swap in a new publisher for a running stream, returns the old process.
+
+        The caller stops the old process once readers have been pointed at rtsp_url.
+        """
+        with self._lock:
+            entry = self._streams.get(stream_name)
+            if not entry or entry['status'] != 'running':
+                raise KeyError(stream_name)
+            previous = entry['process']
+            entry.update(process=process, pid=process.pid, rtsp_url=rtsp_url, node=node)
+            self._emit('migrated', self._stream_view(stream_name, entry))
+            self._publish()
+
+        threading.Thread(target=self._watch_process, args=(stream_name, process), daemon=True).start()
+        return previous
+
+    def stop_stream(self, stream_name):
+        """Stop and forget a stream, returns True if it existed"""
+        with self._lock:
+            entry = self._streams.pop(stream_name, None)
+            if entry:
+                self._emit('removed', {'stream_name': stream_name})
+                self._publish()
+
+        if not entry:
+            return False
+
+        self._terminate(entry['process'])
+        if self.release:
+            self.release(stream_name)
+        logger.info(f"Stopped existing stream: {stream_name}")
+        return True
+
+    def stop_all(self):
+        """Stop every stream, used on shutdown"""
+        for stream_name in list(self._snapshot.streams):
+            self.stop_stream(stream_name)
+
+    def set_mediamtx_accessible(self, accessible):
+        """Record the latest MediaMTX health probe result"""
+        with self._lock:
+            if accessible == self._mediamtx_accessible:
+                return
+            self._mediamtx_accessible = accessible
+            self._emit('mediamtx', {'mediamtx_accessible': accessible})
+            self._publish()
+
+    def set_path_stats(self, path_stats):
+        """Record per-path MediaMTX stats ({path_name: stats}) from /v3/paths/list"""
+        self._reap_idle(path_stats)
+
+        with self._lock:
+            if path_stats == self._path_stats:
+                return
+
+            # Publish state and reader counts are events, byte counters only refresh the snapshot
+            changed = {}
+            for stream_name in self._streams:
+                old = self._path_stats.get(stream_name) or {}
+                new = path_stats.get(stream_name) or {}
+                if (old.get('ready'), old.get('readers')) != (new.get('ready'), new.get('readers')):
+                    changed[stream_name] = self._mediamtx_view(new or None)
+
+            self._path_stats = path_stats
+            if changed:
+                self._emit('paths', {'streams': changed})
+            self._publish()
+
+    def set_usage(self, usage):
+        """Record per-stream encoder CPU/memory use ({stream_name: usage}).
+
+        Kept out of the /status snapshot: samples change every probe and would
+        defeat its ETag. Served by usage() and the 'tick' events instead.
+        """
+        with self._lock:
+            self._usage = usage
+
+    def usage(self):
+        """Latest encoder usage sample per stream"""
+        with self._lock:
+            return dict(self._usage)
+
+    def set_nodes(self, nodes):
+        """Record the MediaMTX node pool state (list of node views)"""
+        with self._lock:
+            if nodes == self._nodes:
+                return
+            health_changed = [(n['name'], n['healthy']) for n in nodes] != [(n['name'], n['healthy']) for n in self._nodes]
+            self._nodes = nodes
+            if health_changed:
+                self._emit('nodes', {'nodes': nodes})
+            self._publish()
+
+    def start_health_monitor(self, check, interval):
+        """Probe MediaMTX in the background so request handlers never block on it"""
+        if self._health_thread:
+            return
+
+        def monitor():
+            while True:
+                try:
+                    self.set_mediamtx_accessible(bool(check()))
+                except Exception as e:
+                    logger.error(f"MediaMTX health probe failed: {e}")
+                time.sleep(interval)
+
+        self._health_thread = threading.Thread(target=monitor, daemon=True)
+        self._health_thread.start()
+
+    def start_metrics_ticker(self, interval):
+        """Emit a periodic 'tick' event carrying per-stream uptime"""
+        if self._ticker_thread:
+            return
+
+        def ticker():
+            while True:
+                time.sleep(interval)
+                now = time.time()
+                with self._lock:
+                    running = {
+                        name: {
+                            'uptime_seconds': round(now - entry['active_since'], 1),
+                            'mediamtx': self._mediamtx_view(self._path_stats.get(name)),
+                            'usage': self._usage.get(name),
+                        }
+                        for name, entry in self._streams.items() if entry['status'] == 'running'
+                    }
+                    self._emit('tick', {
+                        'timestamp': now,
+                        'total_streams': len(self._streams),
+                        'running_streams': len(running),
+                        'streams': running,
+                    })
+
+        self._ticker_thread = threading.Thread(target=ticker, daemon=True)
+        self._ticker_thread.start()
+
+    # Internals
+
+    def _watch_process(self, stream_name, process):
+        # Block until FFmpeg exits, then flag the stream as stopped
+        process.wait()
+        with self._lock:
+            entry = self._streams.get(stream_name)
+            if not entry or entry['process'] is not process:
+                return
+            # A dead on-demand encoder goes back to idle and is relaunched by the next reader
+            entry['status'] = 'idle' if entry['on_demand'] else 'stopped'
+            entry['process'] = None
+            entry['pid'] = None
+            entry['active_since'] = None
+            self._emit(entry['status'], self._stream_view(stream_name, entry))
+            self._publish()
+        logger.warning(f"FFmpeg process for '{stream_name}' exited with code {process.returncode}")
+
+    def _reap_idle(self, path_stats):
+        # Deactivate on-demand encoders that have had no readers for idle_timeout seconds
+        now = time.time()
+        expired = []
+        with self._lock:
+            for stream_name, entry in self._streams.items():
+                if not entry['on_demand'] or entry['status'] != 'running':
+                    continue
+                if (path_stats.get(stream_name) or {}).get('readers', 0) > 0:
+                    entry['last_reader_at'] = now
+                elif now - entry['last_reader_at'] > self.idle_timeout:
+                    expired.append(stream_name)
+
+        for stream_name in expired:
+            self.deactivate(stream_name)
+
+    def _terminate(self, process):
+        if process and process.poll() is None:
+            process.terminate()
+
+    def _stream_view(self, stream_name, entry):
+        # Public (JSON-safe) fields of an internal stream record
+        return {
+            'stream_name': stream_name,
+            'rtsp_url': entry['rtsp_url'],
+            'filename': entry['filename'],
+            'file_path': entry['file_path'],
+            'status': entry['status'],
+            'is_running': entry['status'] == 'running',
+            'pid': entry['pid'],
+            'created_at': entry['created_at'],
+            'on_demand': entry['on_demand'],
+            'active_since': entry['active_since'],
+            'node': entry['node'],
+            'profile': entry['profile'],
+            'mediamtx': self._mediamtx_view(self._path_stats.get(stream_name)),
+        }
+
+    def _mediamtx_view(self, stats):
+        # What MediaMTX reports for the stream's path, None if it does not know the path
+        if not stats:
+            return None
+        return {
+            'ready': stats['ready'],
+            'readers': stats['readers'],
+            'bytes_received': stats['bytes_received'],
+            'bytes_sent': stats['bytes_sent'],
+        }
+
+    def _emit(self, event, data):
+        # Must be called with self._lock held
+        self._event_id += 1
+        self._events.append((self._event_id, event, json.dumps(data)))
+        self._event_cond.notify_all()
+
+    def _publish(self):
+        # Must be called with self._lock held
+        self._version += 1
+
+        streams = {}
+        for stream_name, entry in self._streams.items():
+            streams[stream_name] = MappingProxyType(self._stream_view(stream_name, entry))
+
+        status_data = {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
+            'version': self._version,
+            'mediamtx_accessible': self._mediamtx_accessible,
+            'mediamtx_host': self.rtsp_host,
+            'mediamtx_port': self.rtsp_port,
+            'total_streams': len(streams),
+            'rtsp_server': f'rtsp://{self.rtsp_host}:{self.rtsp_port}',
+            'nodes': self._nodes,
+            'streams': {name: dict(info) for name, info in streams.items()},
+        }
+        body = json.dumps(status_data).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+
+        self._snapshot = StatusSnapshot(
+            version=self._version,
+            event_id=self._event_id,
+            streams=MappingProxyType(streams),
+            mediamtx_accessible=self._mediamtx_accessible,
+            nodes=self._nodes,
+            body=body,
+            etag=etag,
+        )
+
+
+# Multi-process serving: one process owns the StreamManager (and the FFmpeg
+# children), web workers talk to it over a multiprocessing manager connection.
+
+MANAGER_EXPOSED = (
+    'snapshot_state', 'wait_events', 'start_stream', 'stop_stream', 'set_mediamtx_accessible',
+    'set_path_stats', 'set_usage', 'usage', 'set_nodes', 'activate', 'migrate', 'rebalance', 'logs',
+)
+
+
+class _ManagerServer(BaseManager):
+    pass
+
+
+class _ManagerClient(BaseManager):
+    pass
+
+
+_ManagerClient.register('get_stream_manager', exposed=MANAGER_EXPOSED)
+
+
+def parse_manager_address(address):
+    """'host:port' -> TCP address tuple, anything else is a unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return address
+
+
+def serve_stream_manager(manager, address, authkey):
+    """Serve a StreamManager to other processes, blocks forever"""
+    address = parse_manager_address(address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)  # Stale socket from a previous run
+
+    _ManagerServer.register('get_stream_manager', callable=lambda: manager, exposed=MANAGER_EXPOSED)
+    server = _ManagerServer(address=address, authkey=authkey).get_server()
+    logger.info(f"Stream manager serving on {address}")
+    server.serve_forever()
+
+
+class RemoteStreamManager:
+    """StreamManager stand-in for web workers, backed by the shared manager process.
+
+    A follower thread mirrors the remote snapshot locally whenever the event
+    log moves, so snapshot()/get() stay lock-free and never cross the IPC link.
+    """
+
+    def __init__(self, address, authkey, connect_timeout=10, event_timeout=15):
+        self.address = parse_manager_address(address)
+        self.event_timeout = event_timeout
+
+        client = _ManagerClient(address=self.address, authkey=authkey)
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                client.connect()
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+
+        # Proxies open one connection per calling thread
+        self._remote = client.get_stream_manager()
+        self._snapshot = self._fetch_snapshot()
+
+        threading.Thread(target=self._follow, daemon=True).start()
+
+    def snapshot(self):
+        """Return the latest mirrored snapshot"""
+        return self._snapshot
+
+    def get(self, stream_name):
+        """Return the mirrored record for a stream, or None"""
+        return self._snapshot.streams.get(stream_name)
+
+    def wait_events(self, last_id, timeout):
+        """Return events newer than last_id from the manager process"""
+        return self._remote.wait_events(last_id, timeout)
+
+    def logs(self, stream_name, limit=None):
+        """Recent encoder output of a stream, from the manager process"""
+        return self._remote.logs(stream_name, limit)
+
+    def start_stream(self, stream_name, video_path, filename, on_demand=False, profile=None):
+        """Start a stream in the manager process"""
+        info = self._remote.start_stream(stream_name, video_path, filename, on_demand, profile)
+        self._snapshot = self._fetch_snapshot()
+        return info
+
+    def stop_stream(self, stream_name):
+        """Stop a stream in the manager process"""
+        stopped = self._remote.stop_stream(stream_name)
+        self._snapshot = self._fetch_snapshot()
+        return stopped
+
+    def activate(self, stream_name):
+        """Activate an on-demand stream in the manager process"""
+        info = self._remote.activate(stream_name)
+        self._snapshot = self._fetch_snapshot()
+        return info
+
+    def migrate(self, stream_name, target_node=None):
+        """Migrate a stream in the manager process"""
+        result = self._remote.migrate(stream_name, target_node)
+        self._snapshot = self._fetch_snapshot()
+        return result
+
+    def rebalance(self, threshold, cooldown):
+        """Run a rebalance round in the manager process"""
+        result = self._remote.rebalance(threshold, cooldown)
+        self._snapshot = self._fetch_snapshot()
+        return result
+
+    def set_mediamtx_accessible(self, accessible):
+        self._remote.set_mediamtx_accessible(accessible)
+
+    def set_path_stats(self, path_stats):
+        self._remote.set_path_stats(path_stats)
+
+    def set_usage(self, usage):
+        self._remote.set_usage(usage)
+
+    def usage(self):
+        """Encoder usage per stream, from the manager process"""
+        return self._remote.usage()
+
+    def set_nodes(self, nodes):
+        self._remote.set_nodes(nodes)
+
+    def start_health_monitor(self, check, interval):
+        # The manager process runs the MediaMTX probe
+        pass
+
+    def start_metrics_ticker(self, interval):
+        # The manager process emits ticks
+        pass
+
+    def _fetch_snapshot(self):
+        state = self._remote.snapshot_state()
+        return state._replace(streams=MappingProxyType(
+            {name: MappingProxyType(info) for name, info in state.streams.items()}
+        ))
+
+    def _follow(self):
+        event_id = self._snapshot.event_id
+        while True:
+            try:
+                events = self._remote.wait_events(event_id, self.event_timeout)
+                if events is None or events:
+                    self._snapshot = self._fetch_snapshot()
+                if events is None:
+                    event_id = self._snapshot.event_id
+                elif events:
+                    event_id = events[-1][0]
+            except Exception as e:
+                logger.error(f"Lost connection to stream manager: {e}")
+                time.sleep(1)
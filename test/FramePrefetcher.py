@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import threading
+from collections import deque
+
+DEFAULT_MAX_FRAMES = 32
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+READ_BUFFER = 256 * 1024           # Userspace buffer, a few frames per read() syscall
+READAHEAD_WINDOW = 8 * 1024 * 1024  # Bytes asked of the kernel ahead of the reader (POSIX_FADV_WILLNEED)
+
+fadvise = getattr(os, 'posix_fadvise', None)  # Linux/BSD; elsewhere the hints are skipped
+
+
+class FramePrefetcher:
+    """Reads a .Mjpeg video ahead of the pacing loop, on its own thread.
+
+    A background reader keeps up to max_frames upcoming frames (and at most
+    max_bytes of them) in a queue, looping at the end of the file like
+    VideoStream. The kernel is told the file is read sequentially and is
+    asked to load the next READAHEAD_WINDOW bytes before they are needed.
+    nextFrame() only takes from the queue, so a slow disk delays the reader
+    instead of the frame deadline; each call that finds the queue empty is
+    counted as an underrun.
+    """
+
+    def __init__(self, filename, max_frames=DEFAULT_MAX_FRAMES, max_bytes=DEFAULT_MAX_BYTES):
+        self.filename = filename
+        self.max_frames = max(1, max_frames)
+        self.max_bytes = max_bytes
+        try:
+            self.file = open(filename, 'rb', buffering=READ_BUFFER)
+        except Exception as e:
+            raise IOError(f"Could not open file: {filename}. Error: {e}")
+        self.advise(0, 0, 'POSIX_FADV_SEQUENTIAL')
+        self.advised_to = 0
+
+        self.frames = deque()
+        self.queued_bytes = 0
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.frameNum = 0
+
+        # Counters for STATS
+        self.frames_read = 0
+        self.underruns = 0   # nextFrame() calls that found the queue empty
+        self.stalls = 0      # ... and got no frame within their timeout either
+        self.read_time = 0.0
+        self.max_read_time = 0.0
+
+    def start(self):
+        if not self.thread:
+            self.thread = threading.Thread(target=self.run, name=f"prefetch-{os.path.basename(self.filename)}",
+                                           daemon=True)
+            self.thread.start()
+        return self
+
+    def advise(self, offset, length, advice):
+        if fadvise:
+            try:
+                fadvise(self.file.fileno(), offset, length, getattr(os, advice))
+            except (OSError, AttributeError):
+                pass
+
+    def read_frame(self):
+        """Read one frame from the file, looping at the end. None if the file holds no valid frame."""
+        for _ in range(2):
+            header = self.file.read(5)
+            if len(header) == 5:
+                try:
+                    length = int(header)
+                except ValueError:
+                    print(f"Invalid frame length data in {self.filename}: {header}")
+                    length = -1
+                if length >= 0:
+                    frame = self.file.read(length)
+                    if len(frame) == length:
+                        return frame
+            # End of file, a truncated frame or a bad header: start over
+            self.file.seek(0)
+            self.advised_to = 0
+        return None
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                # Full: wait for the pacing loop to take a frame (the first frame always fits)
+                while (not self.stop_event.is_set() and self.frames and
+                       (len(self.frames) >= self.max_frames or self.queued_bytes >= self.max_bytes)):
+                    self.condition.wait()
+            if self.stop_event.is_set():
+                break
+
+            position = self.file.tell()
+            if position + READAHEAD_WINDOW // 2 > self.advised_to:
+                # Keep the kernel a window ahead, re-asking every half window
+                self.advise(position, READAHEAD_WINDOW, 'POSIX_FADV_WILLNEED')
+                self.advised_to = position + READAHEAD_WINDOW
+
+            started = time.perf_counter()
+            try:
+                frame = self.read_frame()
+            except (OSError, ValueError) as e:
+                print(f"Prefetch of {self.filename} failed: {e}")
+                frame = None
+            elapsed = time.perf_counter() - started
+            if frame is None:
+                # Nothing readable: leave the pacing loop underrunning rather than spin
+                self.stop_event.wait(0.5)
+                continue
+
+            with self.condition:
+                self.frames.append(frame)
+                self.queued_bytes += len(frame)
+                self.frames_read += 1
+                self.read_time += elapsed
+                self.max_read_time = max(self.max_read_time, elapsed)
+                self.condition.notify_all()
+
+    def nextFrame(self, timeout=0.0):
+        """Next frame from the queue, waiting at most timeout seconds; None on an underrun"""
+        if not self.thread:
+            self.start()
+        with self.condition:
+            if not self.frames:
+                self.underruns += 1
+                if timeout <= 0 or not self.condition.wait_for(lambda: self.frames or self.stop_event.is_set(),
+                                                                timeout):
+                    self.stalls += 1
+                    return None
+                if not self.frames:
+                    return None
+            frame = self.frames.popleft()
+            self.queued_bytes -= len(frame)
+            self.condition.notify_all()
+        self.frameNum += 1
+        return frame
+
+    def frameNbr(self):
+        """Number of frames handed out"""
+        return self.frameNum
+
+    def stats(self):
+        with self.condition:
+            return {
+                'queued_frames': len(self.frames),
+                'queued_bytes': self.queued_bytes,
+                'frames_read': self.frames_read,
+                'underruns': self.underruns,
+                'stalls': self.stalls,
+                'avg_read_ms': round(1000 * self.read_time / self.frames_read, 3) if self.frames_read else 0.0,
+                'max_read_ms': round(1000 * self.max_read_time, 3),
+            }
+
+    def close(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+        self.file.close()
+
+
+# Read a video through the prefetcher if run directly
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python FramePrefetcher.py video.Mjpeg [frames]")
+        sys.exit(1)
+    prefetcher = FramePrefetcher(sys.argv[1]).start()
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    started = time.perf_counter()
+    for _ in range(count):
+        prefetcher.nextFrame(timeout=1.0)
+    elapsed = time.perf_counter() - started
+    print(f"{count} frames in {elapsed * 1000:.1f} ms")
+    print(prefetcher.stats())
+    prefetcher.close()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import time
+import struct
+import hashlib
+import threading
+from multiprocessing import shared_memory
+from VideoBroadcaster import is_keyframe
+
+RING_MAGIC = b'MJRG'
+MAX_WORKERS = 64
+RING_HEADER = struct.Struct('<4sIIIQd')  # magic, slot count, slot size, padding, frames written, frame delay
+WRITTEN_OFFSET = 16                      # 8-byte aligned, so the counter is stored in one write
+SLOT_HEADER = struct.Struct('<QI')       # frame number + 1 (0 while being written), frame length
+READERS_OFFSET = RING_HEADER.size        # One byte per worker, 1 while it has subscribers
+SLOTS_OFFSET = READERS_OFFSET + MAX_WORKERS
+COUNTER = struct.Struct('<Q')
+
+
+def ring_name(port, video):
+    """Shared memory name of a video's ring, the same in every process"""
+    return f"mjr{port}_{hashlib.sha1(video.encode('utf-8')).hexdigest()[:16]}"
+
+
+class FrameRing:
+    """The most recent frames of one video in shared memory.
+
+    One writer (the coordinator) and any number of reader processes. Each slot
+    carries the number of the frame in it; the writer zeroes that number while
+    it copies, so a reader that sees another number after using a frame knows
+    the slot was overwritten underneath it (a per-slot seqlock).
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, self.slot_count, self.slot_size, _, _, self.frame_delay = RING_HEADER.unpack_from(self.buf, 0)
+        if magic != RING_MAGIC:
+            # Also seen for a moment between the coordinator creating the segment and writing the header
+            self.buf = None
+            shm.close()
+            raise ValueError(f"{shm.name} is not a frame ring")
+        self.stride = SLOT_HEADER.size + self.slot_size
+        self.oversized = 0
+
+    @classmethod
+    def create(cls, name, slot_count, slot_size, frame_delay):
+        size = SLOTS_OFFSET + slot_count * (SLOT_HEADER.size + slot_size)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a server that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        RING_HEADER.pack_into(shm.buf, 0, RING_MAGIC, slot_count, slot_size, 0, 0, frame_delay)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # Worker processes share the coordinator's resource tracker, which unlinks
+        # whatever is still registered only when the whole server exits
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def _slot(self, number):
+        return SLOTS_OFFSET + (number % self.slot_count) * self.stride
+
+    def written(self):
+        """Frames written so far, the newest is written() - 1"""
+        return COUNTER.unpack_from(self.buf, WRITTEN_OFFSET)[0]
+
+    def write(self, frame):
+        """Append a frame (coordinator only), False if it does not fit a slot"""
+        if len(frame) > self.slot_size:
+            self.oversized += 1
+            return False
+        number = self.written()
+        offset = self._slot(number)
+        SLOT_HEADER.pack_into(self.buf, offset, 0, len(frame))
+        start = offset + SLOT_HEADER.size
+        self.buf[start:start + len(frame)] = frame
+        SLOT_HEADER.pack_into(self.buf, offset, number + 1, len(frame))
+        COUNTER.pack_into(self.buf, WRITTEN_OFFSET, number + 1)
+        return True
+
+    def read(self, number):
+        """Frame as a memoryview into shared memory (no copy), None if overwritten or not written yet"""
+        offset = self._slot(number)
+        tag, length = SLOT_HEADER.unpack_from(self.buf, offset)
+        if tag != number + 1 or length > self.slot_size:
+            return None
+        start = offset + SLOT_HEADER.size
+        return self.buf[start:start + length]
+
+    def still_valid(self, number):
+        """True if frame number is still in its slot, check after using a read()"""
+        return SLOT_HEADER.unpack_from(self.buf, self._slot(number))[0] == number + 1
+
+    def set_reader(self, worker_id, active):
+        self.buf[READERS_OFFSET + worker_id] = 1 if active else 0
+
+    def has_readers(self):
+        return any(self.buf[READERS_OFFSET:READERS_OFFSET + MAX_WORKERS])
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingBroadcaster:
+    """Worker-side stand-in for VideoBroadcaster that fans frames out of a FrameRing.
+
+    It has the same subscribe/unsubscribe interface, so client handlers work
+    unchanged. There is no per-video thread: a RingPump delivers every
+    broadcaster's new frames in this process.
+    """
+
+    def __init__(self, ring, worker_id):
+        self.ring = ring
+        self.worker_id = worker_id
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.next_frame = ring.written()
+        self.frames_sent = 0
+        self.torn_frames = 0  # Frames overwritten while being sent, we fell a whole ring behind
+
+    def subscribe(self, subscriber):
+        """Add a subscriber, sending it the newest frame first if it is a keyframe"""
+        with self.lock:
+            replayed = 0
+            newest = self.ring.written() - 1
+            frame = self.ring.read(newest) if newest >= 0 else None
+            if frame is not None and is_keyframe(frame):
+                subscriber.send_frame(frame, self)
+                replayed = 1
+                self.next_frame = max(self.next_frame, newest + 1)
+            self.subscribers.append(subscriber)
+            self.ring.set_reader(self.worker_id, True)
+            return replayed
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if not self.subscribers:
+                self.ring.set_reader(self.worker_id, False)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def pump(self):
+        """Send every frame written since the last call, returns True if there was one"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        written = self.ring.written()
+        if not subscribers:
+            # Idle: stay at the live edge instead of bursting old frames on the next subscribe
+            self.next_frame = written
+            return False
+        if written - self.next_frame >= self.ring.slot_count:
+            self.next_frame = written - 1
+        sent = False
+        while self.next_frame < written:
+            number = self.next_frame
+            self.next_frame += 1
+            frame = self.ring.read(number)
+            if frame is None:
+                self.torn_frames += 1
+                continue
+            for subscriber in subscribers:
+                subscriber.send_frame(frame, self)
+            if not self.ring.still_valid(number):
+                self.torn_frames += 1
+            self.frames_sent += 1
+            sent = True
+        return sent
+
+    def stop(self):
+        with self.lock:
+            self.subscribers = []
+            self.ring.set_reader(self.worker_id, False)
+
+
+class RingPump:
+    """One thread per worker process that delivers new frames for all of its RingBroadcasters"""
+
+    def __init__(self, poll_interval=0.002):
+        self.poll_interval = poll_interval
+        self.broadcasters = []
+        self.stop_event = threading.Event()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def add(self, broadcaster):
+        self.broadcasters = self.broadcasters + [broadcaster]
+        return broadcaster
+
+    def run(self):
+        while not self.stop_event.is_set():
+            busy = False
+            for broadcaster in self.broadcasters:
+                busy |= broadcaster.pump()
+            if not busy:
+                time.sleep(self.poll_interval)
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+from collections import deque
+
+STAGES = ('network', 'buffer', 'display', 'total')
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyStats:
+    """Per-frame latency of a session, from the server's send time to the frame on screen.
+
+    Each frame is split into stages, in milliseconds:
+        network   send time (RTP send-time extension) -> datagram received
+        buffer    received -> the UI thread starts on it (queued behind earlier frames)
+        display   decode, scale and paint
+        total     send time -> painted
+    network and total compare two clocks, so across hosts they are only as
+    good as their NTP sync. Frames without a send time count toward buffer
+    and display only. The last `window` frames give the percentiles, and
+    every frame is appended to the CSV log when there is one.
+    """
+
+    def __init__(self, log_path=None, window=1000):
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self.frames = 0
+        self.log_path = log_path
+        self.log = None
+        self.session = None
+
+    def start_session(self, session):
+        """Clear the samples for a new session, its frames are logged under this id"""
+        for samples in self.samples.values():
+            samples.clear()
+        self.frames = 0
+        self.session = session
+
+    def record(self, seq, sent, arrived, display_start, display_end):
+        """Add one frame (Unix times; sent is None without the extension), returns its stages in ms"""
+        stages = {
+            'network': (arrived - sent) * 1000 if sent else None,
+            'buffer': (display_start - arrived) * 1000,
+            'display': (display_end - display_start) * 1000,
+            'total': (display_end - sent) * 1000 if sent else None,
+        }
+        for stage, value in stages.items():
+            if value is not None:
+                self.samples[stage].append(value)
+        self.frames += 1
+
+        if self.log_path:
+            if not self.log:
+                new = not os.path.exists(self.log_path) or not os.path.getsize(self.log_path)
+                self.log = open(self.log_path, 'a', buffering=1)
+                if new:
+                    self.log.write("time,session,seq," + ",".join(f"{stage}_ms" for stage in STAGES) + "\n")
+            values = ",".join('' if stages[stage] is None else f"{stages[stage]:.3f}" for stage in STAGES)
+            self.log.write(f"{display_end:.6f},{self.session},{seq},{values}\n")
+        return stages
+
+    def percentiles(self):
+        """{stage: {'p50': ms, 'p95': ms, 'p99': ms}} over the window, None for stages without samples"""
+        result = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                result[stage] = None
+                continue
+            ordered = sorted(samples)
+            result[stage] = {f"p{pct}": round(ordered[min(len(ordered) - 1, len(ordered) * pct // 100)], 2)
+                             for pct in PERCENTILES}
+        return result
+
+    def summary(self):
+        """One line for the UI, e.g. 'network 1.2/3.4/5.0 ms | ...' (p50/p95/p99)"""
+        parts = []
+        for stage, values in self.percentiles().items():
+            if values:
+                parts.append(f"{stage} {'/'.join(f'{values[key]:.1f}' for key in ('p50', 'p95', 'p99'))}")
+        if not parts:
+            return "Latency: no frames yet"
+        return f"Latency p50/p95/p99 ms ({self.frames} frames): " + " | ".join(parts)
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+
+# Feed synthetic frames if run directly
+if __name__ == "__main__":
+    stats = LatencyStats(sys.argv[1] if len(sys.argv) > 1 else None)
+    stats.start_session(1)
+    for seq in range(200):
+        sent = time.time()
+        arrived = sent + 0.002 + (seq % 10) / 1000
+        stats.record(seq, sent, arrived, arrived + 0.001, arrived + 0.006)
+    print(stats.summary())
+    stats.close()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import time
+import socket
+import threading
+from random import randint
+from RtpPacket import RtpPacket, ONE_BYTE_PROFILE, send_time_extension
+
+MJPEG_TYPE = 26
+RTP_CLOCK = 90000  # JPEG/90000, as in the SDP
+
+
+class MulticastSender:
+    """Sends one video's frames to a multicast group, once per frame however many sessions watch.
+
+    It subscribes to the video's broadcaster while at least one multicast
+    session is playing and unsubscribes when the last one leaves.
+    """
+
+    def __init__(self, broadcaster, group, port, ttl=1, interface='0.0.0.0'):
+        self.broadcaster = broadcaster
+        self.group = group
+        self.port = port
+        self.ttl = ttl
+        self.ssrc = randint(0, 0xFFFFFFFF)
+        self.seq_num = 0
+        self.packets_sent = 0
+        self.rtp_packet = RtpPacket()  # Reused for every packet, under send_lock
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        # Loop back so receivers on this host (and single-box tests) get the packets too
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.sessions = set()
+
+    def transport(self):
+        """Transport header value for SETUP/SWITCH replies"""
+        return (f"RTP/AVP;multicast;destination={self.group};port={self.port}-{self.port + 1};"
+                f"ttl={self.ttl};ssrc={self.ssrc:08X}")
+
+    def add(self, session):
+        """Start sending for a session, the first one subscribes to the broadcaster"""
+        with self.lock:
+            first = not self.sessions
+            self.sessions.add(session)
+            if first:
+                self.broadcaster.subscribe(self)
+
+    def remove(self, session):
+        with self.lock:
+            self.sessions.discard(session)
+            if not self.sessions:
+                self.broadcaster.unsubscribe(self)
+
+    def session_count(self):
+        with self.lock:
+            return len(self.sessions)
+
+    def send_frame(self, data, broadcaster):
+        """One RTP packet to the group, called by the broadcaster"""
+        with self.send_lock:
+            self.seq_num = (self.seq_num + 1) & 0xFFFF
+            now = time.time()
+            self.rtp_packet.encode(2, 0, 0, 0, self.seq_num, 0, MJPEG_TYPE, self.ssrc, data,
+                                   timestamp=int(now * RTP_CLOCK) & 0xFFFFFFFF, extension_profile=ONE_BYTE_PROFILE,
+                                   extension_data=send_time_extension(now))
+            try:
+                self.socket.sendmsg(self.rtp_packet.buffers(), [], 0, (self.group, self.port))
+                self.packets_sent += 1
+            except OSError as e:
+                print(f"Multicast send error to {self.group}:{self.port}: {e}")
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+        self.socket.close()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import os
+import array
+import threading
+from collections import OrderedDict
+
+
+class PacketizedVideo:
+    """A whole MJPEG file in memory plus a table of where each frame's payload starts and ends.
+
+    The file itself is the flat buffer: frames sit between their 5-byte length
+    headers, so packetizing is one read and one pass over the headers. A
+    payload is handed out as a memoryview; nothing is copied or re-encoded.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self.data = handle.read()
+        self.offsets = array.array('Q')
+        self.lengths = array.array('I')
+        offset = 0
+        while offset + 5 <= len(self.data):
+            try:
+                length = int(self.data[offset:offset + 5])
+            except ValueError:
+                break
+            if offset + 5 + length > len(self.data):
+                break
+            self.offsets.append(offset + 5)
+            self.lengths.append(length)
+            offset += 5 + length
+        self.view = memoryview(self.data)
+        self.size = len(self.data) + self.offsets.itemsize * len(self.offsets) + self.lengths.itemsize * len(self.lengths)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def frame(self, index):
+        offset = self.offsets[index]
+        return self.view[offset:offset + self.lengths[index]]
+
+
+class PacketCache:
+    """Packetized videos shared by every broadcaster, bounded by max_bytes with LRU eviction.
+
+    Keyed by path, size and mtime, so a rewritten file is packetized again.
+    lookup() never blocks: a miss is packetized on a background thread while
+    the broadcaster keeps reading the file. A video larger than the whole
+    budget, or one that cannot be packetized, is remembered as rejected, so
+    it counts one miss and is not tried again until the file changes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.videos = OrderedDict()  # (path, size, mtime) -> PacketizedVideo, least recently used first
+        self.total_bytes = 0
+        self.loading = {}            # key -> Event set when its background packetization ends
+        self.rejected = set()        # Keys that cannot be cached
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, path):
+        """(video, None) on a hit, (None, event) while the video is packetized in the
+        background (the event is set when that ends), (None, None) if it cannot be cached"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
+        key = (path, stat.st_size, stat.st_mtime)
+        with self.lock:
+            video = self.videos.get(key)
+            if video:
+                self.videos.move_to_end(key)
+                self.hits += 1
+                return video, None
+            if key in self.rejected:
+                return None, None
+            if key in self.loading:
+                return None, self.loading[key]
+            self.misses += 1
+            if stat.st_size > self.max_bytes:
+                self.rejected.add(key)
+                return None, None
+            ready = self.loading[key] = threading.Event()
+        threading.Thread(target=self.load, args=(key, path, ready), daemon=True).start()
+        return None, ready
+
+    def get(self, path):
+        """PacketizedVideo for a file, waiting for it to be packetized; None if it cannot be cached"""
+        video, ready = self.lookup(path)
+        if ready:
+            ready.wait()
+            video, _ = self.lookup(path)
+        return video
+
+    def load(self, key, path, ready):
+        # Packetize outside the lock, other videos keep being served meanwhile
+        try:
+            video = PacketizedVideo(path)
+        except OSError as e:
+            print(f"Could not packetize {path}: {e}")
+            video = None
+        with self.lock:
+            if video is None or not len(video):
+                self.rejected.add(key)
+            elif key not in self.videos:
+                self.videos[key] = video
+                self.total_bytes += video.size
+                while self.total_bytes > self.max_bytes and len(self.videos) > 1:
+                    _, evicted = self.videos.popitem(last=False)
+                    self.total_bytes -= evicted.size
+                    self.evictions += 1
+            del self.loading[key]
+        ready.set()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'videos': len(self.videos),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
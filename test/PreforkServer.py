@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import heapq
+import queue
+import signal
+import threading
+import multiprocessing
+from VideoCatalog import VideoCatalog
+from FramePrefetcher import FramePrefetcher, DEFAULT_MAX_FRAMES, DEFAULT_MAX_BYTES
+from SharedCatalog import SharedCatalog
+from FrameRing import FrameRing, RingBroadcaster, RingPump, ring_name, MAX_WORKERS
+
+RING_SLOTS = 32               # Frames kept per video, a worker may fall this far behind
+DEFAULT_SLOT_SIZE = 1 << 20   # Used when a video's largest frame cannot be measured
+ATTACH_TIMEOUT = 2.0
+
+
+class PreforkServer:
+    """Runs the custom RTSP server as several worker processes on one port.
+
+    Every worker listens on the port with SO_REUSEPORT, so the kernel spreads
+    connections across them, and runs its sessions and RTP sending on its own
+    core. This process is the coordinator: it owns the catalog (published to
+    the workers through shared memory) and the pacing clock. Each video that
+    some worker is serving is read from disk once, at its frame rate, into a
+    FrameRing that every worker reads without copying. A FramePrefetcher per
+    video does the reading, so a slow disk read cannot hold up the clock for
+    every other video.
+    """
+
+    def __init__(self, video_directory, port, workers, session_timeout, fps=None, ring_slots=RING_SLOTS,
+                 prefetch_frames=DEFAULT_MAX_FRAMES, prefetch_bytes=DEFAULT_MAX_BYTES):
+        if not 1 <= workers <= MAX_WORKERS:
+            raise ValueError(f"workers must be between 1 and {MAX_WORKERS}")
+        self.video_directory = video_directory
+        self.port = port
+        self.worker_count = workers
+        self.session_timeout = session_timeout
+        self.fps = fps
+        self.ring_slots = ring_slots
+        self.prefetch_frames = prefetch_frames
+        self.prefetch_bytes = prefetch_bytes
+
+        self.catalog_name = f"mjc{port}_{os.getpid()}"
+        self.requests = multiprocessing.Queue()  # ('open', video) from the workers
+        self.processes = {}
+        self.rings = {}        # video -> FrameRing
+        self.schedule = []     # Heap of (next frame time, video) for the pacing clock
+        self.streams = {}      # video -> FramePrefetcher
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+
+    def start_worker(self, worker_id):
+        process = multiprocessing.Process(
+            target=worker_main, name=f"rtsp-worker-{worker_id}", daemon=True,
+            args=(worker_id, self.video_directory, self.port, self.session_timeout,
+                  self.catalog_name, self.requests))
+        process.start()
+        self.processes[worker_id] = process
+
+    def run(self):
+        """Start the workers, then publish the catalog and pace the rings until Ctrl+C"""
+        self.shared_catalog = SharedCatalog.create(self.catalog_name)
+        # Fork before any thread of ours exists
+        for worker_id in range(self.worker_count):
+            self.start_worker(worker_id)
+
+        self.catalog = VideoCatalog(self.video_directory, fps=self.fps) if self.fps \
+            else VideoCatalog(self.video_directory)
+        self.catalog.start()
+        self.shared_catalog.publish(self.catalog)
+        # Shut down (and unlink the shared memory) on kill as well as Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        threading.Thread(target=self.publish_loop, daemon=True).start()
+        threading.Thread(target=self.pace_loop, daemon=True).start()
+
+        print("=" * 60)
+        print(f"Multi-Video RTSP Server (pre-fork)")
+        print(f"Port: {self.port}, {self.worker_count} workers, coordinator pid {os.getpid()}")
+        print(f"Video Directory: {self.video_directory} ({len(self.catalog)} videos)")
+        print("=" * 60)
+
+        try:
+            while True:
+                try:
+                    message, video = self.requests.get(timeout=1.0)
+                except queue.Empty:
+                    self.check_workers()
+                    continue
+                if message == 'open':
+                    self.open_ring(video)
+        except KeyboardInterrupt:
+            print("\nShutting down server...")
+        finally:
+            self.shutdown()
+
+    def check_workers(self):
+        """Replace workers that died, dropping their reader flags so idle videos stop pacing"""
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            print(f"Worker {worker_id} exited with {process.exitcode}, restarting")
+            with self.lock:
+                for ring in self.rings.values():
+                    ring.set_reader(worker_id, False)
+            self.start_worker(worker_id)
+
+    def publish_loop(self):
+        version = self.catalog.version
+        while not self.stop_event.wait(0.5):
+            if self.catalog.version != version:
+                version = self.catalog.version
+                self.shared_catalog.publish(self.catalog)
+
+    def open_ring(self, video):
+        """Create a video's ring and put it on the pacing clock (once, whichever worker asks first)"""
+        with self.lock:
+            if video in self.rings:
+                return
+        entry = self.catalog.get(video)
+        if not entry:
+            return
+        try:
+            slot_size = self.catalog.max_frame_size(video) or DEFAULT_SLOT_SIZE
+            stream = FramePrefetcher(entry['path'], self.prefetch_frames, self.prefetch_bytes).start()
+        except (IOError, OSError) as e:
+            print(f"Cannot serve {video}: {e}")
+            return
+
+        ring = FrameRing.create(ring_name(self.port, video), self.ring_slots, slot_size, 1.0 / entry['fps'])
+        with self.lock:
+            self.rings[video] = ring
+            self.streams[video] = stream
+            heapq.heappush(self.schedule, (time.monotonic(), video))
+        self.wakeup.set()
+        print(f"Ring for {video}: {self.ring_slots} x {slot_size} bytes")
+
+    def pace_loop(self):
+        """The pacing clock: one thread writes the next frame of every video when it is due"""
+        while not self.stop_event.is_set():
+            with self.lock:
+                due = self.schedule[0][0] if self.schedule else None
+            if due is None or due > time.monotonic():
+                self.wakeup.wait(0.05 if due is None else min(0.05, due - time.monotonic()))
+                self.wakeup.clear()
+                continue
+
+            with self.lock:
+                due, video = heapq.heappop(self.schedule)
+                ring = self.rings[video]
+                stream = self.streams[video]
+            now = time.monotonic()
+            if ring.has_readers():
+                # Never waits: with nothing read ahead the frame is skipped (an underrun)
+                frame = stream.nextFrame()
+                if frame:
+                    ring.write(frame)
+                # Keep the cadence, but never try to catch up on a backlog
+                next_due = max(due + ring.frame_delay, now)
+            else:
+                # Nobody is watching: keep the file position and check again shortly
+                next_due = now + 0.05
+            with self.lock:
+                heapq.heappush(self.schedule, (next_due, video))
+
+    def shutdown(self):
+        self.stop_event.set()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=2)
+        self.catalog.stop()
+        with self.lock:
+            for ring in self.rings.values():
+                ring.close()
+            for video, stream in self.streams.items():
+                stats = stream.stats()
+                if stats['underruns']:
+                    print(f"{video}: {stats['underruns']} prefetch underruns, slowest read {stats['max_read_ms']} ms")
+                stream.close()
+            self.rings = {}
+        self.shared_catalog.close()
+
+
+def attach_ring(name, timeout=ATTACH_TIMEOUT):
+    # The coordinator creates the ring when it handles our 'open' request
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return FrameRing.attach(name)
+        except (FileNotFoundError, ValueError):
+            if time.monotonic() > deadline:
+                raise IOError(f"Frame ring {name} was not created")
+            time.sleep(0.01)
+
+
+def worker_main(worker_id, video_directory, port, session_timeout, catalog_name, requests):
+    """Entry point of a worker process: a normal server on a shared port, fed from the rings"""
+    from main2 import MultiVideoRTSPServer
+
+    catalog = SharedCatalog.attach(catalog_name)
+    pump = RingPump()
+
+    def make_broadcaster(video, entry):
+        requests.put(('open', video))
+        return pump.add(RingBroadcaster(attach_ring(ring_name(port, video)), worker_id))
+
+    server = MultiVideoRTSPServer(video_directory, port, session_timeout, catalog=catalog,
+                                  broadcaster_factory=make_broadcaster, worker_id=worker_id)
+    server.start_server()
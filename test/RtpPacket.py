@@ -1,73 +1,305 @@
 #!/usr/bin/env python3
 
 import sys
+import struct
 from time import time
 
 HEADER_SIZE = 12
+RTP_HEADER = struct.Struct('!BBHII')     # V/P/X/CC, marker/PT, sequence, timestamp, SSRC
+EXTENSION_HEADER = struct.Struct('!HH')  # Profile, length in 32-bit words
+CSRC_LISTS = [struct.Struct(f'!{count}I') for count in range(16)]
+UINT16 = struct.Struct('!H')
+UINT32 = struct.Struct('!I')
+
+# RFC 8285 one-byte header extension carrying the send time as a 64-bit NTP
+# timestamp (RFC 6051's urn:ietf:params:rtp-hdrext:ntp-64, id 1 in the SDP)
+ONE_BYTE_PROFILE = 0xBEDE
+SEND_TIME_ID = 1
+SEND_TIME_URI = 'urn:ietf:params:rtp-hdrext:ntp-64'
+SEND_TIME_ELEMENT = struct.Struct('!BQ3x')          # ID/length byte, NTP time, padding to 32 bits
+SEND_TIME_EXTENSION = struct.Struct('!HHBQ3x')      # The same with the extension header, for header patching
+NTP_EPOCH_OFFSET = 2208988800                       # Seconds from 1900 (NTP) to 1970 (Unix)
+
 
 class RtpPacket:
+    """RTP packet (RFC 3550) with CSRCs, a header extension and padding.
+
+    encode() packs the header with one struct call into a buffer the packet
+    keeps, so an object can be reused for every packet of a session. decode()
+    takes a memoryview of the datagram and slices it; the header and payload
+    are views into the received bytes, nothing is copied.
+    """
+
+    __slots__ = ('header', 'payload', 'csrcs', 'extension', 'padding')
+
     def __init__(self):
         self.header = bytearray(HEADER_SIZE)
         self.payload = b''
+        self.csrcs = ()
+        self.extension = None  # (profile, data) when the X bit is set
+        self.padding = b''     # Trailing padding, its last byte is its length
+
+    def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload,
+               timestamp=None, csrcs=(), extension_profile=0, extension_data=b'', padding_size=0):
+        """Encode the RTP packet with header fields and payload.
+
+        The P, X and CC bits follow the padding, extension and CSRCs actually
+        given; the flag arguments are kept for existing callers. Extension
+        data must be a whole number of 32-bit words.
+        """
+        if timestamp is None:
+            timestamp = int(time())
+        if not (csrcs or extension_data or padding_size):
+            # Plain 12-byte header: the common case
+            if len(self.header) != HEADER_SIZE:
+                self.header = bytearray(HEADER_SIZE)
+            RTP_HEADER.pack_into(self.header, 0, version << 6, (marker << 7) | pt, seqnum & 0xFFFF,
+                                 timestamp & 0xFFFFFFFF, ssrc)
+            self.csrcs = ()
+            self.extension = None
+            self.padding = b''
+            self.payload = payload
+            return
+
+        cc = len(csrcs)
+        size = HEADER_SIZE + 4 * cc
+        if extension_data:
+            if len(extension_data) % 4:
+                raise ValueError("RTP header extension must be a multiple of 4 bytes")
+            size += EXTENSION_HEADER.size + len(extension_data)
+        if len(self.header) != size:
+            self.header = bytearray(size)
+
+        first = (version << 6) | cc
+        if padding_size:
+            first |= 0x20
+            self.padding = bytes(padding_size - 1) + bytes((padding_size,))
+        else:
+            self.padding = b''
+        if extension_data:
+            first |= 0x10
+        RTP_HEADER.pack_into(self.header, 0, first, (marker << 7) | pt, seqnum & 0xFFFF,
+                             timestamp & 0xFFFFFFFF, ssrc)
+
+        offset = HEADER_SIZE
+        if cc:
+            CSRC_LISTS[cc].pack_into(self.header, offset, *csrcs)
+            offset += 4 * cc
+        self.csrcs = tuple(csrcs)
+        if extension_data:
+            EXTENSION_HEADER.pack_into(self.header, offset, extension_profile, len(extension_data) // 4)
+            offset += EXTENSION_HEADER.size
+            self.header[offset:] = extension_data
+            self.extension = (extension_profile, extension_data)
+        else:
+            self.extension = None
 
-    def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload):
-        """Encode the RTP packet with header fields and payload"""
-        timestamp = int(time())
-        
-        # Fill RTP header
-        self.header[0] = (version << 6) | (padding << 5) | (extension << 4) | cc
-        self.header[1] = (marker << 7) | pt
-
-        # Sequence number (16 bits)
-        self.header[2] = (seqnum >> 8) & 0xFF
-        self.header[3] = seqnum & 0xFF
-
-        # Timestamp (32 bits)
-        self.header[4] = (timestamp >> 24) & 0xFF
-        self.header[5] = (timestamp >> 16) & 0xFF
-        self.header[6] = (timestamp >> 8) & 0xFF
-        self.header[7] = timestamp & 0xFF
-
-        # SSRC (32 bits)
-        self.header[8] = (ssrc >> 24) & 0xFF
-        self.header[9] = (ssrc >> 16) & 0xFF
-        self.header[10] = (ssrc >> 8) & 0xFF
-        self.header[11] = ssrc & 0xFF
-
-        # Store payload
         self.payload = payload
 
     def decode(self, byteStream):
-        """Decode the RTP packet"""
-        if len(byteStream) < HEADER_SIZE:
+        """Decode the RTP packet, without copying the datagram"""
+        view = memoryview(byteStream)
+        end = len(view)
+        if end < HEADER_SIZE:
             raise ValueError("Byte stream too short for RTP header")
-        
-        self.header = bytearray(byteStream[:HEADER_SIZE])
-        self.payload = byteStream[HEADER_SIZE:]
+
+        first = view[0]
+        if not first & 0x3F:
+            # No padding, extension or CSRCs: the common case
+            self.header = view[:HEADER_SIZE]
+            self.payload = view[HEADER_SIZE:]
+            self.csrcs = ()
+            self.extension = None
+            self.padding = b''
+            return
+
+        offset = HEADER_SIZE
+        cc = first & 0x0F
+        if cc:
+            if offset + 4 * cc > end:
+                raise ValueError("Byte stream too short for RTP CSRC list")
+            self.csrcs = CSRC_LISTS[cc].unpack_from(view, offset)
+            offset += 4 * cc
+        else:
+            self.csrcs = ()
+        if first & 0x10:
+            if offset + EXTENSION_HEADER.size > end:
+                raise ValueError("Byte stream too short for RTP header extension")
+            profile, words = EXTENSION_HEADER.unpack_from(view, offset)
+            start = offset + EXTENSION_HEADER.size
+            offset = start + 4 * words
+            if offset > end:
+                raise ValueError("RTP header extension runs past the packet")
+            self.extension = (profile, view[start:offset])
+        else:
+            self.extension = None
+        if first & 0x20:
+            padding_size = view[end - 1]
+            if not padding_size or offset + padding_size > end:
+                raise ValueError("Invalid RTP padding length")
+            end -= padding_size
+            self.padding = view[end:]
+        else:
+            self.padding = b''
+
+        self.header = view[:offset]
+        self.payload = view[offset:end]
+
+    def size(self):
+        """Encoded length in bytes"""
+        return len(self.header) + len(self.payload) + len(self.padding)
+
+    def pack_into(self, buffer, offset=0):
+        """Write the whole encoded packet into buffer at offset, returns its length"""
+        view = memoryview(buffer)
+        for part in (self.header, self.payload, self.padding):
+            view[offset:offset + len(part)] = part
+            offset += len(part)
+        return self.size()
+
+    def buffers(self):
+        """The packet as a list of buffers for socket.sendmsg, nothing is concatenated"""
+        if self.padding:
+            return [self.header, self.payload, self.padding]
+        return [self.header, self.payload]
 
     def version(self):
         """Return RTP version"""
-        return (self.header[0] >> 6) & 0x3
+        return self.header[0] >> 6
 
     def seqNum(self):
         """Return sequence (frame) number"""
-        return (self.header[2] << 8) | self.header[3]
+        return UINT16.unpack_from(self.header, 2)[0]
 
     def timestamp(self):
         """Return timestamp"""
-        return (self.header[4] << 24) | (self.header[5] << 16) | (self.header[6] << 8) | self.header[7]
+        return UINT32.unpack_from(self.header, 4)[0]
+
+    def ssrc(self):
+        """Return synchronization source"""
+        return UINT32.unpack_from(self.header, 8)[0]
+
+    def marker(self):
+        """Return marker bit"""
+        return self.header[1] >> 7
 
     def payloadType(self):
         """Return payload type"""
         return self.header[1] & 0x7F
 
     def getPayload(self):
-        """Return payload"""
+        """Return payload (a memoryview into the datagram after decode)"""
         return self.payload
 
     def getPacket(self):
         """Return RTP packet"""
-        return self.header + self.payload
+        return bytes(self.header) + self.payload + self.padding
+
+    def headerExtensions(self):
+        """RFC 8285 one-byte extension elements as {id: data}, {} for none or another profile"""
+        if not self.extension or self.extension[0] != ONE_BYTE_PROFILE:
+            return {}
+        return parse_one_byte_extension(self.extension[1])
+
+    def sendTime(self):
+        """Unix time the sender stamped in the send-time extension, None if absent"""
+        if not self.extension or self.extension[0] != ONE_BYTE_PROFILE:
+            return None
+        data = self.extension[1]
+        if len(data) >= 9 and data[0] == (SEND_TIME_ID << 4) | 7:
+            # The sender's own layout: the send time is the first element
+            return from_ntp64(data[1:9])
+        element = parse_one_byte_extension(data).get(SEND_TIME_ID)
+        return from_ntp64(element) if element is not None and len(element) == 8 else None
+
+
+def one_byte_extension(elements):
+    """Extension data for encode(extension_profile=ONE_BYTE_PROFILE) from [(id, data)], padded to 32 bits"""
+    data = bytearray()
+    for element_id, value in elements:
+        if not 1 <= element_id <= 14 or not 1 <= len(value) <= 16:
+            raise ValueError("One-byte extension elements need an id of 1-14 and 1-16 bytes of data")
+        data.append((element_id << 4) | (len(value) - 1))
+        data += value
+    data += bytes(-len(data) % 4)
+    return bytes(data)
+
+
+def parse_one_byte_extension(data):
+    """{id: data} of RFC 8285 one-byte elements, padding skipped, stops at id 15"""
+    elements = {}
+    offset = 0
+    while offset < len(data):
+        byte = data[offset]
+        if byte == 0:
+            offset += 1  # Padding
+            continue
+        element_id, length = byte >> 4, (byte & 0x0F) + 1
+        if element_id == 15 or offset + 1 + length > len(data):
+            break
+        elements[element_id] = data[offset + 1:offset + 1 + length]
+        offset += 1 + length
+    return elements
+
+
+def to_ntp64(unix_time):
+    """64-bit NTP timestamp (32.32 fixed point seconds since 1900) of a Unix time"""
+    return int((unix_time + NTP_EPOCH_OFFSET) * (1 << 32)) & 0xFFFFFFFFFFFFFFFF
+
+
+def from_ntp64(data):
+    """Unix time from the 8 bytes of a 64-bit NTP timestamp"""
+    return struct.unpack('!Q', data)[0] / (1 << 32) - NTP_EPOCH_OFFSET
+
+
+def send_time_extension(unix_time):
+    """Extension data holding just the send time, for encode(extension_profile=ONE_BYTE_PROFILE)"""
+    return SEND_TIME_ELEMENT.pack((SEND_TIME_ID << 4) | 7, to_ntp64(unix_time))
+
+
+def encode_batch(payloads, seqnum, timestamp, ssrc, pt, marker=0, buffer=None):
+    """Encode consecutive packets of one source back to back into one buffer.
+
+    The header is packed once and copied; only the sequence number changes
+    per packet. Returns (buffer, memoryviews of each packet); pass the
+    buffer back in to reuse it.
+    """
+    total = HEADER_SIZE * len(payloads) + sum(len(payload) for payload in payloads)
+    if buffer is None or len(buffer) < total:
+        buffer = bytearray(total)
+    view = memoryview(buffer)
+    template = RTP_HEADER.pack(0x80, (marker << 7) | pt, 0, timestamp & 0xFFFFFFFF, ssrc)
+    packets = []
+    offset = 0
+    for payload in payloads:
+        end = offset + HEADER_SIZE + len(payload)
+        view[offset:offset + HEADER_SIZE] = template
+        UINT16.pack_into(view, offset + 2, seqnum & 0xFFFF)
+        view[offset + HEADER_SIZE:end] = payload
+        packets.append(view[offset:end])
+        seqnum += 1
+        offset = end
+    return buffer, packets
+
+
+def decode_batch(datagrams, packets=None):
+    """Decode many datagrams, reusing the RtpPacket objects in packets if given.
+
+    Datagrams that are not valid RTP are skipped. Returns the decoded packets.
+    """
+    if packets is None:
+        packets = []
+    while len(packets) < len(datagrams):
+        packets.append(RtpPacket())
+    decoded = []
+    for datagram, packet in zip(datagrams, packets):
+        try:
+            packet.decode(datagram)
+        except ValueError:
+            continue
+        decoded.append(packet)
+    return decoded
+
 
 # Test the class if run directly
 if __name__ == "__main__":
@@ -75,10 +307,30 @@ if __name__ == "__main__":
     rtp = RtpPacket()
     test_payload = b"test data"
     rtp.encode(2, 0, 0, 0, 12345, 0, 26, 0, test_payload)
-    
+
     packet = rtp.getPacket()
     print(f"Created packet of {len(packet)} bytes")
     print(f"Version: {rtp.version()}")
     print(f"Sequence: {rtp.seqNum()}")
     print(f"Payload type: {rtp.payloadType()}")
-    print("✓ RtpPacket test successful")
\ No newline at end of file
+
+    rtp.encode(2, 0, 0, 0, 7, 1, 26, 0xCAFE, test_payload, timestamp=90000,
+               csrcs=(1, 2), extension_profile=0xBEDE, extension_data=b'\x10\xff\x00\x00', padding_size=3)
+    decoded = RtpPacket()
+    decoded.decode(rtp.getPacket())
+    assert (decoded.seqNum(), decoded.marker(), decoded.timestamp(), decoded.ssrc()) == (7, 1, 90000, 0xCAFE)
+    assert decoded.csrcs == (1, 2) and decoded.extension[0] == 0xBEDE
+    assert bytes(decoded.getPayload()) == test_payload
+    print(f"CSRCs, extension and padding: {len(rtp.getPacket())} bytes round-tripped")
+
+    sent = time()
+    rtp.encode(2, 0, 0, 0, 8, 0, 26, 0xCAFE, test_payload, timestamp=90000,
+               extension_profile=ONE_BYTE_PROFILE, extension_data=send_time_extension(sent))
+    decoded.decode(rtp.getPacket())
+    assert abs(decoded.sendTime() - sent) < 1e-6 and bytes(decoded.getPayload()) == test_payload
+    data = one_byte_extension([(3, b'\x01\x02'), (SEND_TIME_ID, to_ntp64(sent).to_bytes(8, 'big'))])
+    rtp.encode(2, 0, 0, 0, 9, 0, 26, 0xCAFE, test_payload, extension_profile=ONE_BYTE_PROFILE, extension_data=data)
+    decoded.decode(rtp.getPacket())
+    assert bytes(decoded.headerExtensions()[3]) == b'\x01\x02' and abs(decoded.sendTime() - sent) < 1e-6
+    print(f"RFC 8285 send time: {len(rtp.getPacket())} bytes round-tripped")
+    print("✓ RtpPacket test successful")
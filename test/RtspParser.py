@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+import re
+from urllib.parse import urlsplit, unquote
+
+RTSP_VERSION = 'RTSP/1.0'
+MAX_HEADER_BYTES = 8192
+MAX_BODY_BYTES = 65536
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    413: 'Request Entity Too Large',
+    431: 'Request Header Fields Too Large',
+    454: 'Session Not Found',
+    455: 'Method Not Valid in This State',
+    461: 'Unsupported Transport',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    505: 'RTSP Version Not Supported',
+}
+
+METHOD_RE = re.compile(r'^[A-Z][A-Z_]*$')
+VERSION_RE = re.compile(r'^RTSP/1\.\d$')
+TRACK_RE = re.compile(r'/(trackID|streamid)=\d+$', re.IGNORECASE)
+PROTOCOL_RE = re.compile(rb'^[A-Z]+/\d')
+
+
+class RtspParseError(Exception):
+    """Malformed request; status is the RTSP code to reply with before closing"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RtspRequest:
+    """One parsed request: method, uri, version, lower-case header dict and body"""
+
+    def __init__(self, method, uri, version=RTSP_VERSION, headers=None, body=b'', legacy=False):
+        self.method = method
+        self.uri = uri
+        self.version = version
+        self.headers = headers or {}
+        self.body = body
+        self.legacy = legacy  # Old newline format: "SETUP movie.Mjpeg\n1\n RTSP/1.0 RTP/UDP 25000"
+
+    def get(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def cseq(self):
+        return self.headers.get('cseq', '0')
+
+    @property
+    def session(self):
+        """Session id without the ;timeout= parameter, or None"""
+        value = self.headers.get('session')
+        return value.split(';', 1)[0].strip() if value else None
+
+    def transport(self):
+        """Transport header as a dict, e.g. {'profile': 'RTP/AVP', 'unicast': True, 'client_port': (5000, 5001)}"""
+        value = self.headers.get('transport', '')
+        # Several comma-separated options are allowed, take the first
+        parts = value.split(',', 1)[0].split(';')
+        transport = {'profile': parts[0].strip().upper()}
+        for part in parts[1:]:
+            key, _, val = part.strip().partition('=')
+            if not key:
+                continue
+            if key in ('client_port', 'server_port', 'interleaved', 'port'):
+                low, _, high = val.partition('-')
+                try:
+                    transport[key] = (int(low), int(high or int(low) + 1))
+                except ValueError:
+                    raise RtspParseError(461, f"Bad {key} in Transport: {val}")
+            else:
+                transport[key] = val or True
+        return transport
+
+    def resource(self):
+        """Resource name from the URI: rtsp://host:port/movie.Mjpeg/trackID=0 -> movie.Mjpeg"""
+        uri = self.uri
+        if uri == '*':
+            return None
+        if '://' in uri:
+            try:
+                uri = urlsplit(uri).path
+            except ValueError:
+                raise RtspParseError(400, f"Bad URI: {uri!r}")
+        uri = TRACK_RE.sub('', uri.split('?', 1)[0]).strip('/')
+        return unquote(uri) or None
+
+    def __repr__(self):
+        return f"RtspRequest({self.method} {self.uri}, CSeq {self.cseq})"
+
+
+class RtspParser:
+    """Incremental RTSP request parser for one connection.
+
+    feed() takes whatever recv() returned and gives back every request that is
+    now complete, so pipelined and fragmented requests both work. Requests are
+    framed by an empty line (CRLF, or bare LF from sloppy clients) plus a
+    Content-Length body. Interleaved binary frames ('$' + channel + length)
+    from TCP clients are skipped.
+
+    Messages from the original newline-only protocol, which have no request
+    version and no terminating empty line, are taken as whatever arrived.
+    """
+
+    def __init__(self, max_header_bytes=MAX_HEADER_BYTES, max_body_bytes=MAX_BODY_BYTES):
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        self.buffer = bytearray()
+        self.pending = None   # Request waiting for its body
+        self.pending_length = 0
+
+    def feed(self, data):
+        """Add received bytes, return the list of completed RtspRequests"""
+        self.buffer += data
+        requests = []
+        while True:
+            request = self._next()
+            if request is None:
+                return requests
+            requests.append(request)
+
+    def _next(self):
+        buffer = self.buffer
+
+        if self.pending:
+            if len(buffer) < self.pending_length:
+                return None
+            request, self.pending = self.pending, None
+            request.body = bytes(buffer[:self.pending_length])
+            del buffer[:self.pending_length]
+            return request
+
+        # Empty lines between messages are allowed
+        start = 0
+        while start < len(buffer) and buffer[start] in (0x0d, 0x0a):
+            start += 1
+        if start:
+            del buffer[:start]
+        if not buffer:
+            return None
+
+        # Interleaved RTP/RTCP frame: '$', channel, 16-bit length
+        if buffer[0] == 0x24:
+            if len(buffer) < 4:
+                return None
+            size = 4 + ((buffer[2] << 8) | buffer[3])
+            if len(buffer) < size:
+                return None
+            del buffer[:size]
+            return self._next()
+
+        line_end = buffer.find(b'\n')
+        if line_end < 0:
+            if len(buffer) > self.max_header_bytes:
+                raise RtspParseError(431, "Request line too large")
+            return None
+        if not self._is_request_line(buffer[:line_end]):
+            return self._legacy()
+
+        end, separator = self._header_end(buffer)
+        if end < 0:
+            if len(buffer) > self.max_header_bytes:
+                raise RtspParseError(431, "Request header too large")
+            return None
+        if end > self.max_header_bytes:
+            raise RtspParseError(431, "Request header too large")
+
+        head = bytes(buffer[:end])
+        del buffer[:end + separator]
+        request = self._parse_head(head)
+
+        length = request.get('content-length')
+        if length is None:
+            return request
+        if not length.isdigit():
+            raise RtspParseError(400, f"Bad Content-Length: {length}")
+        length = int(length)
+        if length > self.max_body_bytes:
+            raise RtspParseError(413, f"Body of {length} bytes is too large")
+        if length:
+            self.pending, self.pending_length = request, length
+            return self._next()
+        return request
+
+    def _header_end(self, buffer):
+        # Earliest of CRLFCRLF / LFLF, with the separator length
+        crlf = buffer.find(b'\r\n\r\n')
+        lf = buffer.find(b'\n\n')
+        if crlf >= 0 and (lf < 0 or crlf <= lf):
+            return crlf, 4
+        if lf >= 0:
+            return lf, 2
+        return -1, 0
+
+    def _is_request_line(self, line):
+        parts = bytes(line).rstrip(b'\r').split(b' ')
+        # Any PROTOCOL/x version marks a real request line (HTTP/1.1 then gets a 505)
+        return len(parts) == 3 and PROTOCOL_RE.match(parts[2]) is not None
+
+    def _parse_head(self, head):
+        try:
+            text = head.decode('utf-8')
+        except UnicodeDecodeError:
+            raise RtspParseError(400, "Request header is not UTF-8")
+
+        lines = text.replace('\r\n', '\n').split('\n')
+        parts = lines[0].split(' ')
+        if len(parts) != 3 or not parts[1]:
+            raise RtspParseError(400, f"Bad request line: {lines[0]!r}")
+        method, uri, version = parts
+        if not METHOD_RE.match(method):
+            raise RtspParseError(400, f"Bad method: {method!r}")
+        if not VERSION_RE.match(version):
+            raise RtspParseError(505, f"Unsupported version: {version!r}")
+
+        headers = {}
+        last = None
+        for line in lines[1:]:
+            if line[:1] in (' ', '\t'):
+                # Obsolete header folding, continues the previous header
+                if last is None:
+                    raise RtspParseError(400, "Continuation line before any header")
+                headers[last] += ' ' + line.strip()
+                continue
+            name, colon, value = line.partition(':')
+            name = name.strip().lower()
+            if not colon or not name or ' ' in name:
+                raise RtspParseError(400, f"Bad header line: {line!r}")
+            value = value.strip()
+            headers[name] = f"{headers[name]}, {value}" if name in headers else value
+            last = name
+        return RtspRequest(method, uri, version, headers)
+
+    def _legacy(self):
+        # "SETUP movie.Mjpeg\n1\n RTSP/1.0 RTP/UDP 25000": request line, bare CSeq, optional transport line
+        try:
+            text = bytes(self.buffer).decode('utf-8')
+        except UnicodeDecodeError:
+            raise RtspParseError(400, "Request is not UTF-8")
+        self.buffer.clear()
+
+        lines = text.split('\n')
+        parts = lines[0].split()
+        if not parts or not METHOD_RE.match(parts[0]):
+            raise RtspParseError(400, f"Bad request line: {lines[0]!r}")
+
+        headers = {}
+        if len(lines) > 1 and lines[1].strip().isdigit():
+            headers['cseq'] = lines[1].strip()
+        for line in lines[2:]:
+            if 'RTP/UDP' in line:
+                ports = [int(word) for word in line.split() if word.isdigit()]
+                if ports:
+                    headers['transport'] = f"RTP/AVP;unicast;client_port={ports[0]}-{ports[0] + 1}"
+        uri = parts[1] if len(parts) > 1 else '*'
+        return RtspRequest(parts[0], uri, RTSP_VERSION, headers, legacy=True)
+
+
+def format_response(status, cseq, headers=None, body=b''):
+    """Serialize a response with CRLF framing; CSeq first, then headers, then Content-Length"""
+    lines = [f"{RTSP_VERSION} {status} {REASONS.get(status, 'Unknown')}", f"CSeq: {cseq}"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    if body:
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+def build_sdp(session_id, server_ip, name, fps, duration=None, payload_type=26, extensions=()):
+    """SDP for one MJPEG video track (RFC 2435 payload type 26, 90 kHz clock).
+
+    extensions lists the RTP header extensions sent, as (id, URI) pairs (RFC 8285 extmap).
+    """
+    lines = [
+        'v=0',
+        f'o=- {session_id} 1 IN IP4 {server_ip}',
+        f's={name}',
+        'c=IN IP4 0.0.0.0',
+        't=0 0',
+        'a=control:*',
+    ]
+    if duration:
+        lines.append(f'a=range:npt=0-{duration}')
+    lines += [
+        f'm=video 0 RTP/AVP {payload_type}',
+        f'a=rtpmap:{payload_type} JPEG/90000',
+        f'a=framerate:{fps}',
+    ]
+    lines += [f'a=extmap:{extension_id} {uri}' for extension_id, uri in extensions]
+    lines.append('a=control:trackID=0')
+    return ("\r\n".join(lines) + "\r\n").encode()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import json
+import struct
+from multiprocessing import shared_memory
+
+CATALOG_MAGIC = b'MJCT'
+CATALOG_HEADER = struct.Struct('<4sIQQ')  # magic, padding, version (odd while being written), body length
+VERSION_OFFSET = 8
+COUNTER = struct.Struct('<Q')
+
+
+class SharedCatalog:
+    """Read-only copy of a VideoCatalog for worker processes.
+
+    The coordinator publishes the entries as JSON into shared memory with a
+    version number that is odd while it writes. Workers re-read the body only
+    when the version changed, so a lookup costs one 8-byte read. Same lookup
+    interface as VideoCatalog.
+    """
+
+    watch_mode = 'shared'
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.entries = {}
+        self._names = []
+        self._list_body = b''
+        self._version = 0
+
+    @classmethod
+    def create(cls, name, capacity=8 * 1024 * 1024):
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=CATALOG_HEADER.size + capacity)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=CATALOG_HEADER.size + capacity)
+        CATALOG_HEADER.pack_into(shm.buf, 0, CATALOG_MAGIC, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    # Coordinator side
+
+    def publish(self, catalog):
+        """Write the current entries of a VideoCatalog, dropping entries that do not fit"""
+        entries = {name: catalog.get(name) for name in catalog.names()}
+        entries = {name: entry for name, entry in entries.items() if entry}
+        body = json.dumps(entries).encode('utf-8')
+        capacity = self.shm.size - CATALOG_HEADER.size
+        while len(body) > capacity and entries:
+            keep = max(1, len(entries) * capacity // len(body) - 1)
+            entries = dict(list(entries.items())[:keep])
+            body = json.dumps(entries).encode('utf-8')
+            print(f"Catalog too large for shared memory, publishing {len(entries)} videos")
+
+        buf = self.shm.buf
+        version = COUNTER.unpack_from(buf, VERSION_OFFSET)[0]
+        COUNTER.pack_into(buf, VERSION_OFFSET, version + 1)
+        buf[CATALOG_HEADER.size:CATALOG_HEADER.size + len(body)] = body
+        CATALOG_HEADER.pack_into(buf, 0, CATALOG_MAGIC, 0, version + 1, len(body))
+        COUNTER.pack_into(buf, VERSION_OFFSET, version + 2)
+
+    # Worker side
+
+    def _refresh(self):
+        buf = self.shm.buf
+        version = COUNTER.unpack_from(buf, VERSION_OFFSET)[0]
+        if version == self._version or version % 2:
+            return
+        _, _, _, length = CATALOG_HEADER.unpack_from(buf, 0)
+        body = bytes(buf[CATALOG_HEADER.size:CATALOG_HEADER.size + length])
+        if COUNTER.unpack_from(buf, VERSION_OFFSET)[0] != version:
+            return  # Republished while we copied, pick it up next time
+        try:
+            entries = json.loads(body)
+        except ValueError:
+            return
+        self.entries = entries
+        self._names = sorted(entries)
+        self._list_body = "\n".join(self._names).encode()
+        self._version = version
+
+    def get(self, name):
+        self._refresh()
+        return self.entries.get(name)
+
+    def __contains__(self, name):
+        self._refresh()
+        return name in self.entries
+
+    def __len__(self):
+        self._refresh()
+        return len(self.entries)
+
+    def first(self):
+        names = self.names()
+        return names[0] if names else None
+
+    def names(self):
+        self._refresh()
+        return self._names
+
+    def list_body(self):
+        self._refresh()
+        return self._list_body
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
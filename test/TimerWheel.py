@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import math
+import time
+import threading
+
+
+class TimerWheel:
+    """Idle timeouts for many keys, driven by one thread.
+
+    Keys sit in slots of a hashed wheel by deadline (tick granularity). touch()
+    only moves a key's deadline; when its slot comes round a key that was
+    touched in the meantime is put in a later slot instead of firing. So a
+    keepalive costs one dict lookup and the wheel does O(expiring) work per tick.
+    """
+
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.timers = {}  # key -> [deadline, timeout, callback, slot tick]
+        self.lock = threading.Lock()
+        self.current = self._tick_of(time.monotonic())  # Last tick processed
+        self.stop_event = threading.Event()
+        self.fired = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def _tick_of(self, when):
+        return math.ceil(when / self.tick)
+
+    def _place(self, key, timer):
+        # Never behind the wheel: a deadline in the past fires on the next tick
+        slot_tick = max(self._tick_of(timer[0]), self.current + 1)
+        timer[3] = slot_tick
+        self.slots[slot_tick % len(self.slots)].add(key)
+
+    def schedule(self, key, timeout, callback):
+        """Call callback(key) once key goes timeout seconds without a touch()"""
+        with self.lock:
+            old = self.timers.get(key)
+            if old:
+                self.slots[old[3] % len(self.slots)].discard(key)
+            timer = [time.monotonic() + timeout, timeout, callback, 0]
+            self.timers[key] = timer
+            self._place(key, timer)
+
+    def touch(self, key, timeout=None):
+        """Push a key's deadline out to now + timeout (its own timeout by default), False if unknown"""
+        with self.lock:
+            timer = self.timers.get(key)
+            if not timer:
+                return False
+            timer[0] = time.monotonic() + (timer[1] if timeout is None else timeout)
+            if self._tick_of(timer[0]) < timer[3]:
+                # Shortened (e.g. expire_now), move to the earlier slot
+                self.slots[timer[3] % len(self.slots)].discard(key)
+                self._place(key, timer)
+            return True
+
+    def expire_now(self, key):
+        """Fire a key on the next tick, from any thread (the callback never runs in the caller)"""
+        return self.touch(key, 0)
+
+    def cancel(self, key):
+        with self.lock:
+            timer = self.timers.pop(key, None)
+            if timer:
+                self.slots[timer[3] % len(self.slots)].discard(key)
+            return timer is not None
+
+    def __len__(self):
+        return len(self.timers)
+
+    def advance(self, now=None):
+        """Process every tick up to now, returns the keys that expired"""
+        expired = []
+        with self.lock:
+            target = self._tick_of(time.monotonic() if now is None else now) - 1
+            while self.current < target:
+                self.current += 1
+                slot = self.slots[self.current % len(self.slots)]
+                for key in list(slot):
+                    timer = self.timers[key]
+                    if timer[3] != self.current:
+                        continue  # A later round of the wheel
+                    slot.discard(key)
+                    if self._tick_of(timer[0]) <= self.current:
+                        del self.timers[key]
+                        expired.append((key, timer[2]))
+                    else:
+                        self._place(key, timer)
+
+        # Callbacks run outside the lock, they may schedule or cancel
+        for key, callback in expired:
+            self.fired += 1
+            try:
+                callback(key)
+            except Exception as e:
+                print(f"Timer callback for {key} failed: {e}")
+        return [key for key, _ in expired]
+
+    def run(self):
+        while not self.stop_event.wait(self.tick):
+            self.advance()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from FramePrefetcher import FramePrefetcher, DEFAULT_MAX_FRAMES, DEFAULT_MAX_BYTES
+
+JPEG_SOI = b'\xff\xd8'
+CACHE_RECHECK = 10.0  # Seconds before asking the packet cache again about a video it rejected
+
+
+def is_keyframe(frame):
+    """True if a frame can be decoded on its own (every complete MJPEG frame can)"""
+    return frame[:2] == JPEG_SOI
+
+
+class VideoBroadcaster:
+    """Reads one video at its frame rate and fans each frame out to all subscribers.
+
+    Frames since the last keyframe are kept in a GOP cache and replayed to a new
+    subscriber straight away, so it can start decoding without waiting for the
+    next keyframe (or, for MJPEG, the next frame tick). File frames come from
+    a FramePrefetcher, so the frame loop itself never reads the disk.
+    """
+
+    def __init__(self, video_path, frame_delay=0.04, max_cache_frames=300, packet_cache=None,
+                 prefetch_frames=DEFAULT_MAX_FRAMES, prefetch_bytes=DEFAULT_MAX_BYTES):
+        self.video_path = video_path
+        self.frame_delay = frame_delay
+        self.max_cache_frames = max_cache_frames
+        # Raises IOError if the file cannot be opened; its reader starts on the first file frame
+        self.video_stream = FramePrefetcher(video_path, prefetch_frames, prefetch_bytes)
+        self.packet_cache = packet_cache  # Optional PacketCache, frames then come from memory
+        self.packetized = None
+        self.packet_index = 0
+        self.cache_ready = None    # Event of a background packetization in progress
+        self.cache_checked = None  # When the cache was last asked, None = ask now
+        self.file_frames = 0       # Frames read from the file, where a cached copy picks up
+
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.gop_cache = []
+        self.has_subscribers = threading.Event()
+        self.stop_event = threading.Event()
+        self.frames_sent = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def subscribe(self, subscriber):
+        """Add a subscriber (anything with send_frame(frame, broadcaster)), replaying the GOP cache first"""
+        with self.lock:
+            # Replay under the lock so no live frame can slip in between
+            for frame in self.gop_cache:
+                subscriber.send_frame(frame, self)
+            self.subscribers.append(subscriber)
+            self.has_subscribers.set()
+            return len(self.gop_cache)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if not self.subscribers:
+                self.has_subscribers.clear()
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def run(self):
+        """Frame loop, paused (keeping the file position) while nobody is subscribed"""
+        while not self.stop_event.is_set():
+            if not self.has_subscribers.wait(0.5):
+                continue
+
+            # Send first, then sleep, so a freshly started broadcaster serves its first frame at once
+            frame = self.next_frame()
+            if not frame:
+                continue
+
+            with self.lock:
+                if is_keyframe(frame):
+                    self.gop_cache = [frame]
+                elif self.gop_cache and len(self.gop_cache) < self.max_cache_frames:
+                    self.gop_cache.append(frame)
+                subscribers = list(self.subscribers)
+
+            for subscriber in subscribers:
+                subscriber.send_frame(frame, self)
+            self.frames_sent += 1
+
+            if self.stop_event.wait(self.frame_delay):
+                break
+
+    def next_frame(self):
+        """Next frame, from the packet cache when the video is in it, the file otherwise.
+
+        The cache is asked again when the cached copy wraps (the file may have
+        changed or been evicted), when a background packetization finishes,
+        and every CACHE_RECHECK seconds for a video it rejected, never per frame.
+        """
+        if self.packet_cache:
+            if self.packetized is not None and self.packet_index >= len(self.packetized):
+                self.packetized = None
+                self.cache_checked = None
+            if self.packetized is None and self.cache_due():
+                self.packetized, self.cache_ready = self.packet_cache.lookup(self.video_path)
+                self.cache_checked = time.monotonic()
+                if self.packetized is not None:
+                    # Carry on from where the file reader was
+                    self.packet_index = self.file_frames % len(self.packetized)
+                    self.file_frames = 0
+            if self.packetized is not None:
+                frame = self.packetized.frame(self.packet_index)
+                self.packet_index += 1
+                return frame
+        # Wait at most one frame period for a late read, then skip the tick
+        frame = self.video_stream.nextFrame(self.frame_delay)
+        if frame:
+            self.file_frames += 1
+        return frame
+
+    def cache_due(self):
+        if self.cache_checked is None:
+            return True
+        if self.cache_ready is not None:
+            return self.cache_ready.is_set()
+        return time.monotonic() - self.cache_checked >= CACHE_RECHECK
+
+    def prefetch_stats(self):
+        """Read-ahead counters, None while every frame has come from the packet cache"""
+        if not self.video_stream.thread:
+            return None
+        return self.video_stream.stats()
+
+    def stop(self):
+        self.stop_event.set()
+        self.has_subscribers.set()
+        self.thread.join(timeout=1)
+        self.video_stream.close()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import array
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+import queue
+
+VIDEO_EXTENSIONS = ('.mjpeg',)
+DEFAULT_FPS = 25  # The MJPEG format has no timing, the server sends at this rate
+INDEX_DIR = '.index'
+INDEX_HEADER = struct.Struct('<4sQd')  # magic, file size, file mtime
+INDEX_MAGIC = b'MJIX'
+META_SUFFIX = '.json'  # .index/<name>.json, written by mjpeg_export.py with the video's real fps
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class VideoCatalog:
+    """Index of the videos in a directory, kept current with inotify (or polling).
+
+    Lookups go through a dict, and the LIST reply body is built once per
+    change instead of per request. Frame counts come from a per-file offset
+    index (.index/<name>.idx) written in the background and reused across
+    restarts while the file is unchanged. A video's frame rate comes from
+    its .index/<name>.json metadata when there is one, DEFAULT_FPS
+    otherwise; an explicit fps overrides both. On a read-only video
+    directory the indexes go to a cache directory outside it instead.
+    """
+
+    def __init__(self, video_directory, poll_interval=2.0, fps=None):
+        self.video_directory = video_directory
+        self.meta_directory = os.path.join(video_directory, INDEX_DIR)  # Export metadata, read only
+        self.index_directory = self.meta_directory  # Moved to a cache directory by start() if not writable
+        self.poll_interval = poll_interval
+        self.fps = fps
+
+        self.lock = threading.Lock()
+        self.entries = {}         # name -> metadata dict, replaced (never mutated) on change
+        self.version = 0
+        self._names = []          # Sorted names, rebuilt lazily
+        self._list_body = b''
+        self._built_version = -1
+
+        self.index_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.watch_mode = None
+
+    # Lookups
+
+    def get(self, name):
+        """Metadata for a video, or None"""
+        return self.entries.get(name)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def first(self):
+        """Some video to fall back on, or None"""
+        names = self.names()
+        return names[0] if names else None
+
+    def names(self):
+        """Sorted video names"""
+        self._rebuild()
+        return self._names
+
+    def list_body(self):
+        """Pre-encoded LIST reply body, one name per line"""
+        self._rebuild()
+        return self._list_body
+
+    def _rebuild(self):
+        if self._built_version == self.version:
+            return
+        with self.lock:
+            version = self.version
+            names = sorted(self.entries)
+        self._names = names
+        self._list_body = "\n".join(names).encode()
+        self._built_version = version
+
+    # Updates
+
+    def start(self):
+        """Scan once, then keep the catalog current in the background"""
+        self.index_directory = self._writable_index_directory()
+        self.rescan()
+        threading.Thread(target=self.index_worker, daemon=True).start()
+
+        inotify_fd = self._inotify_watch()
+        if inotify_fd is not None:
+            self.watch_mode = 'inotify'
+            threading.Thread(target=self.inotify_loop, args=(inotify_fd,), daemon=True).start()
+        else:
+            self.watch_mode = 'polling'
+            threading.Thread(target=self.poll_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _writable_index_directory(self):
+        # <video dir>/.index, or a per-directory cache outside a read-only media tree
+        key = hashlib.sha1(os.path.abspath(self.video_directory).encode()).hexdigest()[:16]
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        for directory in (self.meta_directory, os.path.join(cache_home, 'mjpeg-index', key),
+                          os.path.join(tempfile.gettempdir(), 'mjpeg-index', key)):
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError:
+                continue
+            if os.access(directory, os.W_OK):
+                if directory != self.meta_directory:
+                    print(f"{self.meta_directory} is not writable, frame indexes go to {directory}")
+                return directory
+        raise IOError(f"No writable directory for the frame indexes of {self.video_directory}")
+
+    def rescan(self):
+        """Full directory scan, only files whose size/mtime changed are re-indexed"""
+        seen = set()
+        with os.scandir(self.video_directory) as it:
+            for dir_entry in it:
+                if self.is_video(dir_entry.name) and dir_entry.is_file():
+                    seen.add(dir_entry.name)
+                    self.update_file(dir_entry.name, dir_entry.stat())
+        for name in set(self.entries) - seen:
+            self.remove_file(name)
+
+    def is_video(self, name):
+        return name.lower().endswith(VIDEO_EXTENSIONS) and not name.startswith('.')
+
+    def update_file(self, name, stat=None):
+        """Add or refresh one file"""
+        path = os.path.join(self.video_directory, name)
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            self.remove_file(name)
+            return
+
+        current = self.entries.get(name)
+        if current and current['size'] == stat.st_size and current['mtime'] == stat.st_mtime:
+            return
+
+        entry = {
+            'name': name,
+            'path': path,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'fps': self.fps or self.load_meta(name).get('fps') or DEFAULT_FPS,
+            'frames': None,      # Filled in by the indexer
+            'duration': None,
+            'index_path': os.path.join(self.index_directory, name + '.idx'),
+        }
+        with self.lock:
+            self.entries[name] = entry
+            self.version += 1
+        self.index_queue.put(name)
+
+    def remove_file(self, name):
+        with self.lock:
+            if self.entries.pop(name, None) is None:
+                return
+            self.version += 1
+        for path in (os.path.join(self.index_directory, name + '.idx'),
+                     os.path.join(self.meta_directory, name + META_SUFFIX)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def load_meta(self, name):
+        """Metadata written next to the index by the export, {} if there is none"""
+        try:
+            with open(os.path.join(self.meta_directory, name + META_SUFFIX)) as handle:
+                meta = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        return meta if isinstance(meta, dict) else {}
+
+    # Frame index
+
+    def index_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                name = self.index_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            entry = self.entries.get(name)
+            if not entry:
+                continue
+            try:
+                frames = self.load_index(entry)
+                if frames is None:
+                    frames = self.build_index(entry)
+            except OSError as e:
+                print(f"Could not index {name}: {e}")
+                continue
+
+            with self.lock:
+                # Skip if the file changed again while we were indexing
+                if self.entries.get(name) is entry:
+                    self.entries[name] = dict(entry, frames=frames, duration=round(frames / entry['fps'], 2))
+                    self.version += 1
+
+    def load_index(self, entry):
+        """Frame count from an up-to-date index file, or None"""
+        try:
+            with open(entry['index_path'], 'rb') as handle:
+                magic, size, mtime = INDEX_HEADER.unpack(handle.read(INDEX_HEADER.size))
+        except (OSError, struct.error):
+            return None
+        if magic != INDEX_MAGIC or size != entry['size'] or mtime != entry['mtime']:
+            return None
+        return (os.path.getsize(entry['index_path']) - INDEX_HEADER.size) // 8
+
+    def max_frame_size(self, name):
+        """Largest frame of a video in bytes (from its offset index, built now if missing), or None"""
+        entry = self.entries.get(name)
+        if not entry:
+            return None
+        if self.load_index(entry) is None:
+            self.build_index(entry)
+        offsets = array.array('Q')
+        with open(entry['index_path'], 'rb') as handle:
+            handle.seek(INDEX_HEADER.size)
+            offsets.frombytes(handle.read())
+        if not offsets:
+            return None
+        ends = list(offsets[1:]) + [entry['size']]
+        return max(end - start - 5 for start, end in zip(offsets, ends))
+
+    def build_index(self, entry):
+        """Walk the 5-byte length headers and store every frame offset"""
+        offsets = array.array('Q')
+        with open(entry['path'], 'rb') as handle:
+            offset = 0
+            while True:
+                header = handle.read(5)
+                if len(header) < 5:
+                    break
+                try:
+                    length = int(header)
+                except ValueError:
+                    break
+                if offset + 5 + length > entry['size']:
+                    break
+                offsets.append(offset)
+                offset += 5 + length
+                handle.seek(offset)
+
+        tmp = entry['index_path'] + '.tmp'
+        with open(tmp, 'wb') as handle:
+            handle.write(INDEX_HEADER.pack(INDEX_MAGIC, entry['size'], entry['mtime']))
+            offsets.tofile(handle)
+        os.replace(tmp, entry['index_path'])
+        return len(offsets)
+
+    # Watching
+
+    def _inotify_watch(self):
+        # inotify through libc, None when unavailable (not Linux, no libc, watch limit reached)
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init()
+            if fd < 0:
+                return None
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+            if libc.inotify_add_watch(fd, os.fsencode(self.video_directory), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def inotify_loop(self, fd):
+        try:
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], 1.0)
+                if not readable:
+                    continue
+                data = os.read(fd, 64 * 1024)
+                offset = 0
+                while offset < len(data):
+                    _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                    name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+                    offset += INOTIFY_EVENT.size + length
+
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were dropped, fall back to a full scan
+                        self.rescan()
+                        continue
+                    name = os.fsdecode(name)
+                    if not self.is_video(name):
+                        continue
+                    if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        self.update_file(name)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self.remove_file(name)
+        finally:
+            os.close(fd)
+
+    def poll_loop(self):
+        # The directory mtime changes on add/remove/rename, so unchanged directories cost one stat;
+        # a full scan every 30 rounds catches files rewritten in place
+        last_mtime = None
+        rounds = 0
+        while not self.stop_event.wait(self.poll_interval):
+            rounds += 1
+            try:
+                mtime = os.stat(self.video_directory).st_mtime
+            except OSError:
+                continue
+            if mtime != last_mtime or rounds % 30 == 0:
+                last_mtime = mtime
+                self.rescan()
+
+
+if __name__ == "__main__":
+    # Print the catalog of a directory, then follow changes
+    catalog = VideoCatalog(sys.argv[1] if len(sys.argv) > 1 else "./").start()
+    print(f"{len(catalog)} videos, watching with {catalog.watch_mode}")
+    last_version = None
+    while True:
+        if catalog.version != last_version:
+            last_version = catalog.version
+            for name in catalog.names()[:20]:
+                entry = catalog.get(name)
+                print(f"  {name}: {entry['size']} bytes, {entry['frames']} frames, {entry['duration']}s")
+        time.sleep(1)
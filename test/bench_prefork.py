@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import socket
+import select
+import argparse
+import multiprocessing
+
+
+def open_session(host, port, video):
+    """SETUP + PLAY one unicast session, returns (rtsp socket, rtp socket)"""
+    rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rtp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    rtp_socket.bind(('', 0))
+    rtp_port = rtp_socket.getsockname()[1]
+
+    rtsp_socket = socket.create_connection((host, port), timeout=5)
+    url = f"rtsp://{host}:{port}/{video}"
+    rtsp_socket.sendall(f"SETUP {url} RTSP/1.0\r\nCSeq: 1\r\n"
+                        f"Transport: RTP/AVP;unicast;client_port={rtp_port}-{rtp_port + 1}\r\n\r\n".encode())
+    reply = rtsp_socket.recv(4096).decode()
+    if '200 OK' not in reply:
+        raise RuntimeError(f"SETUP failed: {reply.splitlines()[0] if reply else 'no reply'}")
+    session = reply.split('Session: ', 1)[1].split('\r\n', 1)[0].split(';')[0]
+    rtsp_socket.sendall(f"PLAY {url} RTSP/1.0\r\nCSeq: 2\r\nSession: {session}\r\n\r\n".encode())
+    rtsp_socket.recv(4096)
+    return rtsp_socket, rtp_socket
+
+
+def receiver(host, port, videos, sessions, seconds, results):
+    """One receiving process: open sessions, count RTP packets and bytes for a while"""
+    opened = [open_session(host, port, videos[i % len(videos)]) for i in range(sessions)]
+    rtp_sockets = [rtp for _, rtp in opened]
+    for rtp_socket in rtp_sockets:
+        rtp_socket.setblocking(False)
+
+    packets = received = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        readable, _, _ = select.select(rtp_sockets, [], [], 0.1)
+        for rtp_socket in readable:
+            while True:
+                try:
+                    received += len(rtp_socket.recv(65536))
+                    packets += 1
+                except BlockingIOError:
+                    break
+    for rtsp_socket, rtp_socket in opened:
+        rtsp_socket.close()
+        rtp_socket.close()
+    results.put((packets, received))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate RTP packets/s from the custom server")
+    parser.add_argument('host', nargs='?', default='localhost')
+    parser.add_argument('port', nargs='?', type=int, default=8554)
+    parser.add_argument('--videos', default='movie.Mjpeg', help="Comma-separated videos to spread sessions over")
+    parser.add_argument('--sessions', type=int, default=64)
+    parser.add_argument('--receivers', type=int, default=4, help="Receiving processes")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    videos = args.videos.split(',')
+    per_receiver = max(1, args.sessions // args.receivers)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=receiver, args=(args.host, args.port, videos,
+                                                                per_receiver, args.seconds, results))
+                 for _ in range(args.receivers)]
+    for process in processes:
+        process.start()
+    totals = [results.get(timeout=args.seconds + 30) for _ in processes]
+    for process in processes:
+        process.join()
+
+    packets = sum(p for p, _ in totals)
+    received = sum(b for _, b in totals)
+    print("=" * 60)
+    print(f"{per_receiver * args.receivers} sessions over {len(videos)} video(s), {args.seconds:.0f}s")
+    print(f"  Packets/s:  {packets / args.seconds:,.0f}")
+    print(f"  Throughput: {received * 8 / args.seconds / 1e6:,.1f} Mbit/s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
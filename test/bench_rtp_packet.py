@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from RtpPacket import RtpPacket, encode_batch, decode_batch
+
+FRAME_SIZE = 8192  # A typical MJPEG frame, sent as one packet by this server
+
+
+class LegacyPacket:
+    """RtpPacket as it was before: a dict-backed object, the header set byte by byte and copied"""
+
+    def __init__(self):
+        self.header = bytearray(12)
+        self.payload = b''
+
+    def encode(self, seqnum, ssrc, payload):
+        timestamp = int(time.time())
+        self.header[0] = 2 << 6
+        self.header[1] = 26
+        self.header[2] = (seqnum >> 8) & 0xFF
+        self.header[3] = seqnum & 0xFF
+        self.header[4] = (timestamp >> 24) & 0xFF
+        self.header[5] = (timestamp >> 16) & 0xFF
+        self.header[6] = (timestamp >> 8) & 0xFF
+        self.header[7] = timestamp & 0xFF
+        self.header[8] = (ssrc >> 24) & 0xFF
+        self.header[9] = (ssrc >> 16) & 0xFF
+        self.header[10] = (ssrc >> 8) & 0xFF
+        self.header[11] = ssrc & 0xFF
+        self.payload = payload
+
+    def decode(self, packet):
+        self.header = bytearray(packet[:12])
+        self.payload = packet[12:]
+
+    def seqNum(self):
+        return (self.header[2] << 8) | self.header[3]
+
+    def getPacket(self):
+        return self.header + self.payload
+
+
+def bench(name, count, function):
+    started = time.perf_counter()
+    function(count)
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<30} {elapsed * 1e9 / count:>8,.0f} ns/packet")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    frame_size = int(sys.argv[2]) if len(sys.argv) > 2 else FRAME_SIZE
+    payload = b'\xff\xd8' + bytes(frame_size - 2)
+    packet = RtpPacket()
+    packet.encode(2, 0, 0, 0, 1, 0, 26, 0x1234, payload)
+    datagram = packet.getPacket()
+    datagrams = [datagram] * 64
+
+    def old_encode(n):
+        for i in range(n):
+            # The server made a new packet object for every packet
+            legacy = LegacyPacket()
+            legacy.encode(i & 0xFFFF, 0x1234, payload)
+            legacy.getPacket()
+
+    def new_encode(n):
+        reused = RtpPacket()
+        for i in range(n):
+            reused.encode(2, 0, 0, 0, i, 0, 26, 0x1234, payload)
+            reused.buffers()
+
+    def new_encode_packet(n):
+        reused = RtpPacket()
+        for i in range(n):
+            reused.encode(2, 0, 0, 0, i, 0, 26, 0x1234, payload)
+            reused.getPacket()
+
+    def batch_encode(n):
+        buffer = None
+        payloads = [payload] * 64
+        for i in range(0, n, 64):
+            buffer, _ = encode_batch(payloads, i, 0, 0x1234, 26, buffer=buffer)
+
+    def old_decode(n):
+        for _ in range(n):
+            # The old client made a new packet object for every datagram
+            legacy = LegacyPacket()
+            legacy.decode(datagram)
+            legacy.seqNum()
+
+    def new_decode(n):
+        reused = RtpPacket()
+        for _ in range(n):
+            reused.decode(datagram)
+            reused.seqNum()
+
+    def batch_decode(n):
+        packets = []
+        for _ in range(0, n, 64):
+            for decoded in decode_batch(datagrams, packets):
+                decoded.seqNum()
+
+    print(f"{count} packets of {len(datagram)} bytes")
+    bench("encode, byte by byte (old)", count, old_encode)
+    bench("encode + getPacket", count, new_encode_packet)
+    bench("encode for sendmsg", count, new_encode)
+    bench("encode_batch x64", count, batch_encode)
+    bench("decode, copying (old)", count, old_decode)
+    bench("decode into views", count, new_decode)
+    bench("decode_batch x64", count, batch_decode)
+
+
+if __name__ == "__main__":
+    main()
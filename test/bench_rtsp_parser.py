@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from RtspParser import RtspParser
+
+REQUEST = (b"PLAY rtsp://localhost:8554/movie.Mjpeg RTSP/1.0\r\n"
+           b"CSeq: 5\r\nSession: 123456\r\nRange: npt=0.000-\r\nUser-Agent: bench\r\n\r\n")
+
+
+def bench(name, count, chunks):
+    """Feed count requests as the given chunks, print requests per second"""
+    parser = RtspParser()
+    parsed = 0
+    started = time.perf_counter()
+    for chunk in chunks:
+        parsed += len(parser.feed(chunk))
+    elapsed = time.perf_counter() - started
+    assert parsed == count, f"{name}: parsed {parsed} of {count}"
+    print(f"  {name:<12} {count / elapsed:>10,.0f} req/s  ({elapsed * 1e6 / count:.1f} us/req)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"Parsing {count} requests of {len(REQUEST)} bytes")
+    bench("single", count, [REQUEST] * count)
+    pipelined = REQUEST * 50
+    bench("pipelined", count, [pipelined] * (count // 50))
+    fragments = [REQUEST[i:i + 7] for i in range(0, len(REQUEST), 7)]
+    bench("fragmented", count, fragments * count)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,13 @@ import threading
 import os
 import time
 import glob
+import struct
 from RtpPacket import RtpPacket
+from LatencyStats import LatencyStats
 
 CACHE_FILE_NAME = "cache-"
 CACHE_FILE_EXT = ".jpg"
+LATENCY_LOG = "latency.csv"  # Per-frame latency of every session, appended
 
 class SimpleRTSPClient:
     INIT = 0
@@ -22,6 +25,8 @@ class SimpleRTSPClient:
     PLAY = 1
     PAUSE = 2
     TEARDOWN = 3
+    SWITCH = 4
+    KEEPALIVE = 5
 
     def __init__(self, root):
         self.root = root
@@ -37,18 +42,23 @@ class SimpleRTSPClient:
         self.state = self.INIT
         self.rtspSeq = 0
         self.sessionId = 0
+        self.sessionTimeout = 60  # Seconds, from the server's Session header
+        self.rtspAcked = 0        # CSeq of the last reply, keepalives wait for outstanding requests
         self.requestSent = -1
         self.teardownAcked = 0
         self.frameNbr = 0
         self.rtspSocket = None
         self.rtpSocket = None
         self.playEvent = None
+        self.multicastGroup = None  # Group joined for a multicast session
+        self.latency = LatencyStats(LATENCY_LOG)  # Send time (RTP extension) to frame on screen
         
         # Available videos and current selection
         self.available_videos = []
         self.current_video = None
         
         self.setup_ui()
+        self.refresh_latency()
         self.auto_discover_videos()  # Automatically discover videos
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
@@ -78,9 +88,13 @@ class SimpleRTSPClient:
         rtp_entry = ttk.Entry(settings_frame, textvariable=self.rtp_port_var, width=8)
         rtp_entry.grid(row=0, column=5, padx=(0, 5))
         
+        # Multicast: one copy per video on the LAN instead of one per viewer
+        self.multicast_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Multicast", variable=self.multicast_var).grid(row=0, column=6, padx=(0, 5))
+        
         # Refresh button
         refresh_btn = ttk.Button(settings_frame, text="Refresh", command=self.auto_discover_videos)
-        refresh_btn.grid(row=0, column=6)
+        refresh_btn.grid(row=0, column=7)
         
         # Video selection frame
         video_frame = ttk.LabelFrame(main_frame, text="Video Selection", padding="5")
@@ -120,6 +134,10 @@ class SimpleRTSPClient:
         status_label = ttk.Label(control_frame, textvariable=self.status_var)
         status_label.pack(side=tk.RIGHT)
         
+        # Latency percentiles, refreshed every second
+        self.latency_var = tk.StringVar(value="Latency: no frames yet")
+        ttk.Label(main_frame, textvariable=self.latency_var).pack(fill=tk.X, pady=(0, 10))
+        
         # Video display area
         video_display_frame = ttk.LabelFrame(main_frame, text="Video Stream", padding="5")
         video_display_frame.pack(fill=tk.BOTH, expand=True)
@@ -162,7 +180,9 @@ class SimpleRTSPClient:
             test_socket.connect((self.serverAddr, self.serverPort))
             
             # Send SETUP request
-            test_request = f"SETUP {video_name}\n1\n RTSP/1.0 RTP/UDP {self.rtpPort + 1000}"
+            # DESCRIBE answers 404 for unknown videos without setting up a session
+            test_request = (f"DESCRIBE rtsp://{self.serverAddr}:{self.serverPort}/{video_name} RTSP/1.0\r\n"
+                            f"CSeq: 1\r\nAccept: application/sdp\r\n\r\n")
             test_socket.send(test_request.encode('utf-8'))
             
             # Wait for response
@@ -182,8 +202,14 @@ class SimpleRTSPClient:
         """Handle video selection"""
         selected = self.video_var.get()
         if selected:
-            self.current_video = selected
             self.manual_video_var.set("")  # Clear manual entry
+            if self.state != self.INIT and selected != self.current_video:
+                # Already set up - ask the server to switch the running session
+                self.current_video = selected
+                self.send_rtsp_request(self.SWITCH)
+                self.update_status(f"Switching to: {selected}")
+            else:
+                self.current_video = selected
 
     def get_selected_video(self):
         """Get currently selected video (from dropdown or manual entry)"""
@@ -192,6 +218,11 @@ class SimpleRTSPClient:
             return manual_video
         return self.video_var.get()
 
+    def refresh_latency(self):
+        """Show the latest latency percentiles"""
+        self.latency_var.set(self.latency.summary())
+        self.root.after(1000, self.refresh_latency)
+
     def update_status(self, message):
         """Update status message"""
         self.status_var.set(message)
@@ -261,34 +292,68 @@ class SimpleRTSPClient:
             messagebox.showerror("Connection Failed", f"Could not connect to {self.serverAddr}:{self.serverPort}\n{e}")
             return False
 
+    def build_request(self, method, headers=None):
+        """Build an RTSP/1.0 request for the current video"""
+        url = f"rtsp://{self.serverAddr}:{self.serverPort}/{self.current_video}"
+        lines = [f"{method} {url} RTSP/1.0", f"CSeq: {self.rtspSeq}"]
+        if self.sessionId:
+            lines.append(f"Session: {self.sessionId}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('utf-8')
+
     def send_rtsp_request(self, request_code):
         """Send RTSP request to server"""
         if request_code == self.SETUP and self.state == self.INIT:
             threading.Thread(target=self.recv_rtsp_reply, daemon=True).start()
             
             self.rtspSeq = 1
-            request = f"SETUP {self.current_video}\n{self.rtspSeq}\n RTSP/1.0 RTP/UDP {self.rtpPort}"
-            self.rtspSocket.send(request.encode('utf-8'))
+            if self.multicast_var.get():
+                # The server picks the group and port, they come back in the reply
+                transport = "RTP/AVP;multicast"
+            else:
+                transport = f"RTP/AVP;unicast;client_port={self.rtpPort}-{self.rtpPort + 1}"
+            request = self.build_request("SETUP", {'Transport': transport})
+            self.rtspSocket.send(request)
             self.requestSent = self.SETUP
 
         elif request_code == self.PLAY and self.state == self.READY:
             self.rtspSeq += 1
-            request = f"PLAY \n{self.rtspSeq}"
-            self.rtspSocket.send(request.encode('utf-8'))
+            self.rtspSocket.send(self.build_request("PLAY"))
             self.requestSent = self.PLAY
 
         elif request_code == self.PAUSE and self.state == self.PLAYING:
             self.rtspSeq += 1
-            request = f"PAUSE \n{self.rtspSeq}"
-            self.rtspSocket.send(request.encode('utf-8'))
+            self.rtspSocket.send(self.build_request("PAUSE"))
             self.requestSent = self.PAUSE
 
+        elif request_code == self.SWITCH and self.state != self.INIT:
+            self.rtspSeq += 1
+            self.rtspSocket.send(self.build_request("SWITCH"))
+            self.requestSent = self.SWITCH
+
         elif request_code == self.TEARDOWN and self.state != self.INIT:
             self.rtspSeq += 1
-            request = f"TEARDOWN \n{self.rtspSeq}"
-            self.rtspSocket.send(request.encode('utf-8'))
+            self.rtspSocket.send(self.build_request("TEARDOWN"))
             self.requestSent = self.TEARDOWN
 
+        elif request_code == self.KEEPALIVE and self.state != self.INIT:
+            self.rtspSeq += 1
+            self.rtspSocket.send(self.build_request("GET_PARAMETER"))
+            self.requestSent = self.KEEPALIVE
+
+    def keepalive(self):
+        """Refresh the session at half its timeout, or the server reaps it"""
+        if self.state == self.INIT:
+            return
+        if self.rtspAcked == self.rtspSeq:
+            try:
+                self.send_rtsp_request(self.KEEPALIVE)
+            except OSError as e:
+                print(f"Keepalive error: {e}")
+                return
+        self.root.after(int(self.sessionTimeout * 500), self.keepalive)
+
     def recv_rtsp_reply(self):
         """Receive RTSP replies from server"""
         try:
@@ -305,11 +370,22 @@ class SimpleRTSPClient:
     def parse_rtsp_reply(self, data):
         """Parse RTSP reply from server"""
         try:
-            lines = data.split('\n')
-            seq_num = int(lines[1].split(' ')[1])
+            head = data.split('\r\n\r\n', 1)[0]
+            lines = head.split('\r\n')
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            seq_num = int(headers.get('cseq', -1))
             
             if seq_num == self.rtspSeq:
-                session = int(lines[2].split(' ')[1])
+                self.rtspAcked = seq_num
+                session_header = headers.get('session', '0').split(';')
+                session = int(session_header[0])
+                for param in session_header[1:]:
+                    name, _, value = param.strip().partition('=')
+                    if name == 'timeout' and value.isdigit():
+                        self.sessionTimeout = int(value)
                 
                 if self.sessionId == 0:
                     self.sessionId = session
@@ -318,10 +394,12 @@ class SimpleRTSPClient:
                     if int(lines[0].split(' ')[1]) == 200:  # OK response
                         if self.requestSent == self.SETUP:
                             self.state = self.READY
-                            self.open_rtp_port()
+                            self.latency.start_session(self.sessionId)
+                            self.open_rtp_port(self.parse_transport(headers.get('transport', '')))
                             self.root.after(0, lambda: self.update_status(f"Ready: {self.current_video}"))
                             self.root.after(0, lambda: self.play_btn.config(state='normal'))
                             self.root.after(0, lambda: self.teardown_btn.config(state='normal'))
+                            self.root.after(int(self.sessionTimeout * 500), self.keepalive)
                             
                         elif self.requestSent == self.PLAY:
                             self.state = self.PLAYING
@@ -331,50 +409,90 @@ class SimpleRTSPClient:
                             if self.playEvent:
                                 self.playEvent.set()
                                 
+                        elif self.requestSent == self.SWITCH:
+                            transport = self.parse_transport(headers.get('transport', ''))
+                            if transport.get('destination'):
+                                # Multicast: the new video has its own group and port
+                                old_socket = self.rtpSocket
+                                self.open_rtp_port(transport)
+                                old_socket.close()
+                            self.root.after(0, lambda: self.update_status(f"Playing: {self.current_video}"))
+                            
                         elif self.requestSent == self.TEARDOWN:
                             self.teardownAcked = 1
                             
         except Exception as e:
             print(f"Error parsing RTSP reply: {e}")
 
-    def open_rtp_port(self):
-        """Open RTP socket for receiving video data"""
+    def parse_transport(self, value):
+        """Transport reply header as a dict, e.g. {'destination': '239.255.42.1', 'port': '5004-5005'}"""
+        transport = {}
+        for part in value.split(';'):
+            name, _, param = part.strip().partition('=')
+            transport[name] = param
+        return transport
+
+    def open_rtp_port(self, transport=None):
+        """Open RTP socket for receiving video data, joining the group for multicast sessions"""
+        transport = transport or {}
+        multicast = 'multicast' in transport and transport.get('destination')
+        port = int(transport['port'].split('-')[0]) if multicast else self.rtpPort
         try:
             self.rtpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.rtpSocket.settimeout(0.5)
-            self.rtpSocket.bind(('', self.rtpPort))
-            print(f"RTP socket bound to port {self.rtpPort}")
+            if multicast:
+                # Several viewers on one host share the group port
+                self.rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.rtpSocket.bind(('', port))
+            print(f"RTP socket bound to port {port}")
+            if multicast:
+                self.join_group(transport['destination'])
         except Exception as e:
-            messagebox.showerror("RTP Error", f"Could not bind to RTP port {self.rtpPort}: {e}")
+            messagebox.showerror("RTP Error", f"Could not bind to RTP port {port}: {e}")
+
+    def join_group(self, group):
+        """Join a multicast group on the RTP socket"""
+        self.rtpSocket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                  struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0')))
+        self.multicastGroup = group
+        # The new group's sender numbers its packets from its own sequence
+        self.frameNbr = 0
+        print(f"Joined multicast group {group}")
 
     def listen_rtp(self):
         """Listen for RTP packets and update video"""
+        rtp_packet = RtpPacket()  # Reused, each payload is a view of its own datagram
         while True:
+            rtp_socket = self.rtpSocket
             try:
-                data = self.rtpSocket.recv(20480)
+                data = rtp_socket.recv(20480)
                 if data:
-                    rtp_packet = RtpPacket()
+                    arrived = time.time()
                     rtp_packet.decode(data)
                     
                     curr_frame_nbr = rtp_packet.seqNum()
                     
                     if curr_frame_nbr > self.frameNbr:
                         self.frameNbr = curr_frame_nbr
-                        # Update video in main thread
-                        self.root.after(0, self.update_video, rtp_packet.getPayload())
+                        # Update video in main thread, with the server's send time for the latency stats
+                        self.root.after(0, self.update_video, rtp_packet.getPayload(), curr_frame_nbr,
+                                        rtp_packet.sendTime(), arrived)
                         
             except socket.timeout:
                 if self.playEvent and self.playEvent.isSet():
                     break
                 continue
             except Exception as e:
+                if rtp_socket is not self.rtpSocket:
+                    continue  # Replaced by a multicast SWITCH
                 if self.state == self.PLAYING:
                     self.root.after(0, self.pause_movie)
                 print(f"RTP receive error: {e}")
                 break
 
-    def update_video(self, frame_data):
+    def update_video(self, frame_data, seq=None, sent=None, arrived=None):
         """Update the video display with new frame"""
+        display_start = time.time()
         try:
             # Write frame to temporary file
             cache_name = f"{CACHE_FILE_NAME}{self.sessionId}{CACHE_FILE_EXT}"
@@ -391,6 +509,11 @@ class SimpleRTSPClient:
             self.video_label.config(image=photo, text="")
             self.video_label.image = photo  # Keep reference
             
+            if arrived:
+                # Paint now, so the sample covers the frame actually reaching the screen
+                self.video_label.update_idletasks()
+                self.latency.record(seq, sent, arrived, display_start, time.time())
+            
         except Exception as e:
             print(f"Video update error: {e}")
 
@@ -421,6 +544,8 @@ class SimpleRTSPClient:
             
         self.sessionId = 0
         self.rtspSeq = 0
+        self.rtspAcked = 0
+        self.multicastGroup = None
         
         # Clear video display
         self.video_label.config(image="", text="Setup and play a video")
@@ -432,6 +557,7 @@ class SimpleRTSPClient:
             self.teardown_movie()
         
         self.cleanup_session()
+        self.latency.close()
         self.root.destroy()
 
 
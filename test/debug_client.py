@@ -33,7 +33,9 @@ def test_rtsp_connection(server_addr="localhost", server_port=8554, rtp_port=250
     # Step 2: Send SETUP request
     print("\nStep 2: Sending SETUP request...")
     try:
-        setup_request = f"SETUP {filename}\n1\n RTSP/1.0 RTP/UDP {rtp_port}"
+        setup_request = (f"SETUP rtsp://{server_addr}:{server_port}/{filename} RTSP/1.0\r\n"
+                         f"CSeq: 1\r\n"
+                         f"Transport: RTP/AVP;unicast;client_port={rtp_port}-{rtp_port + 1}\r\n\r\n")
         print(f"Sending: {repr(setup_request)}")
         
         rtsp_socket.send(setup_request.encode('utf-8'))
@@ -52,7 +54,7 @@ def test_rtsp_connection(server_addr="localhost", server_port=8554, rtp_port=250
             print("-" * 40)
             
             # Parse response
-            lines = response_str.split('\n')
+            lines = response_str.split('\r\n')
             if len(lines) >= 3:
                 status_line = lines[0]
                 seq_line = lines[1] if len(lines) > 1 else ""
@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""Load generator for the custom RTSP/RTP server (main2.py)
+
+Usage:
+    python loadgen.py --spawn /path/to/videos [--clients K] [--seconds S] [--scenario steady|churn|both]
+    python loadgen.py localhost 8554 --server-pid PID [...]
+
+steady: K clients SETUP + PLAY and watch for S seconds. Reports session setup
+latency, PLAY -> first packet, delivered fps, packet loss (sequence gaps) and
+RFC 3550 interarrival jitter, plus send -> receive latency from the server's
+RFC 8285 send-time extension.
+
+churn: K clients loop SETUP, PLAY, first packet, PAUSE, PLAY, TEARDOWN for S
+seconds. Reports cycles per second and the latency of every step.
+
+Server CPU and RSS (including pre-fork workers) are sampled from /proc when
+the server is spawned or its pid is given. --json writes everything, with
+the current git commit, so runs can be compared between commits.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import selectors
+import threading
+import subprocess
+import multiprocessing
+from collections import deque
+from RtpPacket import RtpPacket
+
+RTP_CLOCK = 90000
+KEEPALIVE_INTERVAL = 20.0  # GET_PARAMETER during long steady runs, well inside the server's timeout
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    """Percentiles of a list of seconds, in ms"""
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'max_ms': round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+class RtspSession:
+    """One RTSP connection plus its RTP socket, with timed requests"""
+
+    def __init__(self, host, port, video, timeout=5.0):
+        self.url = f"rtsp://{host}:{port}/{video}"
+        self.timeout = timeout
+        self.cseq = 0
+        self.session = None
+        self.rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rtp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.rtp_socket.bind(('127.0.0.1', 0))
+        self.rtp_port = self.rtp_socket.getsockname()[1]
+        self.rtsp_socket = socket.create_connection((host, port), timeout=timeout)
+        self.buffer = b''
+
+    def request(self, method, headers=None):
+        """Send a request and read the reply, returns (status, headers, body, seconds)"""
+        self.cseq += 1
+        lines = [f"{method} {self.url} RTSP/1.0", f"CSeq: {self.cseq}"]
+        if self.session:
+            lines.append(f"Session: {self.session}")
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        started = time.perf_counter()
+        self.rtsp_socket.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+        status, reply_headers, body = self.read_reply()
+        return status, reply_headers, body, time.perf_counter() - started
+
+    def read_reply(self):
+        while b'\r\n\r\n' not in self.buffer:
+            data = self.rtsp_socket.recv(4096)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.buffer += data
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        lines = head.decode('utf-8', 'replace').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        while len(self.buffer) < length:
+            data = self.rtsp_socket.recv(4096)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.buffer += data
+        body, self.buffer = self.buffer[:length], self.buffer[length:]
+        return status, headers, body
+
+    def setup(self):
+        status, headers, _, elapsed = self.request('SETUP', {
+            'Transport': f"RTP/AVP;unicast;client_port={self.rtp_port}-{self.rtp_port + 1}"})
+        if status != 200:
+            raise RuntimeError(f"SETUP returned {status}")
+        self.session = headers['session'].split(';')[0]
+        return elapsed
+
+    def close(self):
+        try:
+            if self.session:
+                self.rtsp_socket.settimeout(1.0)
+                self.request('TEARDOWN')
+        except (OSError, RuntimeError, ValueError):
+            pass
+        self.rtsp_socket.close()
+        self.rtp_socket.close()
+
+
+LATENCY_SAMPLES = 5000  # Send-time latency samples kept per session
+
+
+class StreamStats:
+    """Per-session receive statistics: frames, bytes, sequence gaps, RFC 3550 jitter and send latency"""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.first_seq = None
+        self.max_seq = 0       # Extended (wrap-counted) highest sequence number
+        self.transit = None
+        self.jitter = 0.0      # In RTP clock units
+        self.first_arrival = None
+        self.last_arrival = None
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # Seconds from the send-time extension to arrival
+
+    def add(self, packet, size, arrival):
+        seq = packet.seqNum()
+        if self.first_seq is None:
+            self.first_seq = self.max_seq = seq
+            self.first_arrival = arrival
+        else:
+            # Extend across 16-bit wraps, relative to the highest number seen
+            delta = (seq - self.max_seq) & 0xFFFF
+            if delta < 0x8000:
+                self.max_seq += delta
+        transit = int(arrival * RTP_CLOCK) - packet.timestamp()
+        if self.transit is not None:
+            difference = abs(transit - self.transit)
+            # The timestamp wraps every 13 hours at 90 kHz, ignore the one interval that spans it
+            if difference < 0x80000000:
+                self.jitter += (difference - self.jitter) / 16.0
+        self.transit = transit
+        sent = packet.sendTime()
+        if sent:
+            self.latencies.append(arrival - sent)
+        self.packets += 1
+        self.bytes += size
+        self.last_arrival = arrival
+
+    def result(self):
+        expected = self.max_seq - self.first_seq + 1 if self.first_seq is not None else 0
+        elapsed = (self.last_arrival - self.first_arrival) if self.packets > 1 else 0.0
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'expected': expected,
+            'lost': max(0, expected - self.packets),
+            'fps': (self.packets - 1) / elapsed if elapsed else 0.0,
+            'jitter_ms': self.jitter * 1000.0 / RTP_CLOCK,
+            'latencies': list(self.latencies),
+        }
+
+
+def steady_worker(host, port, videos, clients, seconds, results):
+    """Open clients sessions, watch them for seconds, put a list of per-session results"""
+    sessions = []
+    setup_times = []
+    errors = 0
+    for index in range(clients):
+        try:
+            session = RtspSession(host, port, videos[index % len(videos)])
+            setup_times.append(session.setup())
+            session.rtp_socket.setblocking(False)
+            sessions.append(session)
+        except (OSError, RuntimeError, ValueError, KeyError) as e:
+            errors += 1
+            print(f"  Session {index} failed: {e}")
+
+    selector = selectors.DefaultSelector()
+    stats = {}
+    play_sent = {}
+    first_packet = {}
+    for session in sessions:
+        stats[session] = StreamStats()
+        selector.register(session.rtp_socket, selectors.EVENT_READ, session)
+        play_sent[session] = time.perf_counter()
+        try:
+            if session.request('PLAY')[0] != 200:
+                errors += 1
+        except (OSError, ValueError):
+            errors += 1
+
+    packet = RtpPacket()
+    buffer = bytearray(65536)
+    end = time.perf_counter() + seconds
+    next_keepalive = time.perf_counter() + KEEPALIVE_INTERVAL
+    while time.perf_counter() < end:
+        for key, _ in selector.select(0.1):
+            session = key.data
+            while True:
+                try:
+                    size = session.rtp_socket.recv_into(buffer)
+                except BlockingIOError:
+                    break
+                arrival = time.perf_counter()
+                if session not in first_packet:
+                    first_packet[session] = arrival - play_sent[session]
+                try:
+                    packet.decode(memoryview(buffer)[:size])
+                except ValueError:
+                    continue
+                stats[session].add(packet, size, time.time())
+        if time.perf_counter() > next_keepalive:
+            next_keepalive += KEEPALIVE_INTERVAL
+            for session in sessions:
+                try:
+                    session.request('GET_PARAMETER')
+                except OSError:
+                    pass
+
+    selector.close()
+    for session in sessions:
+        session.close()
+    results.put({
+        'setup': setup_times,
+        'first_packet': list(first_packet.values()),
+        'streams': [stats[session].result() for session in sessions],
+        'no_packets': len(sessions) - len(first_packet),
+        'errors': errors,
+    })
+
+
+def wait_packet(session, timeout):
+    """Seconds until the next RTP packet on a blocking socket, None on timeout"""
+    started = time.perf_counter()
+    session.rtp_socket.settimeout(timeout)
+    try:
+        session.rtp_socket.recv(65536)
+    except socket.timeout:
+        return None
+    return time.perf_counter() - started
+
+
+def drain(session):
+    session.rtp_socket.setblocking(False)
+    try:
+        while True:
+            session.rtp_socket.recv(65536)
+    except BlockingIOError:
+        pass
+
+
+def churn_worker(host, port, videos, clients, seconds, results):
+    """clients threads cycling SETUP/PLAY/PAUSE/PLAY/TEARDOWN for seconds, put timings per step"""
+    lock = threading.Lock()
+    timings = {step: [] for step in ('connect', 'setup', 'play_first_packet', 'pause', 'resume_first_packet', 'teardown')}
+    counts = {'cycles': 0, 'errors': 0, 'timeouts': 0}
+    end = time.perf_counter() + seconds
+
+    def client(index):
+        video = videos[index % len(videos)]
+        local = {step: [] for step in timings}
+        cycles = errors = timeouts = 0
+        while time.perf_counter() < end:
+            session = None
+            try:
+                started = time.perf_counter()
+                session = RtspSession(host, port, video)
+                local['connect'].append(time.perf_counter() - started)
+                local['setup'].append(session.setup())
+
+                started = time.perf_counter()
+                session.request('PLAY')
+                first = wait_packet(session, session.timeout)
+                if first is None:
+                    timeouts += 1
+                    continue
+                local['play_first_packet'].append(time.perf_counter() - started)
+
+                local['pause'].append(session.request('PAUSE')[3])
+                drain(session)
+                started = time.perf_counter()
+                session.request('PLAY')
+                first = wait_packet(session, session.timeout)
+                if first is None:
+                    timeouts += 1
+                    continue
+                local['resume_first_packet'].append(time.perf_counter() - started)
+
+                session.rtsp_socket.settimeout(session.timeout)
+                status, _, _, elapsed = session.request('TEARDOWN')
+                session.session = None
+                local['teardown'].append(elapsed)
+                if status == 200:
+                    cycles += 1
+                else:
+                    errors += 1
+            except (OSError, RuntimeError, ValueError, KeyError):
+                errors += 1
+            finally:
+                if session:
+                    session.close()
+        with lock:
+            for step, samples in local.items():
+                timings[step].extend(samples)
+            counts['cycles'] += cycles
+            counts['errors'] += errors
+            counts['timeouts'] += timeouts
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put({'timings': timings, **counts})
+
+
+def run_processes(worker, host, port, videos, clients, seconds, processes):
+    """Split clients over receiving processes, returns their results"""
+    results = multiprocessing.Queue()
+    shares = [clients // processes + (1 if index < clients % processes else 0) for index in range(processes)]
+    children = [multiprocessing.Process(target=worker, args=(host, port, videos, share, seconds, results))
+                for share in shares if share]
+    for child in children:
+        child.start()
+    collected = [results.get(timeout=seconds + 120) for _ in children]
+    for child in children:
+        child.join()
+    return collected
+
+
+def run_steady(host, port, videos, clients, seconds, processes):
+    parts = run_processes(steady_worker, host, port, videos, clients, seconds, processes)
+    streams = [stream for part in parts for stream in part['streams']]
+    expected = sum(stream['expected'] for stream in streams)
+    lost = sum(stream['lost'] for stream in streams)
+    fps = [stream['fps'] for stream in streams]
+    jitter = [stream['jitter_ms'] for stream in streams]
+    result = {
+        'scenario': 'steady',
+        'clients': clients,
+        'seconds': seconds,
+        'sessions': len(streams),
+        'errors': sum(part['errors'] for part in parts),
+        'sessions_without_packets': sum(part['no_packets'] for part in parts),
+        'setup': latency_summary([t for part in parts for t in part['setup']]),
+        'first_packet': latency_summary([t for part in parts for t in part['first_packet']]),
+        'packets_per_second': round(sum(stream['packets'] for stream in streams) / seconds, 1),
+        'mbit_per_second': round(sum(stream['bytes'] for stream in streams) * 8 / seconds / 1e6, 2),
+        'fps_mean': round(sum(fps) / len(fps), 2) if fps else 0.0,
+        'fps_min': round(min(fps), 2) if fps else 0.0,
+        'loss_percent': round(lost * 100.0 / expected, 3) if expected else 0.0,
+        'jitter_mean_ms': round(sum(jitter) / len(jitter), 3) if jitter else 0.0,
+        'jitter_p95_ms': round(percentile(jitter, 95), 3),
+        'send_latency': latency_summary([t for stream in streams for t in stream.pop('latencies')]),
+    }
+
+    print(f"Steady: {result['sessions']} sessions for {seconds:.0f}s ({result['errors']} errors)")
+    print(f"  Setup:        p50 {result['setup']['p50_ms']}ms  p95 {result['setup']['p95_ms']}ms  max {result['setup']['max_ms']}ms")
+    print(f"  First packet: p50 {result['first_packet']['p50_ms']}ms  p95 {result['first_packet']['p95_ms']}ms")
+    print(f"  Delivered:    {result['packets_per_second']} pkt/s, {result['mbit_per_second']} Mbit/s, "
+          f"fps mean {result['fps_mean']} min {result['fps_min']}")
+    print(f"  Loss:         {result['loss_percent']}%   Jitter: mean {result['jitter_mean_ms']}ms  p95 {result['jitter_p95_ms']}ms")
+    latency = result['send_latency']
+    if latency['count']:
+        print(f"  Send latency: p50 {latency['p50_ms']}ms  p95 {latency['p95_ms']}ms  p99 {latency['p99_ms']}ms")
+    return result
+
+
+def run_churn(host, port, videos, clients, seconds, processes):
+    parts = run_processes(churn_worker, host, port, videos, clients, seconds, processes)
+    cycles = sum(part['cycles'] for part in parts)
+    result = {
+        'scenario': 'churn',
+        'clients': clients,
+        'seconds': seconds,
+        'cycles': cycles,
+        'cycles_per_second': round(cycles / seconds, 1),
+        'errors': sum(part['errors'] for part in parts),
+        'timeouts': sum(part['timeouts'] for part in parts),
+        'steps': {step: latency_summary([t for part in parts for t in part['timings'][step]])
+                  for step in parts[0]['timings']} if parts else {},
+    }
+
+    print(f"Churn: {clients} clients for {seconds:.0f}s, {cycles} cycles ({result['cycles_per_second']}/s), "
+          f"{result['errors']} errors, {result['timeouts']} timeouts")
+    for step, summary in result['steps'].items():
+        print(f"  {step:<20} p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  max {summary['max_ms']}ms")
+    return result
+
+
+class ServerMonitor:
+    """Samples CPU time and RSS of the server and its child processes from /proc"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_samples = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def processes(self):
+        pids = [self.pid]
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as handle:
+                        fields = handle.read().rsplit(')', 1)[1].split()
+                except OSError:
+                    continue
+                if int(fields[1]) == self.pid:
+                    pids.append(int(entry))
+        return pids
+
+    def sample(self):
+        """(CPU seconds, RSS bytes) summed over the server's processes"""
+        cpu = rss = 0
+        for pid in self.processes():
+            try:
+                with open(f'/proc/{pid}/stat') as handle:
+                    fields = handle.read().rsplit(')', 1)[1].split()
+                with open(f'/proc/{pid}/statm') as handle:
+                    pages = int(handle.read().split()[1])
+            except OSError:
+                continue
+            # utime and stime, fields 14 and 15 of stat (counting from the pid)
+            cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK
+            rss += pages * os.sysconf('SC_PAGE_SIZE')
+        return cpu, rss
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.cpu_start, _ = self.sample()
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.rss_samples.append(self.sample()[1])
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        cpu, rss = self.sample()
+        self.rss_samples.append(rss)
+        elapsed = time.perf_counter() - self.started
+        return {
+            'pid': self.pid,
+            'cpu_seconds': round(cpu - self.cpu_start, 2),
+            'cpu_percent': round((cpu - self.cpu_start) * 100.0 / elapsed, 1) if elapsed else 0.0,
+            'rss_mb_mean': round(sum(self.rss_samples) / len(self.rss_samples) / 1e6, 1),
+            'rss_mb_peak': round(max(self.rss_samples) / 1e6, 1),
+        }
+
+
+def spawn_server(video_directory, port, server_args):
+    """Start main2.py on localhost and wait until it accepts connections"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main2.py')
+    process = subprocess.Popen([sys.executable, script, video_directory, str(port)] + server_args,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with {process.returncode}")
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("server did not start listening")
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the custom RTSP/RTP server")
+    parser.add_argument('host', nargs='?', default='localhost')
+    parser.add_argument('port', nargs='?', type=int, default=8554)
+    parser.add_argument('--spawn', metavar='VIDEO_DIR', help="Start main2.py on a free localhost port for the run")
+    parser.add_argument('--server-args', default='', help="Extra main2.py arguments with --spawn, e.g. '--fps 100'")
+    parser.add_argument('--server-pid', type=int, help="Sample CPU/RSS of an already running server")
+    parser.add_argument('--scenario', choices=('steady', 'churn', 'both'), default='both')
+    parser.add_argument('--videos', default='movie.Mjpeg', help="Comma-separated videos to spread clients over")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument('--processes', type=int, default=1, help="Client processes (the clients are split across them)")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    server = None
+    host, port = args.host, args.port
+    if args.spawn:
+        host, port = '127.0.0.1', free_port()
+        server = spawn_server(args.spawn, port, args.server_args.split())
+    server_pid = server.pid if server else args.server_pid
+    videos = args.videos.split(',')
+
+    print("=" * 60)
+    print(f"Load against rtsp://{host}:{port} ({args.clients} clients, {', '.join(videos)})")
+    print("=" * 60)
+    runs = []
+    try:
+        for scenario, run in (('steady', run_steady), ('churn', run_churn)):
+            if args.scenario not in (scenario, 'both'):
+                continue
+            monitor = ServerMonitor(server_pid) if server_pid else None
+            if monitor:
+                monitor.start()
+            result = run(host, port, videos, args.clients, args.seconds, args.processes)
+            if monitor:
+                result['server'] = monitor.stop()
+                print(f"  Server:       CPU {result['server']['cpu_percent']}%  "
+                      f"RSS mean {result['server']['rss_mb_mean']}MB  peak {result['server']['rss_mb_peak']}MB")
+            runs.append(result)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump({
+                'target': f"{host}:{port}",
+                'timestamp': time.time(),
+                'commit': git_commit(),
+                'server_args': args.server_args if args.spawn else None,
+                'videos': videos,
+                'results': runs,
+            }, handle, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,81 +4,222 @@ import socket
 import threading
 import sys
 import os
-import glob
-from VideoStream import VideoStream
-from RtpPacket import RtpPacket
+import time
+import errno
+import argparse
+import selectors
+from VideoBroadcaster import VideoBroadcaster
+from VideoCatalog import VideoCatalog
+from RtpPacket import (RtpPacket, RTP_HEADER, SEND_TIME_EXTENSION, ONE_BYTE_PROFILE, SEND_TIME_ID, SEND_TIME_URI,
+                       send_time_extension, to_ntp64)
+from RtspParser import RtspParser, RtspParseError, format_response, build_sdp
+from TimerWheel import TimerWheel
+from MulticastSender import MulticastSender
+from PacketCache import PacketCache
+from FramePrefetcher import DEFAULT_MAX_FRAMES, DEFAULT_MAX_BYTES
 from random import randint
 
 MJPEG_TYPE = 26
+SESSION_TIMEOUT = 60   # Seconds without a request or RTCP report before a session is reaped
+MAX_UNREACHABLE = 3    # ICMP port-unreachable errors, with no sign of life in between, before a session is reaped
+MULTICAST_PREFIX = '239.255.42'  # Administratively scoped, one group per video: .1, .2, ...
+MULTICAST_PORT = 5004             # First video's port; each video also gets its own port pair, since
+                                  # Linux delivers a group's packets to every socket bound to its port
+MULTICAST_TTL = 1                 # Stay on the local network
+RTP_CLOCK = 90000                     # JPEG/90000, as in the SDP
+RTCP_SR = 200
+RTCP_RR = 201
 
 class MultiVideoRTSPServer:
+    OPTIONS = 'OPTIONS'
+    DESCRIBE = 'DESCRIBE'
     SETUP = 'SETUP'
     PLAY = 'PLAY'
     PAUSE = 'PAUSE'
     TEARDOWN = 'TEARDOWN'
+    GET_PARAMETER = 'GET_PARAMETER'
+    LIST = 'LIST'      # Custom command returning the video catalog
     SWITCH = 'SWITCH'  # Custom command for switching videos
+    STATS = 'STATS'    # Custom command returning join/switch latency stats
     
     INIT = 0
     READY = 1
     PLAYING = 2
     
-    OK_200 = 0
-    FILE_NOT_FOUND_404 = 1
-    CON_ERR_500 = 2
+    PUBLIC_METHODS = (OPTIONS, DESCRIBE, SETUP, PLAY, PAUSE, TEARDOWN, GET_PARAMETER, LIST, SWITCH, STATS)
+    SESSION_METHODS = (PLAY, PAUSE, TEARDOWN, GET_PARAMETER, SWITCH)
+    
+    OK_200 = 200
+    FILE_NOT_FOUND_404 = 404
+    CON_ERR_500 = 500
+    SESSION_NOT_FOUND_454 = 454
+    INVALID_STATE_455 = 455
+    UNSUPPORTED_TRANSPORT_461 = 461
+    NOT_IMPLEMENTED_501 = 501
 
-    def __init__(self, video_directory="./", port=8554):
+    def __init__(self, video_directory="./", port=8554, session_timeout=SESSION_TIMEOUT,
+                 multicast_interface='0.0.0.0', fps=None, catalog=None, broadcaster_factory=None,
+                 worker_id=None, packet_cache_bytes=0, prefetch_frames=DEFAULT_MAX_FRAMES,
+                 prefetch_bytes=DEFAULT_MAX_BYTES):
         self.video_directory = video_directory
         self.port = port
-        self.available_videos = self.scan_videos()
+        self.session_timeout = session_timeout
+        self.multicast_interface = multicast_interface
+        # Set in pre-fork worker processes: the port is shared (SO_REUSEPORT), and the catalog
+        # and frames come from the coordinator through shared memory
+        self.worker_id = worker_id
+        self.broadcaster_factory = broadcaster_factory or self.file_broadcaster
+        # Optional: videos packetized once and kept in memory, sessions only patch their RTP header
+        self.packet_cache = PacketCache(packet_cache_bytes) if packet_cache_bytes else None
+        # Read-ahead queue per broadcaster, the frame loops never wait on the disk
+        self.prefetch_frames = prefetch_frames
+        self.prefetch_bytes = prefetch_bytes
+        # Dict-indexed catalog kept current by inotify/polling, replaces the startup glob
+        if catalog is None:
+            catalog = (VideoCatalog(video_directory, fps=fps) if fps else VideoCatalog(video_directory)).start()
+        self.catalog = catalog
         self.active_clients = {}
+        self.broadcasters = {}  # video -> VideoBroadcaster shared by every client watching it
+        self.broadcasters_lock = threading.Lock()
+        self.multicast_senders = {}  # video -> MulticastSender, one group per video
+        self.multicast_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.join_latencies = []    # ms from PLAY to first frame sent
+        self.switch_latencies = []  # ms from SWITCH to first frame of the new video
+        self.expired_sessions = 0
         
-        print("Available videos:")
-        for i, video in enumerate(self.available_videos):
-            print(f"  {i+1}. {video}")
-
-    def scan_videos(self):
-        """Scan directory for available video files"""
-        video_extensions = ['*.Mjpeg', '*.mjpeg', '*.MJPEG']
-        videos = []
-        
-        for ext in video_extensions:
-            videos.extend(glob.glob(os.path.join(self.video_directory, ext)))
+        # One wheel expires every idle session; one selector reads every session's RTCP socket
+        self.session_timers = TimerWheel(tick=1.0)
+        self.rtcp_selector = selectors.DefaultSelector()
+        threading.Thread(target=self.rtcp_loop, daemon=True).start()
         
-        # Remove directory path, keep just filename
-        videos = [os.path.basename(v) for v in videos]
-        return videos
+        if worker_id is None:
+            print(f"Available videos ({self.catalog.watch_mode} updates):")
+            for i, video in enumerate(self.catalog.names()[:20]):
+                print(f"  {i+1}. {video}")
+            if len(self.catalog) > 20:
+                print(f"  ... and {len(self.catalog) - 20} more")
+
+    def get_broadcaster(self, video):
+        """Return the shared broadcaster for a video, starting it on first use"""
+        with self.broadcasters_lock:
+            broadcaster = self.broadcasters.get(video)
+            if not broadcaster:
+                entry = self.catalog.get(video)
+                if not entry:
+                    raise IOError(f"Video not found: {video}")
+                broadcaster = self.broadcaster_factory(video, entry)
+                self.broadcasters[video] = broadcaster
+            return broadcaster
+
+    def file_broadcaster(self, video, entry):
+        """Default broadcaster: this process reads the file itself"""
+        return VideoBroadcaster(entry['path'], 1.0 / entry['fps'], packet_cache=self.packet_cache,
+                                prefetch_frames=self.prefetch_frames, prefetch_bytes=self.prefetch_bytes)
+
+    def get_multicast_sender(self, video):
+        """Return the multicast sender for a video, allocating its group on first use"""
+        broadcaster = self.get_broadcaster(video)
+        with self.multicast_lock:
+            sender = self.multicast_senders.get(video)
+            if not sender:
+                index = len(self.multicast_senders) + 1
+                if index > 254:
+                    raise IOError(f"No multicast group left for {video}")
+                sender = MulticastSender(broadcaster, f"{MULTICAST_PREFIX}.{index}", MULTICAST_PORT + 2 * (index - 1),
+                                         MULTICAST_TTL, self.multicast_interface)
+                self.multicast_senders[video] = sender
+                print(f"Multicast group for {video}: {sender.group}:{sender.port}")
+            return sender
+
+    def record_latency(self, kind, latency_ms):
+        """Record a join or switch latency sample"""
+        with self.stats_lock:
+            samples = self.join_latencies if kind == 'join' else self.switch_latencies
+            samples.append(latency_ms)
+            del samples[:-1000]  # Keep the last 1000 samples
+
+    def get_stats(self):
+        """Latency summary for the STATS command"""
+        def summarize(samples):
+            if not samples:
+                return {'count': 0, 'avg_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+            ordered = sorted(samples)
+            return {
+                'count': len(ordered),
+                'avg_ms': round(sum(ordered) / len(ordered), 2),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                'max_ms': round(ordered[-1], 2),
+            }
+
+        with self.stats_lock:
+            stats = {
+                'worker': self.worker_id if self.worker_id is not None else '-',
+                'pid': os.getpid(),
+                'clients': len(self.active_clients),
+                'broadcasters': len(self.broadcasters),
+                'sessions': len(self.session_timers),
+                'expired_sessions': self.expired_sessions,
+                'multicast_groups': len(self.multicast_senders),
+                'multicast_viewers': sum(sender.session_count() for sender in self.multicast_senders.values()),
+                'join': summarize(self.join_latencies),
+                'switch': summarize(self.switch_latencies),
+            }
+        if self.packet_cache:
+            stats.update({f"packet_cache_{key}": value for key, value in self.packet_cache.stats().items()})
+        with self.broadcasters_lock:
+            broadcasters = list(self.broadcasters.values())
+        prefetch = [broadcaster.prefetch_stats() for broadcaster in broadcasters
+                    if hasattr(broadcaster, 'prefetch_stats')]
+        prefetch = [item for item in prefetch if item]
+        if prefetch:
+            stats.update({
+                'prefetch_underruns': sum(item['underruns'] for item in prefetch),
+                'prefetch_stalls': sum(item['stalls'] for item in prefetch),
+                'prefetch_queued_frames': sum(item['queued_frames'] for item in prefetch),
+                'prefetch_max_read_ms': max(item['max_read_ms'] for item in prefetch),
+            })
+        return stats
 
     def start_server(self):
         """Start the multi-video RTSP server"""
-        print("=" * 60)
-        print(f"Multi-Video RTSP Server")
-        print(f"Port: {self.port}")
-        print(f"Video Directory: {self.video_directory}")
-        print(f"Available Videos: {len(self.available_videos)}")
-        print("=" * 60)
+        if self.worker_id is None:
+            print("=" * 60)
+            print(f"Multi-Video RTSP Server")
+            print(f"Port: {self.port}")
+            print(f"Video Directory: {self.video_directory}")
+            print(f"Available Videos: {len(self.catalog)}")
+            print("=" * 60)
 
         rtsp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         rtsp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.worker_id is not None:
+            # Every worker listens on the same port, the kernel spreads connections across them
+            rtsp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         
         try:
             rtsp_socket.bind(('', self.port))
-            rtsp_socket.listen(10)  # Allow more concurrent connections
-            print(f"Server listening on port {self.port}")
-            print("Stream URLs:")
-            for video in self.available_videos:
-                print(f"  rtsp://localhost:{self.port}/{video}")
-            print("\nPress Ctrl+C to stop")
+            rtsp_socket.listen(128 if self.worker_id is not None else 10)
+            if self.worker_id is not None:
+                print(f"Worker {self.worker_id} (pid {os.getpid()}) listening on port {self.port}")
+            else:
+                print(f"Server listening on port {self.port}")
+                print("Stream URLs:")
+                for video in self.catalog.names()[:20]:
+                    print(f"  rtsp://localhost:{self.port}/{video}")
+                print("\nPress Ctrl+C to stop")
             
             while True:
-                print(f"\nWaiting for client... (Active: {len(self.active_clients)})")
+                if self.worker_id is None:
+                    print(f"\nWaiting for client... (Active: {len(self.active_clients)})")
                 client_socket, client_addr = rtsp_socket.accept()
                 client_id = f"{client_addr[0]}:{client_addr[1]}"
                 print(f"Client connected: {client_id}")
                 
                 # Handle each client in a separate thread
                 client_handler = MultiVideoClientHandler(
-                    client_socket, client_addr, self.available_videos, 
-                    self.video_directory, client_id
+                    client_socket, client_addr, self.catalog, 
+                    self.video_directory, client_id, self
                 )
                 
                 self.active_clients[client_id] = client_handler
@@ -91,6 +232,34 @@ class MultiVideoRTSPServer:
             print(f"Server error: {e}")
         finally:
             rtsp_socket.close()
+            self.catalog.stop()
+            self.session_timers.stop()
+            for sender in self.multicast_senders.values():
+                sender.close()
+            for broadcaster in self.broadcasters.values():
+                broadcaster.stop()
+
+    def rtcp_loop(self):
+        """Read RTCP from every session's server RTCP port, reports keep the session alive"""
+        while True:
+            try:
+                events = self.rtcp_selector.select(timeout=1.0)
+            except (OSError, ValueError):
+                # A socket was closed while registered, it is unregistered right after
+                time.sleep(0.1)
+                continue
+            for key, _ in events:
+                try:
+                    data, addr = key.fileobj.recvfrom(2048)
+                except OSError:
+                    continue
+                key.data.handle_rtcp(data, addr)
+
+    def expire_session(self, client_handler):
+        """Timer wheel callback: the session went idle or its client is unreachable"""
+        with self.stats_lock:
+            self.expired_sessions += 1
+        client_handler.expire()
 
     def handle_client_lifecycle(self, client_handler, client_id):
         """Handle client connection lifecycle"""
@@ -104,231 +273,455 @@ class MultiVideoRTSPServer:
 
 
 class MultiVideoClientHandler:
-    def __init__(self, client_socket, client_addr, available_videos, video_directory, client_id):
+    def __init__(self, client_socket, client_addr, catalog, video_directory, client_id, server):
         self.client_socket = client_socket
         self.client_addr = client_addr
-        self.available_videos = available_videos
+        self.catalog = catalog
         self.video_directory = video_directory
         self.client_id = client_id
+        self.server = server
         
         self.state = MultiVideoRTSPServer.INIT
         self.session_id = randint(100000, 999999)
+        self.ssrc = randint(0, 0xFFFFFFFF)
         
         # Current video being streamed
         self.current_video = None
-        self.video_stream = None
+        self.broadcaster = None
         self.rtp_socket = None
+        self.rtcp_socket = None
         self.rtp_port = None
-        self.send_event = None
-        self.worker_thread = None
+        self.multicast_sender = None  # Set for multicast sessions, which share the group's sender
+        self.unreachable = 0  # ICMP port-unreachable errors since the client was last heard from
+        self.seq_num = 0
+        # Patched per packet on the packet cache path: RTP header plus the send-time extension
+        self.rtp_header = bytearray(RTP_HEADER.size + SEND_TIME_EXTENSION.size)
+        self.rtp_packet = RtpPacket()  # Reused for every packet of the session
+        self.play_requested_at = None
+        self.switch_requested_at = None
+        self.send_lock = threading.Lock()
 
     def handle_client(self):
         """Handle RTSP requests from client"""
+        parser = RtspParser()
         try:
             while True:
-                data = self.client_socket.recv(1024)
+                data = self.client_socket.recv(4096)
                 if not data:
                     break
                 
-                request = data.decode("utf-8")
-                print(f"[{self.client_id}] Request: {request.split()[0] if request.split() else 'UNKNOWN'}")
-                self.process_request(request)
+                # A recv may hold part of a request or several pipelined ones
+                try:
+                    requests = parser.feed(data)
+                except RtspParseError as e:
+                    print(f"[{self.client_id}] Bad request: {e}")
+                    self.send_rtsp_reply(e.status, None)
+                    break
+                
+                for request in requests:
+                    print(f"[{self.client_id}] Request: {request.method} (CSeq {request.cseq})")
+                    self.process_request(request)
                 
         except Exception as e:
             print(f"[{self.client_id}] Client error: {e}")
         finally:
             self.cleanup()
 
-    def process_request(self, data):
-        """Process RTSP request with video selection support"""
-        request = data.split('\n')
-        line1 = request[0].split(' ')
-        request_type = line1[0]
+    def process_request(self, request):
+        """Dispatch a parsed RTSP request"""
+        handlers = {
+            MultiVideoRTSPServer.OPTIONS: self.handle_options,
+            MultiVideoRTSPServer.DESCRIBE: self.handle_describe,
+            MultiVideoRTSPServer.SETUP: self.handle_setup,
+            MultiVideoRTSPServer.PLAY: self.handle_play,
+            MultiVideoRTSPServer.PAUSE: self.handle_pause,
+            MultiVideoRTSPServer.TEARDOWN: self.handle_teardown,
+            MultiVideoRTSPServer.GET_PARAMETER: self.handle_get_parameter,
+            MultiVideoRTSPServer.LIST: self.handle_list,
+            MultiVideoRTSPServer.SWITCH: self.handle_switch,
+            MultiVideoRTSPServer.STATS: self.handle_stats,
+        }
+        handler = handlers.get(request.method)
+        if not handler:
+            self.send_rtsp_reply(MultiVideoRTSPServer.NOT_IMPLEMENTED_501, request)
+            return
         
-        # Extract requested video filename
-        requested_video = line1[1] if len(line1) > 1 else None
+        # Requests on an existing session must carry its id (the old newline clients send none)
+        if request.method in MultiVideoRTSPServer.SESSION_METHODS and request.session \
+                and request.session != str(self.session_id):
+            self.send_rtsp_reply(MultiVideoRTSPServer.SESSION_NOT_FOUND_454, request)
+            return
+        
+        # Any request on a live session counts as a keepalive (one session per connection)
+        if self.state != MultiVideoRTSPServer.INIT:
+            self.keepalive()
         
-        # Parse sequence number
-        seq = "1"
-        if len(request) > 1:
-            second_line = request[1].strip()
-            if second_line.isdigit():
-                seq = second_line
-
-        # Handle LIST command to return available videos
-        if request_type == "LIST":
-            self.handle_list(seq)
+        try:
+            handler(request)
+        except RtspParseError as e:
+            self.send_rtsp_reply(e.status, request)
+
+    def handle_options(self, request):
+        """Handle OPTIONS request - list supported methods"""
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {
+            'Public': ', '.join(MultiVideoRTSPServer.PUBLIC_METHODS),
+        })
+
+    def handle_describe(self, request):
+        """Handle DESCRIBE request - SDP for the requested video"""
+        entry = self.catalog.get(request.resource())
+        if not entry:
+            self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, request)
             return
+        
+        server_ip = self.client_socket.getsockname()[0]
+        sdp = build_sdp(self.session_id, server_ip, entry['name'], entry['fps'], entry['duration'],
+                        extensions=[(SEND_TIME_ID, SEND_TIME_URI)])
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {
+            'Content-Base': request.uri.rstrip('/') + '/',
+            'Content-Type': 'application/sdp',
+        }, sdp)
 
-        # Handle video selection/switching
-        if requested_video:
-            if requested_video in self.available_videos:
-                if self.current_video != requested_video:
-                    print(f"[{self.client_id}] Switching to video: {requested_video}")
-                    self.switch_video(requested_video)
-                self.current_video = requested_video
-            else:
-                # If video not found, use first available video
-                if self.available_videos:
-                    self.current_video = self.available_videos[0]
-                    print(f"[{self.client_id}] Video not found, using: {self.current_video}")
-
-        if request_type == MultiVideoRTSPServer.SETUP:
-            self.handle_setup(seq, request)
-        elif request_type == MultiVideoRTSPServer.PLAY:
-            self.handle_play(seq)
-        elif request_type == MultiVideoRTSPServer.PAUSE:
-            self.handle_pause(seq)
-        elif request_type == MultiVideoRTSPServer.TEARDOWN:
-            self.handle_teardown(seq)
-
-    def handle_list(self, seq):
+    def handle_get_parameter(self, request):
+        """Handle GET_PARAMETER request - used by clients as a session keepalive"""
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request)
+
+    def handle_list(self, request):
         """Handle LIST request - return available videos"""
-        try:
-            # Create response with video list
-            video_list = "\n".join(self.available_videos)
-            reply = f'RTSP/1.0 200 OK\nCSeq: {seq}\nContent-Type: text/plain\nContent-Length: {len(video_list)}\n\n{video_list}'
-            self.client_socket.send(reply.encode())
-            print(f"[{self.client_id}] LIST - Sent {len(self.available_videos)} videos")
-        except Exception as e:
-            print(f"[{self.client_id}] LIST error: {e}")
-            reply = f'RTSP/1.0 500 Internal Server Error\nCSeq: {seq}'
-            self.client_socket.send(reply.encode())
+        # Body is pre-encoded by the catalog, only the headers are built here
+        video_list = self.catalog.list_body()
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {'Content-Type': 'text/plain'}, video_list)
+        print(f"[{self.client_id}] LIST - Sent {len(self.catalog)} videos")
 
-    def switch_video(self, new_video):
-        """Switch to a different video during playback"""
-        if self.video_stream:
-            # Close current video stream
-            self.video_stream.close()
-        
-        # Open new video stream
-        try:
-            video_path = os.path.join(self.video_directory, new_video)
-            self.video_stream = VideoStream(video_path)
-            print(f"[{self.client_id}] Video switched to: {new_video}")
-        except Exception as e:
-            print(f"[{self.client_id}] Error switching video: {e}")
+    def handle_stats(self, request):
+        """Handle STATS request - return join/switch latency stats as key: value lines"""
+        stats = self.server.get_stats()
+        lines = [f"{key}: {stats[key]}" for key in ('worker', 'pid', 'clients', 'broadcasters', 'sessions',
+                                                     'expired_sessions', 'multicast_groups', 'multicast_viewers')]
+        lines += [f"{key}: {value}" for key, value in stats.items() if key.startswith(('packet_cache_', 'prefetch_'))]
+        for kind in ('join', 'switch'):
+            for key, value in stats[kind].items():
+                lines.append(f"{kind}_{key}: {value}")
+        body = "\n".join(lines).encode()
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {'Content-Type': 'text/plain'}, body)
 
-    def handle_setup(self, seq, request):
-        """Handle SETUP request"""
+    def handle_switch(self, request):
+        """Handle SWITCH request - move the session to another video's broadcaster"""
+        new_video = request.resource()
         if self.state == MultiVideoRTSPServer.INIT:
+            self.send_rtsp_reply(MultiVideoRTSPServer.INVALID_STATE_455, request)
+            return
+        if new_video not in self.catalog:
+            self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, request)
+            return
+        
+        if new_video != self.current_video:
             try:
-                # Use current video or first available
-                if not self.current_video and self.available_videos:
-                    self.current_video = self.available_videos[0]
-                
-                if not self.current_video:
-                    raise IOError("No video files available")
-                
-                video_path = os.path.join(self.video_directory, self.current_video)
-                self.video_stream = VideoStream(video_path)
-                self.state = MultiVideoRTSPServer.READY
-                
-                # Parse RTP port
-                self.rtp_port = 25000  # default
-                for line in request:
-                    if 'RTP/UDP' in line:
-                        parts = line.split()
-                        for part in parts:
-                            if part.isdigit() and int(part) > 1024:
-                                self.rtp_port = int(part)
-                                break
-                        break
-                
-                self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, seq)
-                print(f"[{self.client_id}] SETUP successful")
-                print(f"  Video: {self.current_video}")
-                print(f"  RTP Port: {self.rtp_port}")
-                
+                self.switch_video(new_video)
             except IOError as e:
-                self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, seq)
-                print(f"[{self.client_id}] SETUP failed: {e}")
+                print(f"[{self.client_id}] Error switching video: {e}")
+                self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, request)
+                return
+        # A multicast client has to move to the new video's group
+        headers = {'Transport': self.multicast_sender.transport()} if self.multicast_sender else None
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, headers)
+
+
+    def switch_video(self, new_video):
+        """Re-subscribe to another shared broadcaster, no file is reopened"""
+        if self.multicast_sender:
+            sender = self.server.get_multicast_sender(new_video)
+            self.leave_stream()
+            self.current_video = new_video
+            self.broadcaster = sender.broadcaster
+            self.multicast_sender = sender
+            if self.state == MultiVideoRTSPServer.PLAYING:
+                self.join_stream()
+            print(f"[{self.client_id}] Video switched to: {new_video} (group {sender.group})")
+            return
+        
+        broadcaster = self.server.get_broadcaster(new_video)
+        old_broadcaster = self.broadcaster
+        
+        # From here send_frame drops frames from the old broadcaster, so the switch
+        # lands on a frame boundary; subscribe replays the new GOP cache right away
+        self.current_video = new_video
+        self.broadcaster = broadcaster
+        if self.state == MultiVideoRTSPServer.PLAYING:
+            self.switch_requested_at = time.time()
+            broadcaster.subscribe(self)
+        if old_broadcaster:
+            old_broadcaster.unsubscribe(self)
+        print(f"[{self.client_id}] Video switched to: {new_video}")
+
+    def join_stream(self):
+        """Start receiving frames: subscribe (unicast) or join the group's sender (multicast)"""
+        if self.multicast_sender:
+            self.multicast_sender.add(self)
+            return 0
+        return self.broadcaster.subscribe(self)
 
-    def handle_play(self, seq):
+    def leave_stream(self):
+        if self.multicast_sender:
+            self.multicast_sender.remove(self)
+        elif self.broadcaster:
+            self.broadcaster.unsubscribe(self)
+
+    def handle_setup(self, request):
+        """Handle SETUP request"""
+        if self.state != MultiVideoRTSPServer.INIT:
+            self.send_rtsp_reply(MultiVideoRTSPServer.INVALID_STATE_455, request)
+            return
+        
+        video = request.resource()
+        if video not in self.catalog:
+            if not request.legacy or not len(self.catalog):
+                self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, request)
+                print(f"[{self.client_id}] SETUP failed: {video} not found")
+                return
+            # Old clients fall back to the first available video
+            video = self.catalog.first()
+            print(f"[{self.client_id}] Video not found, using: {video}")
+        
+        # UDP only: RTP/AVP or RTP/AVP/UDP, unicast with client_port or multicast
+        transport = request.transport()
+        if not transport['profile'].startswith('RTP/AVP') or 'TCP' in transport['profile']:
+            self.send_rtsp_reply(MultiVideoRTSPServer.UNSUPPORTED_TRANSPORT_461, request)
+            return
+        if 'multicast' in transport:
+            if self.server.worker_id is not None:
+                # Each worker would send its own copy to the group
+                self.send_rtsp_reply(MultiVideoRTSPServer.UNSUPPORTED_TRANSPORT_461, request)
+                return
+            self.setup_multicast(request, video)
+            return
+        if 'client_port' not in transport:
+            self.send_rtsp_reply(MultiVideoRTSPServer.UNSUPPORTED_TRANSPORT_461, request)
+            return
+        
+        try:
+            self.broadcaster = self.server.get_broadcaster(video)
+        except IOError as e:
+            self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, request)
+            print(f"[{self.client_id}] SETUP failed: {e}")
+            return
+        
+        self.current_video = video
+        self.multicast_sender = None
+        self.rtp_port = transport['client_port'][0]
+        # SETUP again after TEARDOWN on the same connection replaces the old sockets
+        self.close_media_sockets()
+        rtp_socket, rtcp_socket = self.bind_port_pair()
+        # Connected, so an ICMP port unreachable from the client shows up as ECONNREFUSED on send
+        rtp_socket.connect((self.client_addr[0], self.rtp_port))
+        server_port = rtp_socket.getsockname()[1]
+        with self.send_lock:
+            self.rtp_socket = rtp_socket
+            self.rtcp_socket = rtcp_socket
+            self.unreachable = 0
+        if rtcp_socket:
+            self.server.rtcp_selector.register(rtcp_socket, selectors.EVENT_READ, self)
+        self.state = MultiVideoRTSPServer.READY
+        self.server.session_timers.schedule(self, self.server.session_timeout, self.server.expire_session)
+        
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {
+            'Transport': f"RTP/AVP;unicast;client_port={self.rtp_port}-{transport['client_port'][1]};"
+                         f"server_port={server_port}-{server_port + 1};ssrc={self.ssrc:08X}",
+        })
+        print(f"[{self.client_id}] SETUP successful")
+        print(f"  Video: {self.current_video}")
+        print(f"  RTP Port: {self.rtp_port}")
+
+    def setup_multicast(self, request, video):
+        """SETUP for multicast: the server picks the video's group, the client joins it"""
+        try:
+            sender = self.server.get_multicast_sender(video)
+        except IOError as e:
+            self.send_rtsp_reply(MultiVideoRTSPServer.FILE_NOT_FOUND_404, request)
+            print(f"[{self.client_id}] SETUP failed: {e}")
+            return
+        
+        self.close_media_sockets()
+        self.current_video = video
+        self.broadcaster = sender.broadcaster
+        self.multicast_sender = sender
+        self.state = MultiVideoRTSPServer.READY
+        # No unicast RTP/RTCP here, so only requests keep the session alive
+        self.server.session_timers.schedule(self, self.server.session_timeout, self.server.expire_session)
+        
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {'Transport': sender.transport()})
+        print(f"[{self.client_id}] SETUP successful (multicast)")
+        print(f"  Video: {video}")
+        print(f"  Group: {sender.group}:{sender.port}")
+
+    def bind_port_pair(self):
+        """Bind RTP on an even port and RTCP on the next one, RTCP is None if no pair was free"""
+        for _ in range(20):
+            rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            rtp_socket.bind(('', 0))
+            port = rtp_socket.getsockname()[1]
+            if port % 2 == 0 and port < 65535:
+                rtcp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                try:
+                    rtcp_socket.bind(('', port + 1))
+                    return rtp_socket, rtcp_socket
+                except OSError:
+                    rtcp_socket.close()
+            rtp_socket.close()
+        
+        rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rtp_socket.bind(('', 0))
+        return rtp_socket, None
+
+    def handle_play(self, request):
         """Handle PLAY request"""
-        if self.state == MultiVideoRTSPServer.READY:
+        if self.state == MultiVideoRTSPServer.PLAYING:
+            # Already playing, some clients re-send PLAY
+            self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request)
+        elif self.state == MultiVideoRTSPServer.READY:
             self.state = MultiVideoRTSPServer.PLAYING
             
-            # Create RTP socket
-            self.rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            
-            # Start streaming thread
-            self.send_event = threading.Event()
-            self.worker_thread = threading.Thread(target=self.send_rtp)
-            self.worker_thread.daemon = True
-            self.worker_thread.start()
-            
-            self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, seq)
-            print(f"[{self.client_id}] PLAY - Streaming: {self.current_video}")
+            # Reply first, then join the broadcast - the GOP cache is sent right away
+            self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request, {'Range': 'npt=now-'})
+            self.play_requested_at = time.time()
+            cached = self.join_stream()
+            print(f"[{self.client_id}] PLAY - Streaming: {self.current_video} ({cached} cached frames replayed)")
+        else:
+            self.send_rtsp_reply(MultiVideoRTSPServer.INVALID_STATE_455, request)
 
-    def handle_pause(self, seq):
+    def handle_pause(self, request):
         """Handle PAUSE request"""
+        if self.state == MultiVideoRTSPServer.INIT:
+            self.send_rtsp_reply(MultiVideoRTSPServer.INVALID_STATE_455, request)
+            return
+        
         if self.state == MultiVideoRTSPServer.PLAYING:
             self.state = MultiVideoRTSPServer.READY
-            
-            if self.send_event:
-                self.send_event.set()
-            
-            self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, seq)
-            print(f"[{self.client_id}] PAUSE")
+            self.leave_stream()
+        
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request)
+        print(f"[{self.client_id}] PAUSE")
 
-    def handle_teardown(self, seq):
+    def handle_teardown(self, request):
         """Handle TEARDOWN request"""
-        if self.send_event:
-            self.send_event.set()
+        self.leave_stream()
         
+        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, request)
         self.state = MultiVideoRTSPServer.INIT
-        self.send_rtsp_reply(MultiVideoRTSPServer.OK_200, seq)
+        self.server.session_timers.cancel(self)
+        self.close_media_sockets()
         print(f"[{self.client_id}] TEARDOWN")
 
-    def send_rtp(self):
-        """Send RTP packets with continuous looping"""
-        frame_delay = 0.04  # 25 FPS (40ms delay)
-        
-        while True:
-            if self.send_event and self.send_event.wait(frame_delay):
-                break
+
+    def send_frame(self, data, broadcaster):
+        """Send one frame from the broadcaster as an RTP packet"""
+        with self.send_lock:
+            if not self.rtp_socket or broadcaster is not self.broadcaster:
+                # Closed, or a late frame from the video we just switched away from
+                return
+            # Per-client sequence number, keeps increasing across loops and video switches
+            self.seq_num = (self.seq_num + 1) & 0xFFFF
+            
+            # The send time also goes out as an RFC 8285 extension, clients measure latency with it
+            now = time.time()
+            timestamp = int(now * RTP_CLOCK) & 0xFFFFFFFF
             
-            if self.video_stream:
-                data = self.video_stream.nextFrame()
-                if data:
-                    frame_number = self.video_stream.frameNbr()
-                    rtp_packet = self.make_rtp(data, frame_number)
-                    
-                    try:
-                        self.rtp_socket.sendto(rtp_packet, (self.client_addr[0], self.rtp_port))
-                    except Exception as e:
-                        print(f"[{self.client_id}] RTP send error: {e}")
-                        break
+            try:
+                if self.server.packet_cache:
+                    # Patch this session's header and send it with the cached payload, no concatenation
+                    RTP_HEADER.pack_into(self.rtp_header, 0, 0x90, MJPEG_TYPE, self.seq_num, timestamp, self.ssrc)
+                    SEND_TIME_EXTENSION.pack_into(self.rtp_header, RTP_HEADER.size, ONE_BYTE_PROFILE, 3,
+                                                  (SEND_TIME_ID << 4) | 7, to_ntp64(now))
+                    self.rtp_socket.sendmsg([self.rtp_header, data])
                 else:
-                    # If no frame data, video might have ended - let VideoStream handle looping
-                    continue
+                    self.rtp_packet.encode(2, 0, 0, 0, self.seq_num, 0, MJPEG_TYPE, self.ssrc, data,
+                                           timestamp=timestamp, extension_profile=ONE_BYTE_PROFILE,
+                                           extension_data=send_time_extension(now))
+                    self.rtp_socket.sendmsg(self.rtp_packet.buffers())
+            except OSError as e:
+                if e.errno == errno.ECONNREFUSED:
+                    # ICMP port unreachable for an earlier packet: nobody is listening any more
+                    self.unreachable += 1
+                    if self.unreachable == MAX_UNREACHABLE:
+                        print(f"[{self.client_id}] RTP port {self.rtp_port} unreachable, expiring session")
+                        # Expired from the timer thread, this may run under the broadcaster's lock
+                        self.server.session_timers.expire_now(self)
+                else:
+                    print(f"[{self.client_id}] RTP send error: {e}")
+                return
+            
+            if self.play_requested_at:
+                join_ms = (time.time() - self.play_requested_at) * 1000
+                self.play_requested_at = None
+                self.server.record_latency('join', join_ms)
+                print(f"[{self.client_id}] First frame {join_ms:.1f}ms after PLAY")
+            
+            if self.switch_requested_at:
+                switch_ms = (time.time() - self.switch_requested_at) * 1000
+                self.switch_requested_at = None
+                self.server.record_latency('switch', switch_ms)
+                print(f"[{self.client_id}] Switched in {switch_ms:.1f}ms")
+
+    def send_rtsp_reply(self, code, request, headers=None, body=b''):
+        """Send RTSP reply, echoing the request's CSeq"""
+        reply_headers = {}
+        # Session right after CSeq, the old clients read it from the third line
+        if code == MultiVideoRTSPServer.OK_200 and (self.state != MultiVideoRTSPServer.INIT
+                                                   or (request and request.method == MultiVideoRTSPServer.SETUP)):
+            reply_headers['Session'] = str(self.session_id)
+            if request and not request.legacy:
+                reply_headers['Session'] += f";timeout={self.server.session_timeout}"
+        reply_headers.update(headers or {})
+        
+        cseq = request.cseq if request else '0'
+        self.client_socket.sendall(format_response(code, cseq, reply_headers, body))
 
-    def make_rtp(self, payload, frame_nbr):
-        """Create RTP packet"""
-        rtp_packet = RtpPacket()
-        rtp_packet.encode(2, 0, 0, 0, frame_nbr, 0, MJPEG_TYPE, 0, payload)
-        return rtp_packet.getPacket()
-
-    def send_rtsp_reply(self, code, seq):
-        """Send RTSP reply"""
-        if code == MultiVideoRTSPServer.OK_200:
-            reply = f'RTSP/1.0 200 OK\nCSeq: {seq}\nSession: {self.session_id}'
-            self.client_socket.send(reply.encode())
-        elif code == MultiVideoRTSPServer.FILE_NOT_FOUND_404:
-            reply = f'RTSP/1.0 404 NOT FOUND\nCSeq: {seq}'
-            self.client_socket.send(reply.encode())
+
+    def handle_rtcp(self, data, addr):
+        """RTCP from the client: a sender or receiver report refreshes the session"""
+        if addr[0] != self.client_addr[0] or len(data) < 8 or data[0] >> 6 != 2:
+            return
+        # A compound RTCP packet always starts with an SR or RR
+        if data[1] in (RTCP_SR, RTCP_RR):
+            self.keepalive()
+
+    def keepalive(self):
+        # The kernel reports at most one ICMP error per send, and the next send succeeds,
+        # so errors are counted until the client shows it is alive rather than in a row
+        self.unreachable = 0
+        self.server.session_timers.touch(self)
+
+    def expire(self):
+        """Reap an idle or unreachable session: release the broadcaster and drop the connection"""
+        print(f"[{self.client_id}] Session {self.session_id} expired")
+        self.state = MultiVideoRTSPServer.INIT
+        self.leave_stream()
+        self.close_media_sockets()
+        try:
+            # Wakes the handler thread (blocked in recv, or in sendall to a client that stopped reading)
+            self.client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close_media_sockets(self):
+        with self.send_lock:
+            rtp_socket, self.rtp_socket = self.rtp_socket, None
+            rtcp_socket, self.rtcp_socket = self.rtcp_socket, None
+        if rtcp_socket:
+            try:
+                self.server.rtcp_selector.unregister(rtcp_socket)
+            except (KeyError, ValueError):
+                pass
+            rtcp_socket.close()
+        if rtp_socket:
+            rtp_socket.close()
 
     def cleanup(self):
         """Clean up resources"""
-        if self.send_event:
-            self.send_event.set()
-        
-        if self.rtp_socket:
-            self.rtp_socket.close()
+        self.server.session_timers.cancel(self)
+        self.leave_stream()
         
-        if self.video_stream:
-            self.video_stream.close()
+        self.close_media_sockets()
         
         if self.client_socket:
             self.client_socket.close()
@@ -337,16 +730,36 @@ class MultiVideoClientHandler:
 
 
 def main():
-    video_directory = sys.argv[1] if len(sys.argv) > 1 else "./"
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8554
+    parser = argparse.ArgumentParser(description="Multi-video RTSP server")
+    parser.add_argument('video_directory', nargs='?', default="./")
+    parser.add_argument('port', nargs='?', type=int, default=8554)
+    parser.add_argument('session_timeout', nargs='?', type=int, default=SESSION_TIMEOUT)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes sharing the port (SO_REUSEPORT) with shared-memory frame rings")
+    parser.add_argument('--fps', type=float, help="Send every video at this frame rate (for benchmarks)")
+    parser.add_argument('--packet-cache-mb', type=int, default=0,
+                        help="Keep packetized videos in memory, up to this many MB (0 = read the files)")
+    parser.add_argument('--prefetch-frames', type=int, default=DEFAULT_MAX_FRAMES,
+                        help="Frames read ahead of each video's frame loop")
+    parser.add_argument('--prefetch-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="Cap on the bytes read ahead per video")
+    args = parser.parse_args()
+    
+    prefetch_bytes = int(args.prefetch_mb * 1024 * 1024)
+    if args.workers > 1:
+        from PreforkServer import PreforkServer
+        PreforkServer(args.video_directory, args.port, args.workers, args.session_timeout, fps=args.fps,
+                      prefetch_frames=args.prefetch_frames, prefetch_bytes=prefetch_bytes).run()
+        return
     
     # Start the multi-video server
-    server = MultiVideoRTSPServer(video_directory, port)
+    server = MultiVideoRTSPServer(args.video_directory, args.port, args.session_timeout, fps=args.fps,
+                                  packet_cache_bytes=args.packet_cache_mb * 1024 * 1024,
+                                  prefetch_frames=args.prefetch_frames, prefetch_bytes=prefetch_bytes)
     
-    if not server.available_videos:
-        print("No .Mjpeg video files found in directory!")
-        print("Please add some MJPEG video files and try again.")
-        return
+    if not len(server.catalog):
+        print("No .Mjpeg video files found in directory yet!")
+        print("Files added while the server runs are picked up automatically.")
     
     server.start_server()
 
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+# encoder_profiles.py lives in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import encoder_profiles
+from encoder_profiles import ENCODE_PROFILES, video_args
+
+SOURCES = [
+    {'fps': 25.0, 'width': 1280, 'height': 720, 'has_audio': False},
+    {'fps': 29.97, 'width': 1920, 'height': 1080, 'has_audio': True},
+    {'fps': 60.0, 'width': 1920, 'height': 1080, 'has_audio': False},
+]
+
+
+def arg(args, name):
+    return args[args.index(name) + 1]
+
+
+def test_forced_keyframes_shorter_than_gop():
+    """Every profile forces keyframes more often than its GOP"""
+    for name, profile in ENCODE_PROFILES.items():
+        assert profile['keyframe_seconds'] < profile['gop_seconds'], name
+        for source in SOURCES:
+            args = video_args(name, source, threads=1)
+            gop = int(arg(args, '-g'))
+            forced = float(arg(args, '-force_key_frames').rsplit('*', 1)[1].rstrip(')'))
+            assert forced == profile['keyframe_seconds'], (name, source['fps'])
+            assert forced * source['fps'] < gop, (name, source['fps'])
+            assert int(arg(args, '-keyint_min')) <= gop, (name, source['fps'])
+
+
+def test_keyframe_interval_capped_by_gop():
+    """A keyframe_seconds longer than the GOP falls back to the GOP"""
+    profile = dict(ENCODE_PROFILES['latency'], keyframe_seconds=5.0)
+    assert encoder_profiles.keyframe_interval(profile, 30.0) == encoder_profiles.gop_size(profile, 30.0)
+
+
+if __name__ == "__main__":
+    test_forced_keyframes_shorter_than_gop()
+    test_keyframe_interval_capped_by_gop()
+    print("encoder profile tests passed")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from FrameRing import FrameRing, RingBroadcaster, ring_name, SLOT_HEADER
+
+JPEG_SOI = b'\xff\xd8'
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def frame(number, size=32):
+    """A keyframe whose bytes all identify it"""
+    return JPEG_SOI + bytes([number % 256]) * (size - 2)
+
+
+def open_ring(name, slot_count=4, slot_size=64):
+    """Coordinator-side ring plus a reader attached to the same shared memory"""
+    writer = FrameRing.create(ring_name(os.getpid(), name), slot_count, slot_size, 0.04)
+    return writer, FrameRing.attach(writer.shm.name)
+
+
+class Recorder:
+    """Subscriber keeping a copy of every frame, optionally running a hook mid-send"""
+
+    def __init__(self, during_send=None):
+        self.frames = []
+        self.during_send = during_send
+
+    def send_frame(self, data, broadcaster):
+        if self.during_send:
+            self.during_send()
+        self.frames.append(bytes(data))
+
+
+def test_write_read():
+    """Frames written by the coordinator are read back from another mapping"""
+    print("1. Write/read...")
+    writer, reader = open_ring('write-read')
+    try:
+        for number in range(3):
+            writer.write(frame(number))
+        check("counter shared", reader.written() == 3)
+        check("frames read back", [bytes(reader.read(n)) for n in range(3)] == [frame(n) for n in range(3)])
+        check("unwritten frame is None", reader.read(3) is None)
+        check("oversized frame refused", not writer.write(frame(9, size=100)) and writer.oversized == 1
+              and reader.written() == 3)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_torn_write():
+    """A reader detects a slot that is being, or has been, rewritten under it"""
+    print("2. Torn writes...")
+    writer, reader = open_ring('torn')
+    try:
+        writer.write(frame(0))
+        view = reader.read(0)
+        check("valid before the writer laps it", reader.still_valid(0))
+
+        # The writer comes round to slot 0 again and is paused mid-copy
+        for number in range(1, 4):
+            writer.write(frame(number))
+        offset = writer._slot(4)
+        SLOT_HEADER.pack_into(writer.buf, offset, 0, 32)
+        writer.buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + 16] = frame(4)[:16]
+        check("half-written slot is not readable", reader.read(4) is None and reader.read(0) is None)
+        check("old frame reported overwritten", not reader.still_valid(0))
+        check("view held by the reader is torn", bytes(view) != frame(0))
+        del view
+
+        writer.write(frame(4))
+        check("finished write readable", bytes(reader.read(4)) == frame(4) and reader.still_valid(4))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_broadcaster():
+    """RingBroadcaster counts frames overwritten while they were being sent"""
+    print("3. RingBroadcaster...")
+    writer, reader = open_ring('broadcaster')
+    try:
+        broadcaster = RingBroadcaster(reader, worker_id=0)
+        steady = Recorder()
+        broadcaster.subscribe(steady)
+        writer.write(frame(0))
+        writer.write(frame(1))
+        check("new frames pumped in order", broadcaster.pump() and steady.frames == [frame(0), frame(1)])
+        check("no torn frames", broadcaster.torn_frames == 0)
+        broadcaster.unsubscribe(steady)
+
+        # A send slow enough for the writer to lap the ring underneath it
+        slow = Recorder()
+        broadcaster.subscribe(slow)
+        slow.during_send = lambda: [writer.write(frame(n)) for n in range(10, 14)]
+        writer.write(frame(2))
+        broadcaster.pump()
+        check("torn frame counted", broadcaster.torn_frames == 1)
+        check("copy made during the lap is torn", slow.frames[-1] != frame(2))
+
+        slow.during_send = None
+        broadcaster.pump()
+        check("lapped reader skips to the newest frame", slow.frames[-1] == frame(13) and broadcaster.torn_frames == 1)
+        check("reader flag follows subscribers", reader.has_readers())
+        broadcaster.stop()
+        check("flag cleared on stop", not writer.has_readers())
+    finally:
+        reader.close()
+        writer.close()
+
+
+def main():
+    print("=" * 60)
+    print("FrameRing Test")
+    print("=" * 60)
+    tests = [test_write_read, test_torn_write, test_broadcaster]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
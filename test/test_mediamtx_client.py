@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import socket
+
+# mediamtx_client.py and fake_mediamtx.py live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_mediamtx import FakeMediaMTX
+from mediamtx_client import MediaMTXClient, MediaMTXError
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def test_paths():
+    """replace_path creates or overwrites a path, delete_path removes it"""
+    print("1. Path create/delete...")
+    fake = FakeMediaMTX(port=free_port()).start()
+    client = MediaMTXClient('127.0.0.1', fake.port)
+    try:
+        check("API is alive", client.is_alive())
+
+        client.replace_path('cam1', {'source': 'publisher'})
+        check("path created", fake.path_configs.get('cam1') == {'source': 'publisher'})
+        client.replace_path('cam1', {'source': 'publisher', 'overridePublisher': True})
+        check("path overwritten", fake.path_configs['cam1'].get('overridePublisher') is True)
+
+        fake.set_path_state('cam1', ready=True, readers=2, bytes_received=4096)
+        stats = client.list_paths().get('cam1')
+        check("listed with publish state and readers",
+              stats and stats['ready'] and stats['readers'] == 2 and stats['bytes_received'] == 4096)
+        check("get_path matches", client.get_path('cam1') == stats)
+
+        check("delete_path True for a known path", client.delete_path('cam1') is True)
+        check("path removed", 'cam1' not in fake.path_configs and 'cam1' not in client.list_paths())
+        check("delete_path False when already gone", client.delete_path('cam1') is False)
+        check("get_path None when unknown", client.get_path('cam1') is None)
+    finally:
+        fake.stop()
+
+
+def test_unreachable():
+    """A stopped API raises MediaMTXError instead of a requests exception"""
+    print("2. Unreachable API...")
+    client = MediaMTXClient('127.0.0.1', free_port(), timeout=1)
+    check("not alive", not client.is_alive())
+    try:
+        client.replace_path('cam1')
+        check("replace_path raises MediaMTXError", False)
+    except MediaMTXError as e:
+        check("replace_path raises MediaMTXError", e.status_code is None)
+
+
+def test_paging():
+    """list_paths follows pageCount"""
+    print("3. Paging...")
+    fake = FakeMediaMTX(port=free_port()).start()
+    client = MediaMTXClient('127.0.0.1', fake.port)
+    try:
+        for index in range(25):
+            client.replace_path(f'cam{index}')
+        check("all pages read", len(client.list_paths(items_per_page=10)) == 25)
+    finally:
+        fake.stop()
+
+
+def main():
+    print("=" * 60)
+    print("MediaMTX Client Test")
+    print("=" * 60)
+    tests = [test_paths, test_unreachable, test_paging]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
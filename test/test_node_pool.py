@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import socket
+
+# node_pool.py and fake_mediamtx.py live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_mediamtx import FakeMediaMTX
+from node_pool import NodePool, MediaMTXNode, NoNodeAvailable
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def start_pool(count=2):
+    """A NodePool over count fake MediaMTX APIs, returns (pool, {node name: fake})"""
+    fakes = {f'node{i}': FakeMediaMTX(port=free_port()).start() for i in range(count)}
+    pool = NodePool([MediaMTXNode(name, '127.0.0.1', api_port=fake.port) for name, fake in fakes.items()])
+    for node in pool.nodes.values():
+        node.client.timeout = 1
+    return pool, fakes
+
+
+def place_with_path(pool, stream_name):
+    # What main.prepare_rtsp_path does with MEDIAMTX_MANAGE_PATHS
+    node = pool.place(stream_name)
+    node.client.replace_path(stream_name, {'source': 'publisher'})
+    return node
+
+
+def test_place():
+    """Streams spread over nodes and keep their node while it is healthy"""
+    print("1. Placement...")
+    pool, fakes = start_pool()
+    try:
+        first = pool.place('cam1')
+        second = pool.place('cam2')
+        check("second stream on the other node", first is not second)
+        check("placement is sticky", pool.place('cam1') is first)
+        check("release frees the slot", pool.release('cam1') is first and not first.streams)
+
+        for node in pool.nodes.values():
+            node.max_streams = 1
+        pool.place('cam1')
+        try:
+            pool.place('cam3')
+            check("full pool raises NoNodeAvailable", False)
+        except NoNodeAvailable:
+            check("full pool raises NoNodeAvailable", True)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+
+
+def test_unhealthy_move():
+    """A stream placed again while its node is down moves, and its old path is deleted once the node is back"""
+    print("2. Unhealthy node...")
+    pool, fakes = start_pool()
+    try:
+        old = place_with_path(pool, 'cam1')
+        old_fake = fakes[old.name]
+
+        old_fake.stop()
+        pool.check_health()
+        check("node marked unhealthy", not old.healthy)
+
+        new = place_with_path(pool, 'cam1')
+        check("stream moved to the healthy node", new is not old and pool.node_for('cam1') is new)
+        check("old node remembers the stale path", old.stale == {'cam1'} and not old.streams)
+        check("nothing deleted while the node is down", pool.delete_stale() == [] and old.stale == {'cam1'})
+
+        old_fake.start()  # Same port, its config survived the outage
+        pool.check_health()
+        check("node healthy again", old.healthy)
+        check("stale path still configured", 'cam1' in old_fake.path_configs)
+        check("delete_stale removes it", pool.delete_stale() == [(old.name, 'cam1')])
+        check("path gone from the old node", 'cam1' not in old_fake.path_configs and not old.stale)
+        check("path kept on the new node", 'cam1' in fakes[new.name].path_configs)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+
+
+def test_placed_back():
+    """A stream that returns to its old node before the cleanup keeps its path there"""
+    print("3. Placed back...")
+    pool, fakes = start_pool()
+    try:
+        old = place_with_path(pool, 'cam1')
+        fakes[old.name].stop()
+        pool.check_health()
+        new = place_with_path(pool, 'cam1')
+
+        fakes[old.name].start()
+        fakes[new.name].stop()
+        pool.check_health()
+        back = place_with_path(pool, 'cam1')
+        check("stream back on its old node", back is old)
+        check("old node no longer stale", not old.stale and new.stale == {'cam1'})
+        check("nothing to delete on the live node", pool.delete_stale() == [])
+        check("live path kept", 'cam1' in fakes[old.name].path_configs)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+
+
+def main():
+    print("=" * 60)
+    print("NodePool Test")
+    print("=" * 60)
+    tests = [test_place, test_unhealthy_move, test_placed_back]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
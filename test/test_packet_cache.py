@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import tempfile
+from PacketCache import PacketCache, PacketizedVideo
+
+FRAMES = 10
+FRAME_SIZE = 1000
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def write_video(directory, name, frames=FRAMES, frame_size=FRAME_SIZE, fill=b'x'):
+    """An .Mjpeg file: each frame is a 5-digit length then the payload"""
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as handle:
+        for number in range(frames):
+            payload = b'\xff\xd8' + bytes([number]) + fill * (frame_size - 3)
+            handle.write(b'%05d' % len(payload) + payload)
+    return path
+
+
+def video_size(frames=FRAMES, frame_size=FRAME_SIZE):
+    # File bytes plus the offset (8 bytes) and length (4 bytes) tables
+    return frames * (5 + frame_size) + frames * 12
+
+
+def test_packetize():
+    """Frames come back as memoryviews of the payloads"""
+    print("1. Packetize...")
+    directory = tempfile.mkdtemp(prefix='test-packet-cache-')
+    video = PacketizedVideo(write_video(directory, 'a.Mjpeg'))
+    check("every frame indexed", len(video) == FRAMES)
+    check("payload without the length header", bytes(video.frame(3)[:3]) == b'\xff\xd8\x03'
+          and len(video.frame(3)) == FRAME_SIZE)
+    check("size counts the tables", video.size == video_size())
+
+
+def test_eviction():
+    """The least recently used video is evicted once the budget is exceeded"""
+    print("2. LRU eviction...")
+    directory = tempfile.mkdtemp(prefix='test-packet-cache-')
+    paths = {name: write_video(directory, f'{name}.Mjpeg') for name in 'abc'}
+    cache = PacketCache(2 * video_size() + 100)  # Room for two videos
+
+    check("first lookup is a miss", cache.get(paths['a']) is not None and cache.stats()['misses'] == 1)
+    cache.get(paths['b'])
+    hits, misses = cache.stats()['hits'], cache.stats()['misses']
+    check("a is now a hit", cache.get(paths['a']) is not None
+          and cache.stats()['hits'] == hits + 1 and cache.stats()['misses'] == misses)
+
+    cache.get(paths['c'])
+    stats = cache.stats()
+    check("one eviction", stats['evictions'] == 1 and stats['videos'] == 2)
+    check("budget respected", stats['bytes'] <= cache.max_bytes)
+    check("b (least recently used) evicted", cache.lookup(paths['a'])[0] and cache.lookup(paths['c'])[0])
+    misses = cache.stats()['misses']
+    cache.get(paths['b'])
+    check("b packetized again", cache.stats()['misses'] == misses + 1 and cache.stats()['evictions'] == 2)
+
+
+def test_rejected():
+    """Videos over the whole budget count one miss and are not tried again until they change"""
+    print("3. Oversized and changed files...")
+    directory = tempfile.mkdtemp(prefix='test-packet-cache-')
+    path = write_video(directory, 'big.Mjpeg')
+    cache = PacketCache(video_size() // 2)
+
+    check("oversized video not cached", cache.lookup(path) == (None, None))
+    cache.lookup(path)
+    check("rejection remembered, one miss", cache.stats()['misses'] == 1 and not cache.loading)
+
+    cache.max_bytes = 2 * video_size()
+    check("still rejected while unchanged", cache.get(path) is None)
+    write_video(directory, 'big.Mjpeg', fill=b'y')
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    video = cache.get(path)
+    check("rewritten file packetized again", video is not None and bytes(video.frame(0)[-1:]) == b'y')
+
+
+def test_background():
+    """lookup() never blocks: a miss returns an event set once the video is ready"""
+    print("4. Background packetization...")
+    directory = tempfile.mkdtemp(prefix='test-packet-cache-')
+    path = write_video(directory, 'a.Mjpeg')
+    cache = PacketCache(2 * video_size())
+
+    video, ready = cache.lookup(path)
+    check("miss returns an event", video is None and ready is not None)
+    check("packetized in time", ready.wait(5))
+    video, ready = cache.lookup(path)
+    check("then a hit", video is not None and ready is None and cache.stats()['misses'] == 1)
+    check("missing file is not cached", cache.lookup(os.path.join(directory, 'missing.Mjpeg')) == (None, None))
+
+
+def main():
+    print("=" * 60)
+    print("PacketCache Test")
+    print("=" * 60)
+    tests = [test_packetize, test_eviction, test_rejected, test_background]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import socket
+import threading
+
+# rebalancer.py, node_pool.py, stream_manager.py and fake_mediamtx.py live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_mediamtx import FakeMediaMTX
+from node_pool import NodePool, MediaMTXNode
+from rebalancer import Rebalancer, MigrationError
+from stream_manager import StreamManager
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+class FakeProcess:
+    """Stands in for an FFmpeg Popen, logging when it is stopped"""
+
+    next_pid = 2000
+
+    def __init__(self, log):
+        FakeProcess.next_pid += 1
+        self.pid = FakeProcess.next_pid
+        self.log = log
+        self.returncode = None
+        self.exited = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.exited.wait(timeout)
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.log.append(('stop', self.pid))
+        self.returncode = -15
+        self.exited.set()
+
+
+class Cluster:
+    """Two fake MediaMTX nodes, a StreamManager and a Rebalancer, with one ordered log of what happened"""
+
+    def __init__(self, publishes=True, keyframe_timeout=3):
+        self.log = []
+        self.launched = []  # Processes started by migrations
+        self.publishes = publishes  # Whether a migration's new publisher ever produces media
+        self.fakes = {f'node{i}': FakeMediaMTX(port=free_port()).start() for i in range(2)}
+        self.pool = NodePool([MediaMTXNode(name, '127.0.0.1', api_port=fake.port) for name, fake in self.fakes.items()])
+        self.manager = StreamManager('127.0.0.1', 8554, launcher=self.launch_first, prepare=self.prepare)
+        self.rebalancer = Rebalancer(self.pool, self.manager, self.launch, lambda on_demand: {'source': 'publisher'},
+                                     keyframe_timeout=keyframe_timeout, poll_interval=0.05)
+
+        # Record when the advertised URL flips and whether the old publisher was still up then
+        replace_process = self.manager.replace_process
+
+        def logged_replace(stream_name, process, rtsp_url, node):
+            old = self.manager._streams[stream_name]['process']
+            self.log.append(('flip', node, old.poll() is None))
+            return replace_process(stream_name, process, rtsp_url, node)
+        self.manager.replace_process = logged_replace
+
+    def prepare(self, stream_name, on_demand):
+        node = self.pool.place(stream_name)
+        node.client.replace_path(stream_name, {'source': 'publisher'})
+        return node.rtsp_url(stream_name), node.name
+
+    def launch_first(self, stream_name, video_path, profile=None):
+        node = self.pool.node_for(stream_name)
+        self.fakes[node.name].set_path_state(stream_name, ready=True, bytes_received=1024)
+        return FakeProcess(self.log), node.publish_url(stream_name)
+
+    def launch(self, stream_name, video_path, node, profile=None):
+        self.log.append(('launch', node.name, stream_name in self.fakes[node.name].path_configs))
+        process = FakeProcess(self.log)
+        self.launched.append(process)
+        if self.publishes:
+            def first_media():
+                # The new publisher connects and sends its first keyframe a little later
+                time.sleep(0.3)
+                self.log.append(('media', node.name))
+                self.fakes[node.name].set_path_state(stream_name, ready=True, bytes_received=1024)
+            threading.Thread(target=first_media, daemon=True).start()
+        return process, node.publish_url(stream_name)
+
+    def stop(self):
+        self.manager.stop_all()
+        for fake in self.fakes.values():
+            fake.stop()
+
+
+def test_make_before_break():
+    """The target publishes media before the URL flips, and the old publisher stops last"""
+    print("1. Make-before-break...")
+    cluster = Cluster()
+    try:
+        info = cluster.manager.start_stream('cam1', '/videos/cam1.mp4', 'cam1.mp4')
+        source = cluster.pool.node_for('cam1')
+        old_pid = info['pid']
+
+        result = cluster.rebalancer.migrate('cam1')
+        target = cluster.pool.nodes[result['to_node']]
+        log = cluster.log
+        print(f"   log: {log}")
+
+        check("moved to the other node", target is not source and cluster.pool.node_for('cam1') is target)
+        check("target path created before its publisher", log[0] == ('launch', target.name, True))
+        check("media on the target before the flip", log.index(('media', target.name)) < log.index(('flip', target.name, True)))
+        check("old publisher still running at the flip", ('flip', target.name, True) in log)
+        check("old publisher stopped last", log[-1] == ('stop', old_pid))
+        check("rtsp_url points at the target", cluster.manager.get('cam1')['rtsp_url'] == target.rtsp_url('cam1'))
+        redirect = cluster.fakes[source.name].path_configs.get('cam1') or {}
+        check("old path redirects to the target", redirect.get('sourceRedirect') == target.rtsp_url('cam1'))
+    finally:
+        cluster.stop()
+
+
+def test_no_media():
+    """A target that never produces media is abandoned and the stream stays where it was"""
+    print("2. Target without media...")
+    cluster = Cluster(publishes=False, keyframe_timeout=0.5)
+    try:
+        info = cluster.manager.start_stream('cam1', '/videos/cam1.mp4', 'cam1.mp4')
+        source = cluster.pool.node_for('cam1')
+        try:
+            cluster.rebalancer.migrate('cam1')
+            check("MigrationError raised", False)
+        except MigrationError:
+            check("MigrationError raised", True)
+        target = next(node for node in cluster.pool.nodes.values() if node is not source)
+
+        check("never flipped", not any(entry[0] == 'flip' for entry in cluster.log))
+        check("only the new publisher stopped", [e for e in cluster.log if e[0] == 'stop'] == [('stop', cluster.launched[0].pid)])
+        check("old publisher still running", cluster.manager.get('cam1')['pid'] == info['pid'])
+        check("stream still on its node", cluster.pool.node_for('cam1') is source
+              and cluster.manager.get('cam1')['rtsp_url'] == source.rtsp_url('cam1'))
+        check("target path removed", 'cam1' not in cluster.fakes[target.name].path_configs)
+    finally:
+        cluster.stop()
+
+
+def main():
+    print("=" * 60)
+    print("Rebalancer Test")
+    print("=" * 60)
+    tests = [test_make_before_break, test_no_media]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
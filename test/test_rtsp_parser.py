@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import sys
+import random
+import time
+from RtspParser import RtspParser, RtspParseError
+
+PIPELINE = (
+    b"OPTIONS rtsp://localhost:8554/movie.Mjpeg RTSP/1.0\r\nCSeq: 1\r\n\r\n"
+    b"DESCRIBE rtsp://localhost:8554/movie.Mjpeg RTSP/1.0\r\nCSeq: 2\r\nAccept: application/sdp\r\n\r\n"
+    b"SETUP rtsp://localhost:8554/movie.Mjpeg/trackID=0 RTSP/1.0\r\nCSeq: 3\r\n"
+    b"Transport: RTP/AVP;unicast;client_port=25000-25001\r\n\r\n"
+    b"$\x00\x00\x04abcd"
+    b"SET_PARAMETER rtsp://localhost:8554/movie.Mjpeg RTSP/1.0\r\nCSeq: 4\r\nSession: 123456;timeout=60\r\n"
+    b"Content-Length: 12\r\n\r\nvolume: 0.5\n"
+    b"PLAY rtsp://localhost:8554/movie.Mjpeg RTSP/1.0\nCSeq: 5\nSession: 123456\n\n"
+)
+EXPECTED = [('OPTIONS', '1'), ('DESCRIBE', '2'), ('SETUP', '3'), ('SET_PARAMETER', '4'), ('PLAY', '5')]
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def test_pipelined():
+    """All requests in one recv()"""
+    print("1. Pipelined requests...")
+    requests = RtspParser().feed(PIPELINE)
+    check("five requests in order", [(r.method, r.cseq) for r in requests] == EXPECTED)
+    check("transport parsed", requests[2].transport()['client_port'] == (25000, 25001))
+    check("resource strips host and track", requests[2].resource() == 'movie.Mjpeg')
+    check("session strips timeout", requests[3].session == '123456')
+    check("body read by Content-Length", requests[3].body == b"volume: 0.5\n")
+
+
+def test_fragmented(rounds=2000):
+    """The same bytes split at random points must give the same requests"""
+    print(f"2. Random fragmentation ({rounds} rounds)...")
+    for _ in range(rounds):
+        parser = RtspParser()
+        requests = []
+        data = PIPELINE
+        while data:
+            cut = random.randint(1, 40)
+            requests += parser.feed(data[:cut])
+            data = data[cut:]
+        if [(r.method, r.cseq) for r in requests] != EXPECTED:
+            check(f"split gave {requests}", False)
+    check("every split parsed identically", True)
+
+
+def test_legacy():
+    """Old newline-only messages still map to the same requests"""
+    print("3. Legacy format...")
+    setup, = RtspParser().feed(b"SETUP movie.Mjpeg\n1\n RTSP/1.0 RTP/UDP 25000")
+    check("legacy SETUP", setup.legacy and setup.cseq == '1' and setup.resource() == 'movie.Mjpeg')
+    check("legacy transport", setup.transport()['client_port'] == (25000, 25001))
+    listing, = RtspParser().feed(b"LIST\n1\n")
+    check("legacy LIST", listing.method == 'LIST' and listing.resource() is None)
+
+
+def test_errors():
+    """Malformed input gets the right status code"""
+    print("4. Error statuses...")
+    cases = [
+        (b"PLAY rtsp://x/a HTTP/1.1\r\nCSeq: 1\r\n\r\n", 505),
+        (b"play rtsp://x/a RTSP/1.0\r\nCSeq: 1\r\n\r\n", 400),
+        (b"PLAY rtsp://x/a RTSP/1.0\r\nCSeq 1\r\n\r\n", 400),
+        (b"PLAY rtsp://x/a RTSP/1.0\r\nContent-Length: x\r\n\r\n", 400),
+        (b"PLAY rtsp://x/a RTSP/1.0\r\nContent-Length: 999999\r\n\r\n", 413),
+        (b"PLAY rtsp://x/a RTSP/1.0\r\nX: " + b"a" * 10000, 431),
+        (b"A" * 10000, 431),
+    ]
+    for data, status in cases:
+        try:
+            RtspParser().feed(data)
+            got = None
+        except RtspParseError as e:
+            got = e.status
+        check(f"{data[:30]!r}... -> {status} (got {got})", got == status)
+
+
+def test_fuzz(rounds=20000):
+    """Mutated and random input may only raise RtspParseError"""
+    print(f"5. Fuzzing ({rounds} inputs)...")
+    alphabet = b"\r\n :;=-$\x00\xffRTSP/1.0CSeqContent-Length0123456789"
+    for i in range(rounds):
+        if i % 2:
+            data = bytearray(PIPELINE)
+            for _ in range(random.randint(1, 8)):
+                data[random.randrange(len(data))] = random.randrange(256)
+        else:
+            data = bytes(random.choice(alphabet) for _ in range(random.randint(1, 200)))
+        parser = RtspParser()
+        try:
+            while data:
+                cut = random.randint(1, 64)
+                for request in parser.feed(bytes(data[:cut])):
+                    request.resource()
+                    if request.get('transport'):
+                        request.transport()
+                data = data[cut:]
+        except RtspParseError:
+            pass
+        except Exception as e:
+            check(f"{type(e).__name__}: {e} on {bytes(data)[:60]!r}", False)
+    check("only RtspParseError raised", True)
+
+
+def main():
+    print("=" * 60)
+    print("RTSP Parser Test")
+    print("=" * 60)
+    started = time.time()
+    tests = [test_pipelined, test_fragmented, test_legacy, test_errors, test_fuzz]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed in {time.time() - started:.1f}s")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
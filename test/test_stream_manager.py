@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import threading
+
+# stream_manager.py and main.py live in the repository root
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO)
+
+from stream_manager import StreamManager
+
+
+class FakeProcess:
+    """Stands in for an FFmpeg Popen: running until terminate()"""
+
+    next_pid = 1000
+
+    def __init__(self):
+        FakeProcess.next_pid += 1
+        self.pid = FakeProcess.next_pid
+        self.returncode = None
+        self.exited = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.exited.wait(timeout)
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+        self.exited.set()
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def launcher(stream_name, video_path, profile=None):
+    return FakeProcess(), f"rtsp://localhost:8554/{stream_name}"
+
+
+def load_main():
+    """Import main.py from a scratch directory, it creates its upload folders in the cwd"""
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix='test-stream-manager-'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+def test_snapshot():
+    """Readers get an immutable snapshot that is replaced, not mutated, on change"""
+    print("1. Snapshots...")
+    manager = StreamManager('localhost', 8554, launcher=launcher)
+    before = manager.snapshot()
+    manager.start_stream('cam1', '/videos/cam1.mp4', 'cam1.mp4')
+    after = manager.snapshot()
+    check("old snapshot unchanged", 'cam1' not in before.streams)
+    check("new snapshot has the stream", after.streams['cam1']['status'] == 'running')
+    try:
+        after.streams['cam1']['status'] = 'stopped'
+        check("stream record is read-only", False)
+    except TypeError:
+        check("stream record is read-only", True)
+    check("get() reads the snapshot", manager.get('cam1') is after.streams['cam1'])
+    check("snapshot_state() is plain dicts", type(manager.snapshot_state().streams['cam1']) is dict)
+    manager.stop_all()
+
+
+def test_version():
+    """The version only moves on a real change"""
+    print("2. Versions...")
+    manager = StreamManager('localhost', 8554, launcher=launcher)
+    version = manager.snapshot().version
+    manager.set_mediamtx_accessible(True)
+    check("change bumps the version", manager.snapshot().version == version + 1)
+    manager.set_mediamtx_accessible(True)
+    manager.set_nodes([])
+    check("no-op leaves the version", manager.snapshot().version == version + 1)
+    manager.start_stream('cam1', '/videos/cam1.mp4', 'cam1.mp4')
+    manager.stop_stream('cam1')
+    check("start and stop each bump it", manager.snapshot().version == version + 3)
+    check("snapshot records the last event", manager.snapshot().event_id == 3)
+
+
+def test_etag():
+    """GET /status answers 304 while the snapshot is unchanged"""
+    print("3. ETag / 304...")
+    main = load_main()
+    client = main.app.test_client()
+    manager = main.stream_manager
+
+    first = client.get('/status')
+    etag = first.headers['ETag']
+    check("200 with an ETag", first.status_code == 200 and etag)
+    check("ETag matches the snapshot", etag.strip('"') == manager.snapshot().etag)
+
+    cached = client.get('/status', headers={'If-None-Match': etag})
+    check("304 for the current ETag", cached.status_code == 304 and not cached.data)
+
+    manager.set_usage({'cam1': {'cpu_percent': 12.5, 'rss_bytes': 1 << 20}})
+    check("usage samples keep the ETag", client.get('/status', headers={'If-None-Match': etag}).status_code == 304)
+
+    manager.add_stream('cam1', FakeProcess(), 'rtsp://localhost:8554/cam1', 'cam1.mp4', '/videos/cam1.mp4')
+    changed = client.get('/status', headers={'If-None-Match': etag})
+    check("200 with a new ETag after a change", changed.status_code == 200 and changed.headers['ETag'] != etag)
+    check("body has the new stream", changed.get_json()['streams']['cam1']['status'] == 'running')
+    manager.stop_all()
+
+
+def main():
+    print("=" * 60)
+    print("StreamManager Test")
+    print("=" * 60)
+    tests = [test_snapshot, test_version, test_etag]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
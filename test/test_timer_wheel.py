@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from TimerWheel import TimerWheel
+
+
+def check(name, condition):
+    print(f"   {'✓' if condition else '✗'} {name}")
+    assert condition, name
+
+
+def make_wheel(tick=1.0, slots=8):
+    """A wheel driven only by explicit advance() calls"""
+    wheel = TimerWheel(tick=tick, slots=slots)
+    wheel.stop()
+    wheel.thread.join()
+    return wheel
+
+
+def test_expiry():
+    """A key fires once, after its timeout and not before"""
+    print("1. Expiry...")
+    wheel = make_wheel()
+    fired = []
+    start = time.monotonic()
+    wheel.schedule('a', 5, fired.append)
+    check("not expired early", wheel.advance(start + 3) == [] and not fired)
+    check("expired after the timeout", wheel.advance(start + 7) == ['a'] and fired == ['a'])
+    check("forgotten after firing", len(wheel) == 0 and wheel.advance(start + 20) == [] and wheel.fired == 1)
+
+
+def test_touch():
+    """touch() pushes the deadline out, expire_now() pulls it in"""
+    print("2. Keepalive and expire_now...")
+    wheel = make_wheel()
+    fired = []
+    start = time.monotonic()
+    wheel.schedule('a', 5, fired.append)
+    check("touch on a known key", wheel.touch('a', 15))
+    check("touch on an unknown key", not wheel.touch('missing'))
+    check("touched key survives its first deadline", wheel.advance(start + 7) == [])
+    check("touched key fires at the new deadline", wheel.advance(start + 17) == ['a'])
+
+    wheel = make_wheel()
+    wheel.schedule('b', 60, fired.append)
+    wheel.expire_now('b')
+    check("expire_now fires on the next tick", wheel.advance(time.monotonic() + 2) == ['b'] and fired == ['a', 'b'])
+
+
+def test_rounds():
+    """Timeouts longer than one turn of the wheel wait for their own round"""
+    print("3. Several rounds...")
+    wheel = make_wheel(slots=8)
+    start = time.monotonic()
+    wheel.schedule('long', 20, lambda key: None)
+    wheel.schedule('short', 4, lambda key: None)
+    check("short key after one pass", wheel.advance(start + 6) == ['short'])
+    check("long key skipped on earlier rounds", wheel.advance(start + 10) == [] and wheel.advance(start + 18) == [])
+    check("long key fires on its round", wheel.advance(start + 22) == ['long'])
+
+
+def test_cancel():
+    """Cancelled keys never fire, and a failing callback does not stop the others"""
+    print("4. Cancel and callback errors...")
+    wheel = make_wheel()
+    fired = []
+    start = time.monotonic()
+
+    def broken(key):
+        raise RuntimeError("callback failed")
+
+    wheel.schedule('a', 2, fired.append)
+    wheel.schedule('b', 2, broken)
+    wheel.schedule('c', 2, fired.append)
+    check("cancel a known key", wheel.cancel('a') and not wheel.cancel('a'))
+    check("others still fire", sorted(wheel.advance(start + 5)) == ['b', 'c'] and fired == ['c'])
+
+
+def test_thread():
+    """The wheel's own thread expires keys in real time"""
+    print("5. Background thread...")
+    wheel = TimerWheel(tick=0.05)
+    fired = []
+    wheel.schedule('a', 0.2, fired.append)
+    time.sleep(0.6)
+    wheel.stop()
+    check("expired without advance()", fired == ['a'])
+
+
+def main():
+    print("=" * 60)
+    print("TimerWheel Test")
+    print("=" * 60)
+    tests = [test_expiry, test_touch, test_rounds, test_cancel, test_thread]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError:
+            pass  # check() already printed the failure
+    print("=" * 60)
+    print(f"{passed}/{len(tests)} groups passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
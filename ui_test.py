@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
 import subprocess
+import time
+import json
 
 st.title(" RTSP Stream Server")
 
@@ -21,11 +23,22 @@ stream_name = st.text_input(
     help="Letters, numbers, underscores, and hyphens only"
 )
 
+on_demand = st.checkbox(
+    "On-demand",
+    help="Only run the encoder while someone is watching"
+)
+
+profile = st.selectbox(
+    "Encode profile",
+    ["latency", "balanced", "bandwidth"],
+    help="latency: 1s keyframes, fastest join | balanced: 2s | bandwidth: 4s keyframes, smallest stream"
+)
+
 if st.button("Start Stream", type="primary"):
     if uploaded_file and stream_name:
         with st.spinner("Starting stream..."):
             files = {'file': uploaded_file}
-            data = {'stream_name': stream_name}
+            data = {'stream_name': stream_name, 'on_demand': 'true' if on_demand else 'false', 'profile': profile}
             
             try:
                 response = requests.post(f'{BASE_URL}/upload', files=files, data=data)
@@ -57,14 +70,44 @@ st.header(" Active Streams")
 if st.button(" Refresh Streams"):
     st.rerun()
 
-try:
-    response = requests.get(f'{BASE_URL}/status')
-    
-    if response.status_code == 200:
-        status_data = response.json()
-        
+streams_placeholder = st.empty()
+
+
+# SERVER STATUS
+st.header(" Server Status")
+
+server_placeholder = st.empty()
+
+
+def read_events(response):
+    """Parse a Server-Sent Events response into (event, data) pairs"""
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data:
+                yield event or 'message', json.loads("\n".join(data))
+            event, data = None, []
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].strip())
+
+
+STATUS_LABELS = {
+    'running': ' Running',
+    'idle': ' Idle (waiting for a reader)',
+    'starting': ' Starting',
+    'stopped': ' Stopped',
+}
+
+
+def render_streams(status_data, uptimes):
+    """Render the stream list from the locally maintained status"""
+    with streams_placeholder.container():
         st.metric("Server", status_data.get('rtsp_server', 'Unknown'))
-        st.metric("Total Streams", status_data.get('total_streams', 0))
+        st.metric("Total Streams", len(status_data.get('streams', {})))
     
         # Show active streams
         streams = status_data.get('streams', {})
@@ -73,44 +116,106 @@ try:
             st.subheader(" Active Streams")
             
             for stream_name, stream_info in streams.items():
-                with st.expander(f" {stream_name} - {' Running' if stream_info.get('is_running') else ' Stopped'}"):                   
+                status_label = STATUS_LABELS.get(stream_info.get('status'), ' Stopped')
+                with st.expander(f" {stream_name} - {status_label}"):                   
                     
                         st.write(f"**Filename:** `{stream_info.get('filename', 'N/A')}`")
-                        st.write(f"**Status:** `{' Running' if stream_info.get('is_running') else ' Stopped'}`")
+                        st.write(f"**Status:** `{status_label}`")
+                        if stream_info.get('on_demand'):
+                            st.write("**Mode:** `On-demand`")
+                        if stream_info.get('profile'):
+                            st.write(f"**Profile:** `{stream_info['profile']}`")
+                        if stream_info.get('node'):
+                            st.write(f"**Node:** `{stream_info['node']}`")
                         st.write(f"**RTSP URL:** `{stream_info.get('rtsp_url', 'N/A')}`")
-                        st.write(f"**Uptime:** `{round(stream_info.get('uptime_seconds', 0) / 60, 1)}` minutes")
+                        if stream_name in uptimes:
+                            uptime_seconds = uptimes[stream_name]
+                        elif stream_info.get('is_running'):
+                            uptime_seconds = time.time() - (stream_info.get('active_since') or stream_info.get('created_at', 0))
+                        else:
+                            uptime_seconds = 0
+                        st.write(f"**Uptime:** `{round(uptime_seconds / 60, 1)}` minutes")
                         
                         if stream_info.get('pid'):
                             st.write(f"**Process ID:** {stream_info.get('pid')}")
+
+                        mediamtx_info = stream_info.get('mediamtx')
+                        if mediamtx_info:
+                            st.write(f"**Publishing:** `{'Yes' if mediamtx_info.get('ready') else 'No'}`")
+                            st.write(f"**Readers:** `{mediamtx_info.get('readers', 0)}`")
+                            st.write(f"**Sent:** `{round(mediamtx_info.get('bytes_sent', 0) / 1024 / 1024, 1)}` MB")
                     
                         # Copy URL button
                         st.code(stream_info.get('rtsp_url', ''), language='text')
         else:
             st.info("No active streams. Upload a video to start streaming.")
-    else:
-        st.error(" Could not get stream status")
-        
-except requests.exceptions.RequestException as e:
-    st.error(f" Connection error: {str(e)}")
 
 
-# SERVER STATUS
-st.header(" Server Status")
+def render_server(status_data):
+    """Render server status from the locally maintained status"""
+    with server_placeholder.container():
+        if status_data.get('mediamtx_accessible'):
+            st.success(" Server is running on Docker")
+        else:
+            st.warning(" Flask server is up but MediaMTX is not accessible")
 
-try:
-    response = requests.get(f'{BASE_URL}/')
-    
-    if response.status_code == 200:
-        server_info = response.json()
-        st.success(" Server is running on Docker")
+        # MediaMTX nodes, when more than one is configured
+        nodes = status_data.get('nodes') or []
+        if len(nodes) > 1:
+            st.subheader(" MediaMTX Nodes")
+            for node in nodes:
+                health = 'Healthy' if node.get('healthy') else 'Unreachable'
+                capacity = node.get('max_streams') or '∞'
+                st.write(f"**{node['name']}** `{node['rtsp_server']}` - {health}, "
+                         f"streams {node.get('streams', 0)}/{capacity}, readers {node.get('readers', 0)}")
                 
         # Show all server info
         with st.expander(" Full Server Response"):
-            st.json(server_info)
-    else:
-        st.error(" Server not responding properly")
+            st.json(status_data)
+
+
+# Subscribe to pushed state changes instead of polling /status and /
+try:
+    with requests.get(f'{BASE_URL}/events', stream=True, timeout=(5, None)) as response:
+        if response.status_code != 200:
+            st.error(" Could not subscribe to stream events")
+        else:
+            status_data = {}
+            uptimes = {}
+            for event, data in read_events(response):
+                if event == 'snapshot':
+                    status_data = data
+                    uptimes = {}
+                elif event in ('started', 'restarted', 'stopped', 'activated', 'idle', 'migrated'):
+                    status_data.setdefault('streams', {})[data['stream_name']] = data
+                elif event == 'removed':
+                    status_data.get('streams', {}).pop(data['stream_name'], None)
+                    uptimes.pop(data['stream_name'], None)
+                elif event == 'mediamtx':
+                    status_data['mediamtx_accessible'] = data['mediamtx_accessible']
+                    render_server(status_data)
+                    continue
+                elif event == 'nodes':
+                    status_data['nodes'] = data['nodes']
+                    render_server(status_data)
+                    continue
+                elif event == 'paths':
+                    for name, mediamtx_info in data['streams'].items():
+                        if name in status_data.get('streams', {}):
+                            status_data['streams'][name]['mediamtx'] = mediamtx_info
+                elif event == 'tick':
+                    uptimes = {name: info['uptime_seconds'] for name, info in data['streams'].items()}
+                    for name, info in data['streams'].items():
+                        if name in status_data.get('streams', {}):
+                            status_data['streams'][name]['mediamtx'] = info.get('mediamtx')
+                else:
+                    continue
+
+                status_data['total_streams'] = len(status_data.get('streams', {}))
+                render_streams(status_data, uptimes)
+                if event == 'snapshot':
+                    render_server(status_data)
         
 except requests.exceptions.RequestException as e:
-    st.error(f" Cannot connect to server: {str(e)}")
+    server_placeholder.error(f" Cannot connect to server: {str(e)}")
     st.info("Make sure your Flask server is running on http://localhost:5000")
-